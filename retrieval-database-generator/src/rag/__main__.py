@@ -11,6 +11,8 @@
 import typer
 import os
 from rag.retrieval import Retriever
+from rag.sharded_retrieval import ShardedRetriever
+from rag.config import Config
 
 
 def main():
@@ -37,16 +39,188 @@ def main():
             help="Disable reranking of retrieved chunks to improve relevance. Reranking is only useful if the chunks "
                  "were generated by HiRAG method. (eIQ GenAI Flow uses True)",
         ),
+        reranking_weight: float = typer.Option(
+            Config.reranking_weight,
+            "--reranking-weight", "-w",
+            help="Weight of the similarity with the question part of the chunks in the reranked score, the rest "
+                 "being the similarity with the whole chunk. (eIQ GenAI Flow uses 0.5)",
+        ),
         best_k: int = typer.Option(
             1,
             "--best-k", "-b",
             help="Number of top-ranked chunks included in the LLM prompt after reranking. "
                  "(eIQ GenAI Flow uses 1)",
         ),
-        rag_db_name: str = typer.Option(
-            "rag_database.pkl",
+        min_similarity: float = typer.Option(
+            Config.min_similarity,
+            "--min-similarity",
+            help="Chunks whose similarity is below this value are not returned (0 disables it). The best chunk is "
+                 "always returned.",
+        ),
+        relative_similarity: float = typer.Option(
+            Config.relative_similarity,
+            "--relative-similarity",
+            help="Chunks whose similarity is below this fraction of the best similarity (e.g. 0.8) are not returned "
+                 "(0 disables it).",
+        ),
+        context_token_budget: int = typer.Option(
+            Config.context_token_budget,
+            "--token-budget",
+            help="Maximum number of LLM tokens of the returned chunks (0 disables it). Requires --llm-tokenizer.",
+        ),
+        context_tokenizer_path: str = typer.Option(
+            None,
+            "--llm-tokenizer",
+            help="tokenizer.json file of the LLM (e.g. Danube), or its folder, used to count the tokens of the "
+                 "chunks for --token-budget.",
+        ),
+        deduplication_factor: int = typer.Option(
+            Config.deduplication_factor,
+            "--deduplication-factor",
+            help="Chunks retrieved several times (e.g. through different embeddings) are collapsed among "
+                 "top_k * factor candidates, so that the selected chunks are distinct (0 disables it).",
+        ),
+        mmr_lambda: float = typer.Option(
+            Config.mmr_lambda,
+            "--mmr-lambda",
+            help="Trade-off between relevance (1) and diversity (0) when the best_k chunks are selected among the top_k "
+                 "ones with maximal marginal relevance (1 disables the diversity selection).",
+        ),
+        near_duplicate_threshold: float = typer.Option(
+            Config.near_duplicate_threshold,
+            "--near-duplicate-threshold",
+            help="Chunks whose cosine similarity with an already selected chunk reaches this value are skipped, e.g. "
+                 "paraphrases of the same answer (0 disables it).",
+        ),
+        rag_db_names: list[str] = typer.Option(
+            ["rag_database.pkl"],
             "--rag-database", "-d",
-            help=f"RAG database file name in data{os.sep}.",
+            help=f"RAG database file name in data{os.sep}. Several databases can be given ('-d db1 -d db2 ...'): "
+                 "each query is routed to the most relevant ones.",
+        ),
+        ann_nprobe: int = typer.Option(
+            Config.ann_nprobe,
+            "--ann-nprobe", "-n",
+            help="Number of inverted lists scanned per query when an IVF index was generated with the database. "
+                 "Higher is more accurate but slower.",
+        ),
+        ann_min_database_size: int = typer.Option(
+            Config.ann_min_database_size,
+            "--ann-min-size",
+            help="Minimum number of embeddings in the database for the IVF index to be used instead of the exact "
+                 "search.",
+        ),
+        quantized_rescoring_factor: int = typer.Option(
+            Config.quantized_rescoring_factor,
+            "--rescoring-factor",
+            help="For databases with quantized or projected embeddings, number of candidates rescored exactly per "
+                 "pre-selected chunk (0 disables the rescoring).",
+        ),
+        binary_num_candidates: int = typer.Option(
+            Config.binary_num_candidates,
+            "--binary-candidates",
+            help="For databases with binary signatures, number of candidates kept by the Hamming prefilter and "
+                 "rescored exactly.",
+        ),
+        scan_threads: int = typer.Option(
+            Config.scan_threads,
+            "--scan-threads",
+            help="Number of threads scanning partitions of the database in the exact search. Leave cores to the LLM "
+                 "decoding threads.",
+        ),
+        no_hybrid_search: bool = typer.Option(
+            False,
+            "--no-hybrid",
+            help="Disable the fusion of the dense ranking with the BM25 ranking, when a BM25 index was generated with "
+                 "the database.",
+        ),
+        rrf_k: int = typer.Option(
+            Config.rrf_k,
+            "--rrf-k",
+            help="Reciprocal rank fusion constant of the hybrid search. Higher values give less weight to the first "
+                 "ranks.",
+        ),
+        lexical_num_candidates: int = typer.Option(
+            Config.lexical_num_candidates,
+            "--lexical-candidates",
+            help="Number of candidates of the dense and BM25 rankings fused by the hybrid search.",
+        ),
+        lexical_prefilter: bool = typer.Option(
+            Config.lexical_prefilter,
+            "--lexical-prefilter",
+            help="Only compute the dense similarity of the BM25 candidates in the hybrid search instead of scanning "
+                 "the whole database (faster on large databases, but misses the chunks sharing no word with the "
+                 "query).",
+        ),
+        query_cache_size: int = typer.Option(
+            Config.query_cache_size,
+            "--query-cache-size",
+            help="Number of query embeddings kept in the LRU cache, so that repeated queries skip the embedding model "
+                 "(0 disables the cache).",
+        ),
+        query_cache_path: str = typer.Option(
+            None,
+            "--query-cache",
+            help="File in which the query embedding cache is persisted between runs (kept in memory only if not set).",
+        ),
+        semantic_cache_size: int = typer.Option(
+            Config.semantic_cache_size,
+            "--semantic-cache-size",
+            help="Number of retrieval results kept in the semantic cache: a query similar enough to a cached query "
+                 "reuses its result (0 disables the cache).",
+        ),
+        semantic_cache_threshold: float = typer.Option(
+            Config.semantic_cache_threshold,
+            "--semantic-cache-threshold",
+            help="Minimum cosine similarity between a query and a cached query to reuse its result.",
+        ),
+        deny_list_path: str = typer.Option(
+            None,
+            "--deny-list",
+            help="Text file of additional censored words and phrases (one per line), reloaded when it is modified.",
+        ),
+        no_out_of_domain_detection: bool = typer.Option(
+            False,
+            "--no-out-of-domain",
+            help="Do not detect out-of-domain queries with the garbage model classifier stored in the database.",
+        ),
+        out_of_domain_margin: float = typer.Option(
+            Config.out_of_domain_margin,
+            "--out-of-domain-margin",
+            help="Added to the threshold of the out-of-domain classifier. Negative values flag more queries.",
+        ),
+        no_intent_detection: bool = typer.Option(
+            False,
+            "--no-intent",
+            help="Do not detect commands (chunks with an intent) before the retrieval.",
+        ),
+        intent_threshold: float = typer.Option(
+            Config.intent_threshold,
+            "--intent-threshold",
+            help="Minimum word n-gram similarity between a query and a command to detect it without the embedding "
+                 "model.",
+        ),
+        intent_embedding_threshold: float = typer.Option(
+            Config.intent_embedding_threshold,
+            "--intent-embedding-threshold",
+            help="Minimum cosine similarity between a query and a command to detect it before the search (above 1 "
+                 "disables this stage).",
+        ),
+        routing_centroids: int = typer.Option(
+            Config.routing_centroids,
+            "--routing-centroids",
+            help="Number of k-means centroids summarizing each database for the routing (with several databases).",
+        ),
+        max_routed_shards: int = typer.Option(
+            Config.max_routed_shards,
+            "--max-routed-databases",
+            help="Maximum number of databases searched per query (with several databases).",
+        ),
+        routing_margin: float = typer.Option(
+            Config.routing_margin,
+            "--routing-margin",
+            help="Databases whose routing score is within this margin of the best one are searched (with several "
+                 "databases).",
         ),
         verbose: bool = typer.Option(
             False,
@@ -58,13 +232,53 @@ def main():
         Retrieve chunk(s) from RAG database.
         """
 
-        rag_db_path = os.path.join(src_dir_path, "data", rag_db_name)
+        rag_db_paths = [os.path.join(src_dir_path, "data", rag_db_name) for rag_db_name in rag_db_names]
+
+        # parameters of the retriever of each database
+        retriever_kwargs = dict(top_k=top_k,
+                                reranking=(not no_reranking),
+                                reranking_weight=reranking_weight,
+                                deduplication_factor=deduplication_factor,
+                                mmr_lambda=mmr_lambda,
+                                near_duplicate_threshold=near_duplicate_threshold,
+                                hybrid_search=(not no_hybrid_search),
+                                rrf_k=rrf_k,
+                                lexical_num_candidates=lexical_num_candidates,
+                                lexical_prefilter=lexical_prefilter,
+                                out_of_domain_detection=(not no_out_of_domain_detection),
+                                out_of_domain_margin=out_of_domain_margin,
+                                intent_detection=(not no_intent_detection),
+                                intent_threshold=intent_threshold,
+                                intent_embedding_threshold=intent_embedding_threshold,
+                                best_k=best_k,
+                                min_similarity=min_similarity,
+                                relative_similarity=relative_similarity,
+                                context_token_budget=context_token_budget,
+                                context_tokenizer_path=context_tokenizer_path,
+                                verbose=verbose,
+                                ann_nprobe=ann_nprobe,
+                                ann_min_database_size=ann_min_database_size,
+                                quantized_rescoring_factor=quantized_rescoring_factor,
+                                binary_num_candidates=binary_num_candidates,
+                                scan_threads=scan_threads)
 
-        retriever = Retriever(top_k=top_k,
-                              reranking=(not no_reranking),
-                              best_k=best_k,
-                              rag_db_path=rag_db_path,
-                              verbose=verbose)
+        if len(rag_db_paths) > 1:
+            retriever = ShardedRetriever(rag_db_paths=rag_db_paths,
+                                         routing_centroids=routing_centroids,
+                                         max_routed_shards=max_routed_shards,
+                                         routing_margin=routing_margin,
+                                         query_cache_size=query_cache_size,
+                                         query_cache_path=query_cache_path,
+                                         deny_list_path=deny_list_path,
+                                         **retriever_kwargs)
+        else:
+            retriever = Retriever(rag_db_path=rag_db_paths[0],
+                                  query_cache_size=query_cache_size,
+                                  query_cache_path=query_cache_path,
+                                  semantic_cache_size=semantic_cache_size,
+                                  semantic_cache_threshold=semantic_cache_threshold,
+                                  deny_list_path=deny_list_path,
+                                  **retriever_kwargs)
 
         # contextual information is retrieved based on the user query
         while True:
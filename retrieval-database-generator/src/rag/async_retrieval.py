@@ -0,0 +1,136 @@
+# Copyright 2025 NXP
+# NXP Proprietary.
+# This software is owned or controlled by NXP and may only be used strictly in
+# accordance with the applicable license terms. By expressly accepting such
+# terms or by downloading, installing, activating and/or otherwise using the
+# software, you are agreeing that you have read, and that you agree to comply
+# with and are bound by, such license terms. If you do not agree to be bound
+# by the applicable license terms, then you may not retain, install, activate
+# or otherwise use the software.
+
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from rag.config import Config
+from rag.retrieval import Retriever
+from rag.sharded_retrieval import ShardedRetriever
+
+
+class AsyncRetriever:
+    """
+    Asyncio entry point of a Retriever (or ShardedRetriever): the embedding model and the search run in a worker
+    thread, so the event loop keeps running (e.g. ASR decoding or LLM warm-up) while a query is retrieved. Queries
+    awaited concurrently are coalesced into micro-batches, searched with a single `retrieve_batch` call.
+    The retriever is only used by one worker thread, so it can be shared by all the clients of an event loop.
+    """
+
+    def __init__(self,
+                 retriever: Retriever | ShardedRetriever,
+                 max_batch_size: int = Config.async_max_batch_size,
+                 batch_delay: float = Config.async_batch_delay):
+        """
+        :param retriever: retriever running the queries
+        :param max_batch_size: maximum number of queries retrieved together
+        :param batch_delay: time (in seconds) waited for other queries after the first query of a batch arrives
+        """
+
+        self.retriever = retriever
+        self.max_batch_size = max(1, max_batch_size)
+        self.batch_delay = batch_delay
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="rag-retrieval")
+        self._queue = None
+        self._worker = None
+
+    async def __aenter__(self) -> "AsyncRetriever":
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        await self.close()
+
+    def _start(self) -> None:
+        """Start the batching task on the running event loop."""
+        if self._worker is None or self._worker.done():
+            self._queue = asyncio.Queue()
+            self._worker = asyncio.get_running_loop().create_task(self._batch_loop())
+
+    async def _next_batch(self) -> list[tuple[str, asyncio.Future]]:
+        """
+        :return: queries waiting to be retrieved (and their futures), at most max_batch_size
+        """
+
+        loop = asyncio.get_running_loop()
+        batch = [await self._queue.get()]
+        deadline = loop.time() + self.batch_delay
+        while len(batch) < self.max_batch_size:
+            if not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+                continue
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _batch_loop(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [(query, future) for query, future in await self._next_batch() if not future.cancelled()]
+            if not batch:
+                continue
+            try:
+                results = await loop.run_in_executor(self._executor, self.retriever.retrieve_batch,
+                                                     [query for query, _ in batch])
+            except asyncio.CancelledError:
+                for _, future in batch:
+                    future.cancel()
+                raise
+            except Exception as e:
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            for (_, future), result in zip(batch, results):
+                if not future.done():
+                    future.set_result(result)
+
+    async def aretrieve(self, query: str) -> tuple[list, list, list]:
+        """
+        Retrieve the most relevant chunks (and their related metadata) for the input query, without blocking the
+        event loop.
+        :param query: user query
+        :return: most relevant chunks, their similarities and related metadata
+        """
+
+        self._start()
+        future = asyncio.get_running_loop().create_future()
+        self._queue.put_nowait((query, future))
+        return await future
+
+    async def aretrieve_batch(self, queries: list[str]) -> list[tuple[list, list, list]]:
+        """
+        :param queries: list of user queries
+        :return: list of (chunks, similarities, metadata) tuples, aligned with the input queries
+        """
+
+        return list(await asyncio.gather(*(self.aretrieve(query) for query in queries)))
+
+    async def close(self) -> None:
+        """
+        Stop the batching task and the worker thread.
+        :return: None
+        """
+
+        if self._worker is not None:
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+            self._worker = None
+            # queries still waiting are cancelled
+            while not self._queue.empty():
+                _, future = self._queue.get_nowait()
+                future.cancel()
+        self._executor.shutdown(wait=True)
@@ -0,0 +1,396 @@
+# Copyright 2025 NXP
+# NXP Proprietary.
+# This software is owned or controlled by NXP and may only be used strictly in
+# accordance with the applicable license terms. By expressly accepting such
+# terms or by downloading, installing, activating and/or otherwise using the
+# software, you are agreeing that you have read, and that you agree to comply
+# with and are bound by, such license terms. If you do not agree to be bound
+# by the applicable license terms, then you may not retain, install, activate
+# or otherwise use the software.
+
+
+import io
+import os
+import sys
+import json
+import time
+import typer
+import platform
+import tempfile
+import numpy as np
+from enum import Enum
+from colorama import Fore
+from contextlib import nullcontext, redirect_stdout
+from rag.config import Config
+from rag.retrieval import Retriever
+from rag.models.embedding_models.embedding_models import EmbeddingModel
+from rag.search.dense_search import DenseSearchEngine, l2_normalize
+from rag.search.ivf_index import build_ivf_index, save_ivf_index, get_ivf_index_path
+from rag.search.quantization import QuantizationMethod
+from rag.search.projection import ProjectionMethod
+from rag.database.pkl_database import save_pkl_database
+from rag.database.columnar_database import save_columnar_database, stack_database_embeddings, \
+    COLUMNAR_DATABASE_EXTENSION
+from rag.preprocessing.generate_embeddings import DatabaseFormat, build_search_arrays
+
+# Source file of the synthetic chunks
+SYNTHETIC_SOURCE = "synthetic_chunks.json"
+
+
+class BenchmarkMode(str, Enum):
+    """Search modes benchmarked (every mode but 'exact' is approximate)."""
+    EXACT = "exact"
+    IVF = "ivf"
+    BINARY = "binary"
+    INT8 = "int8"
+    PQ = "pq"
+    PCA = "pca"
+
+
+def synthesize_database(num_entries: int,
+                        dim: int = 384,
+                        num_topics: int = 0,
+                        topic_spread: float = 0.6,
+                        chunk_words: int = 24,
+                        seed: int = 0) -> dict:
+    """
+    Create a database dictionary in the format of `generate_embeddings`, with one chunk per entry. The embeddings are
+    drawn around random topic directions, so that the approximate search modes face clusters as with real chunks.
+    :param num_entries: number of entries (and embeddings) of the database
+    :param dim: dimension of the embeddings
+    :param num_topics: number of topics (0 = sqrt(num_entries))
+    :param topic_spread: norm of the noise added to the topic directions (before normalization)
+    :param chunk_words: number of words of each chunk text
+    :param seed: random seed
+    :return: database dictionary
+    """
+
+    rng = np.random.default_rng(seed)
+    num_topics = num_topics or max(1, int(np.sqrt(num_entries)))
+    topics = l2_normalize(rng.standard_normal((num_topics, dim)))
+    topic_ids = rng.integers(num_topics, size=num_entries)
+    noise = rng.standard_normal((num_entries, dim)).astype(np.float32) * (topic_spread / np.sqrt(dim))
+    embeddings = l2_normalize(topics[topic_ids] + noise)
+
+    vocabulary = np.array([f"word{i}" for i in range(2048)])
+    word_ids = (topic_ids[:, None] * 7 + rng.integers(256, size=(num_entries, chunk_words))) % len(vocabulary)
+
+    database = {"embedding_model": "all-MiniLM-L6-v2.onnx",
+                "database_description": f"Synthetic benchmark database ({num_entries} entries)",
+                "database_generator_files": [SYNTHETIC_SOURCE]}
+    for index in range(num_entries):
+        database[index] = {"embeddings": embeddings[index:index + 1],
+                           "reranking_embedding": embeddings[index],
+                           "chunks": [" ".join(vocabulary[word_ids[index]])],
+                           "chunked_file_id": str(index),
+                           "source": SYNTHETIC_SOURCE}
+    return database
+
+
+def save_benchmark_database(database: dict,
+                            directory: str,
+                            mode: BenchmarkMode,
+                            database_format: DatabaseFormat) -> str:
+    """
+    Save a database with the search structures of a mode, as `generate_embeddings` does.
+    :param database: database dictionary
+    :param directory: directory of the saved database
+    :param mode: benchmarked search mode
+    :param database_format: database format (the binary, int8, pq and pca modes require ragdb)
+    :return: path of the saved database
+    """
+
+    quantization = {BenchmarkMode.INT8: QuantizationMethod.INT8,
+                    BenchmarkMode.PQ: QuantizationMethod.PQ}.get(mode, QuantizationMethod.NONE)
+    projection = ProjectionMethod.PCA if mode == BenchmarkMode.PCA else ProjectionMethod.NONE
+    binary_signatures = mode == BenchmarkMode.BINARY
+
+    if database_format == DatabaseFormat.RAGDB:
+        rag_db_path = os.path.join(directory, f"{mode.value}_database{COLUMNAR_DATABASE_EXTENSION}")
+        extra_arrays, extra_header = build_search_arrays(database, quantization=quantization,
+                                                         binary_signatures=binary_signatures, projection=projection)
+        save_columnar_database(destination_path=rag_db_path, database=database, extra_arrays=extra_arrays,
+                               extra_header=extra_header)
+    elif mode in (BenchmarkMode.EXACT, BenchmarkMode.IVF):
+        rag_db_path = os.path.join(directory, f"{mode.value}_database.pkl")
+        save_pkl_database(destination_path=rag_db_path, database=database)
+    else:
+        raise ValueError(f"The '{mode.value}' mode requires the 'ragdb' database format.")
+
+    if mode == BenchmarkMode.IVF:
+        save_ivf_index(destination_path=get_ivf_index_path(rag_db_path),
+                       ivf_index=build_ivf_index(stack_database_embeddings(database)), rag_db_path=rag_db_path)
+    return rag_db_path
+
+
+def summarize_latencies(latencies: list[float]) -> dict:
+    """
+    :param latencies: measured latencies (in seconds)
+    :return: p50, p95, p99 and mean latencies (in milliseconds)
+    """
+
+    milliseconds = np.asarray(latencies) * 1000
+    p50, p95, p99 = np.percentile(milliseconds, [50, 95, 99])
+    return {"p50_ms": round(float(p50), 4), "p95_ms": round(float(p95), 4), "p99_ms": round(float(p99), 4),
+            "mean_ms": round(float(np.mean(milliseconds)), 4), "count": len(latencies)}
+
+
+def recall_at_k(index_matrix: np.ndarray, exact_index_matrix: np.ndarray) -> float:
+    """
+    :param index_matrix: indices retrieved for each query, shape (num_queries, k)
+    :param exact_index_matrix: indices retrieved by the exact search, shape (num_queries, k)
+    :return: mean fraction of the exact results retrieved
+    """
+
+    return float(np.mean([len(np.intersect1d(indices, exact_indices)) / len(exact_indices)
+                          for indices, exact_indices in zip(index_matrix, exact_index_matrix)]))
+
+
+def make_queries(database: dict, num_queries: int, query_noise: float = 0.4, seed: int = 1) -> np.ndarray:
+    """
+    :param database: database dictionary
+    :param num_queries: number of queries
+    :param query_noise: norm of the noise added to the embedding of a random entry (before normalization)
+    :param seed: random seed
+    :return: normalized query embeddings of shape (num_queries, dim), each one close to a database entry
+    """
+
+    rng = np.random.default_rng(seed)
+    embeddings = stack_database_embeddings(database)
+    embeddings = embeddings[rng.integers(len(embeddings), size=num_queries)]
+    noise = rng.standard_normal(embeddings.shape).astype(np.float32) * (query_noise / np.sqrt(embeddings.shape[1]))
+    return l2_normalize(embeddings + noise)
+
+
+def benchmark_embedding(embedding_model: EmbeddingModel, texts: list[str], warmup: int = 3) -> dict:
+    """
+    :param embedding_model: embedding model
+    :param texts: query texts, embedded one at a time
+    :param warmup: number of untimed queries run first
+    :return: latency statistics of the embedding model
+    """
+
+    for text in texts[:warmup]:
+        embedding_model.encode(text)
+    latencies = []
+    for text in texts:
+        start_time = time.perf_counter()
+        embedding_model.encode(text)
+        latencies.append(time.perf_counter() - start_time)
+    return summarize_latencies(latencies)
+
+
+def benchmark_database(rag_db_path: str,
+                       query_matrix: np.ndarray,
+                       embedding_model: EmbeddingModel,
+                       top_k: int,
+                       best_k: int,
+                       reranking: bool,
+                       scan_threads: int,
+                       load_repeats: int,
+                       warmup: int = 3) -> dict:
+    """
+    Measure the load, search and rerank stages of a Retriever on a database, and the recall@top_k of its search
+    engine against the exact search. The approximate search structures are used whatever the database size.
+    :param rag_db_path: path of the database
+    :param query_matrix: query embeddings, searched one at a time
+    :param embedding_model: embedding model shared by the retrievers
+    :param top_k: number of chunks pre-selected by the search
+    :param best_k: number of chunks kept by the reranking
+    :param reranking: rerank the pre-selected chunks
+    :param scan_threads: number of threads of the exact scan
+    :param load_repeats: number of times the Retriever is created
+    :param warmup: number of untimed queries run first
+    :return: benchmark results of the database
+    """
+
+    load_latencies = []
+    for _ in range(max(1, load_repeats)):
+        start_time = time.perf_counter()
+        with redirect_stdout(io.StringIO()):
+            retriever = Retriever(top_k=top_k, reranking=reranking, best_k=best_k, rag_db_path=rag_db_path,
+                                  ann_min_database_size=0, scan_threads=scan_threads, query_cache_size=0,
+                                  hybrid_search=False, out_of_domain_detection=False, intent_detection=False,
+                                  embedding_model=embedding_model)
+        load_latencies.append(time.perf_counter() - start_time)
+
+    search_engine = retriever.search_engine
+    for query_embedding in query_matrix[:warmup]:
+        search_engine.search(query_embedding, k=top_k)
+
+    search_latencies, rerank_latencies, index_list = [], [], []
+    for query_embedding in query_matrix:
+        start_time = time.perf_counter()
+        similarities, indices = search_engine.search(query_embedding, k=top_k)
+        search_latencies.append(time.perf_counter() - start_time)
+
+        start_time = time.perf_counter()
+        retriever._select_best(similarities, indices, query_embedding)
+        rerank_latencies.append(time.perf_counter() - start_time)
+        index_list.append(indices)
+
+    _, exact_index_matrix = DenseSearchEngine(search_engine.embeddings, normalize=False).search(query_matrix, k=top_k)
+    return {"search_engine": type(search_engine).__name__,
+            "database_bytes": os.path.getsize(rag_db_path),
+            "load": summarize_latencies(load_latencies),
+            "search": summarize_latencies(search_latencies),
+            "rerank": summarize_latencies(rerank_latencies),
+            f"recall@{top_k}": round(recall_at_k(np.stack(index_list), exact_index_matrix), 4)}
+
+
+def run_benchmark(sizes: list[int],
+                  modes: list[BenchmarkMode],
+                  database_format: DatabaseFormat = DatabaseFormat.RAGDB,
+                  num_queries: int = 200,
+                  top_k: int = Config.top_k,
+                  best_k: int = Config.best_k,
+                  reranking: bool = True,
+                  scan_threads: int = Config.scan_threads,
+                  load_repeats: int = 5,
+                  seed: int = 0) -> dict:
+    """
+    Benchmark the retrieval stages on synthetic databases of several sizes, for several search modes.
+    :param sizes: numbers of database entries
+    :param modes: search modes
+    :param database_format: format of the synthetic databases
+    :param num_queries: number of queries per database
+    :param top_k: number of chunks pre-selected by the search
+    :param best_k: number of chunks kept by the reranking
+    :param reranking: rerank the pre-selected chunks
+    :param scan_threads: number of threads of the exact scan
+    :param load_repeats: number of times each database is loaded
+    :param seed: random seed of the synthetic databases
+    :return: benchmark report (JSON-serializable)
+    """
+
+    embedding_model = EmbeddingModel(name="all-MiniLM-L6-v2")
+    report = {"timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+              "platform": {"machine": platform.machine(), "system": platform.system(), "cpu_count": os.cpu_count(),
+                           "python": platform.python_version(), "numpy": np.__version__},
+              "config": {"format": DatabaseFormat(database_format).value, "num_queries": num_queries, "top_k": top_k,
+                         "best_k": best_k, "reranking": reranking, "scan_threads": scan_threads,
+                         "load_repeats": load_repeats, "seed": seed},
+              "results": []}
+
+    for num_entries in sizes:
+        database = synthesize_database(num_entries, seed=seed)
+        query_matrix = make_queries(database, num_queries, seed=seed + 1)
+        if "embed" not in report:
+            # The embedding latency does not depend on the database
+            texts = [database[index]["chunks"][0] for index in range(min(num_queries, num_entries))]
+            report["embed"] = benchmark_embedding(embedding_model, texts)
+
+        with tempfile.TemporaryDirectory(prefix="rag_bench_") as directory:
+            for mode in modes:
+                start_time = time.perf_counter()
+                rag_db_path = save_benchmark_database(database, directory, BenchmarkMode(mode), database_format)
+                build_seconds = time.perf_counter() - start_time
+
+                result = {"num_entries": num_entries, "mode": BenchmarkMode(mode).value,
+                          "build_s": round(build_seconds, 3)}
+                result.update(benchmark_database(rag_db_path, query_matrix, embedding_model, top_k=top_k,
+                                                 best_k=best_k, reranking=reranking, scan_threads=scan_threads,
+                                                 load_repeats=load_repeats))
+                report["results"].append(result)
+                print(Fore.LIGHTGREEN_EX,
+                      f"\r{num_entries:>8} entries {result['mode']:>6}: "
+                      f"load p50 {result['load']['p50_ms']:.2f} ms, "
+                      f"search p50/p99 {result['search']['p50_ms']:.3f}/{result['search']['p99_ms']:.3f} ms, "
+                      f"rerank p50 {result['rerank']['p50_ms']:.3f} ms, "
+                      f"recall@{top_k} {result[f'recall@{top_k}']:.3f}", Fore.RESET)
+                os.remove(rag_db_path)
+    return report
+
+
+def main():
+    app = typer.Typer(
+        name="Retrieval benchmark",
+        add_completion=False,
+        context_settings={"help_option_names": ["-h", "--help"]},
+    )
+
+    @app.command()
+    def parse_args(
+            sizes: list[int] = typer.Option(
+                [1000, 10000, 100000, 1000000],
+                "--size", "-n",
+                help="Number of entries of a synthetic database ('-n 1000 -n 100000 ...' for several sizes).",
+                show_default=True
+            ),
+            modes: list[BenchmarkMode] = typer.Option(
+                [mode.value for mode in BenchmarkMode],
+                "--mode", "-m",
+                help="Search mode to benchmark ('-m exact -m ivf ...' for several modes). The recall of the "
+                     "approximate modes is measured against the exact search.",
+                show_default=True
+            ),
+            database_format: DatabaseFormat = typer.Option(
+                "ragdb",
+                "--format",
+                help="Format of the synthetic databases (the binary, int8, pq and pca modes require ragdb).",
+                show_default=True
+            ),
+            num_queries: int = typer.Option(
+                200,
+                "--queries", "-q",
+                help="Number of queries per database.",
+                show_default=True
+            ),
+            top_k: int = typer.Option(
+                Config.top_k,
+                "--top-k", "-t",
+                help="Number of chunks pre-selected by the search (recall@top_k is reported).",
+                show_default=True
+            ),
+            best_k: int = typer.Option(
+                Config.best_k,
+                "--best-k", "-b",
+                help="Number of chunks kept by the reranking.",
+                show_default=True
+            ),
+            no_reranking: bool = typer.Option(
+                False,
+                "--no-reranking", "-r",
+                help="Disable the reranking of the pre-selected chunks.",
+            ),
+            scan_threads: int = typer.Option(
+                Config.scan_threads,
+                "--scan-threads",
+                help="Number of threads of the exact scan.",
+                show_default=True
+            ),
+            load_repeats: int = typer.Option(
+                5,
+                "--load-repeats",
+                help="Number of times each database is loaded.",
+                show_default=True
+            ),
+            output_path: str = typer.Option(
+                "retrieval_benchmark.json",
+                "--output", "-o",
+                help="Path of the JSON report ('-' prints it on stdout, the progress is then printed on stderr).",
+                show_default=True
+            )
+    ):
+        """
+        Benchmark the latency (p50/p95/p99) of the retrieval stages (load, embed, search, rerank) on synthetic
+        databases of several sizes, and the recall of the approximate search modes.
+        """
+
+        # When the report is printed, the progress goes to stderr so that stdout only holds the JSON report
+        with redirect_stdout(sys.stderr) if output_path == "-" else nullcontext():
+            report = run_benchmark(sizes=sizes, modes=modes, database_format=database_format,
+                                   num_queries=num_queries, top_k=top_k, best_k=best_k, reranking=not no_reranking,
+                                   scan_threads=scan_threads, load_repeats=load_repeats)
+        if output_path == "-":
+            json.dump(report, sys.stdout, indent=2)
+        else:
+            with open(output_path, "w") as f:
+                json.dump(report, f, indent=2)
+            print(Fore.LIGHTGREEN_EX, "\rSuccessfully saved the benchmark report at: ", output_path, Fore.RESET)
+
+    app()
+
+
+if __name__ == '__main__':
+    main()
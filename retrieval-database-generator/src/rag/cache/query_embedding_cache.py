@@ -0,0 +1,123 @@
+# Copyright 2025 NXP
+# NXP Proprietary.
+# This software is owned or controlled by NXP and may only be used strictly in
+# accordance with the applicable license terms. By expressly accepting such
+# terms or by downloading, installing, activating and/or otherwise using the
+# software, you are agreeing that you have read, and that you agree to comply
+# with and are bound by, such license terms. If you do not agree to be bound
+# by the applicable license terms, then you may not retain, install, activate
+# or otherwise use the software.
+
+import os
+import atexit
+import numpy as np
+from collections import OrderedDict
+from colorama import Fore
+
+
+def normalize_query(query: str) -> str:
+    """
+    Normalize a query the same way as the (uncased) embedding tokenizer, so that queries only differing by their case
+    or their whitespaces share the same embedding.
+    :param query: user query
+    :return: normalized query used as cache key
+    """
+
+    return " ".join(query.split()).lower()
+
+
+class QueryEmbeddingCache:
+    """
+    Bounded LRU cache of query embeddings, keyed on the normalized query text. If `cache_path` is set, the cache is
+    loaded from this file at startup and saved back at exit (or when `save` is called), so it survives restarts.
+    """
+
+    def __init__(self, max_size: int, embedding_model_version: str, cache_path: str = None):
+        """
+        :param max_size: maximum number of cached queries (least recently used queries are evicted first)
+        :param embedding_model_version: embedding model computing the embeddings (a cache file saved with another
+        model is ignored)
+        :param cache_path: file in which the cache is persisted (None to keep it in memory only)
+        """
+
+        self.max_size = max_size
+        self.embedding_model_version = embedding_model_version
+        self.cache_path = cache_path
+        self.hits = 0
+        self.misses = 0
+        self._embeddings = OrderedDict()
+
+        if cache_path is not None:
+            if os.path.isfile(cache_path):
+                self.load()
+            atexit.register(self.save)
+
+    def __len__(self) -> int:
+        return len(self._embeddings)
+
+    def get(self, query: str) -> np.ndarray | None:
+        """
+        :param query: user query
+        :return: cached embedding of the query, or None if the query is not cached
+        """
+
+        key = normalize_query(query)
+        embedding = self._embeddings.get(key)
+        if embedding is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._embeddings.move_to_end(key)
+        return embedding
+
+    def put(self, query: str, embedding: np.ndarray) -> None:
+        """
+        :param query: user query
+        :param embedding: embedding of the query, shape (dim,)
+        :return: None
+        """
+
+        if self.max_size <= 0:
+            return
+        key = normalize_query(query)
+        self._embeddings[key] = np.asarray(embedding, dtype=np.float32).reshape(-1)
+        self._embeddings.move_to_end(key)
+        while len(self._embeddings) > self.max_size:
+            self._embeddings.popitem(last=False)
+
+    @property
+    def stats(self) -> str:
+        return f"{self.hits} hits / {self.misses} misses ({len(self)} queries cached)"
+
+    def save(self) -> None:
+        """
+        Save the cache in `cache_path` (least recently used queries first).
+        :return: None
+        """
+
+        if self.cache_path is None or not self._embeddings:
+            return
+        temporary_path = self.cache_path + ".tmp"
+        with open(temporary_path, "wb") as f:
+            np.savez(f,
+                     queries=np.array(list(self._embeddings.keys()), dtype=str),
+                     embeddings=np.stack(list(self._embeddings.values())),
+                     embedding_model=np.array(self.embedding_model_version))
+        os.replace(temporary_path, self.cache_path)
+
+    def load(self) -> None:
+        """
+        Load the cache saved in `cache_path`.
+        :return: None
+        """
+
+        try:
+            with np.load(self.cache_path) as data:
+                if str(data["embedding_model"]) != self.embedding_model_version:
+                    print(Fore.RED, f"Warning: {self.cache_path} was computed with another embedding model, it is "
+                                    f"ignored.", Fore.RESET)
+                    return
+                for query, embedding in zip(data["queries"].tolist(), data["embeddings"]):
+                    self.put(query, embedding)
+        except (OSError, ValueError, KeyError) as e:
+            print(Fore.RED, f"Warning: unable to load the query embedding cache {self.cache_path}: {e}", Fore.RESET)
@@ -0,0 +1,155 @@
+# Copyright 2025 NXP
+# NXP Proprietary.
+# This software is owned or controlled by NXP and may only be used strictly in
+# accordance with the applicable license terms. By expressly accepting such
+# terms or by downloading, installing, activating and/or otherwise using the
+# software, you are agreeing that you have read, and that you agree to comply
+# with and are bound by, such license terms. If you do not agree to be bound
+# by the applicable license terms, then you may not retain, install, activate
+# or otherwise use the software.
+
+import os
+import numpy as np
+from rag.search.dense_search import l2_normalize
+
+
+class SemanticCacheEntry:
+    """Result cached for a previously answered query."""
+
+    __slots__ = ("query", "result", "sources", "answer", "audio")
+
+    def __init__(self, query: str, result: tuple[list, list, list]):
+        self.query = query
+        self.result = result
+        self.sources = {metadata.get("source") for metadata in result[2]}
+        self.answer = None
+        self.audio = None
+
+
+def get_file_signature(path: str) -> tuple[int, int] | None:
+    """
+    :param path: path of a file
+    :return: modification time and size of the file (None if it does not exist)
+    """
+
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
+
+class SemanticCache:
+    """
+    Cache of the results of previously answered queries, looked up by embedding: a new query whose cosine similarity
+    with a cached query is above `threshold` reuses its retrieval result (and its final answer and synthesized audio,
+    if the application stored them). The least recently used entry is evicted when the cache is full, and the whole
+    cache is invalidated when the database file changes.
+    """
+
+    def __init__(self, max_size: int, threshold: float, rag_db_path: str):
+        """
+        :param max_size: maximum number of cached queries (0 disables the cache)
+        :param threshold: minimum cosine similarity between a query and a cached query to reuse its result
+        :param rag_db_path: path of the RAG database the results were retrieved from
+        """
+
+        self.max_size = max_size
+        self.threshold = threshold
+        self.rag_db_path = rag_db_path
+        self.hits = 0
+        self.misses = 0
+        self._db_signature = get_file_signature(rag_db_path)
+        self._embeddings = None
+        self._entries = [None] * max_size
+        self._last_used = np.zeros(max_size, dtype=np.int64)
+        self._clock = 0
+
+    def __len__(self) -> int:
+        return sum(entry is not None for entry in self._entries)
+
+    @property
+    def stats(self) -> str:
+        return f"{self.hits} hits / {self.misses} misses ({len(self)} queries cached)"
+
+    def clear(self) -> None:
+        self._entries = [None] * self.max_size
+        self._last_used[:] = 0
+
+    def invalidate(self, source: str = None) -> None:
+        """
+        Remove the cached results retrieved from a source (e.g. a chunked file that was updated), or every result.
+        :param source: source (metadata "source" field) of the results to remove, None to clear the cache
+        :return: None
+        """
+
+        if source is None:
+            self.clear()
+            return
+        for slot, entry in enumerate(self._entries):
+            if entry is not None and source in entry.sources:
+                self._entries[slot] = None
+                self._last_used[slot] = 0
+
+    def _check_database(self) -> None:
+        """Clear the cache if the database file was modified since the results were cached."""
+        db_signature = get_file_signature(self.rag_db_path)
+        if db_signature != self._db_signature:
+            self._db_signature = db_signature
+            self.clear()
+
+    def lookup(self,
+               query_embedding: np.ndarray,
+               update_stats: bool = True) -> tuple[SemanticCacheEntry | None, float]:
+        """
+        :param query_embedding: embedding of the query, shape (dim,)
+        :param update_stats: count the lookup in the hit/miss counters
+        :return: most similar cached entry (None if its similarity is below the threshold) and its similarity
+        """
+
+        if self.max_size <= 0:
+            return None, 0.
+        self._check_database()
+        used_slots = np.flatnonzero(self._last_used)
+        similarity = 0.
+        if len(used_slots) > 0:
+            similarities = self._embeddings[used_slots] @ l2_normalize(query_embedding).reshape(-1)
+            best = int(np.argmax(similarities))
+            similarity = float(similarities[best])
+
+        if similarity < self.threshold or len(used_slots) == 0:
+            if update_stats:
+                self.misses += 1
+            return None, similarity
+
+        if update_stats:
+            self.hits += 1
+        slot = used_slots[best]
+        self._clock += 1
+        self._last_used[slot] = self._clock
+        return self._entries[slot], similarity
+
+    def add(self,
+            query: str,
+            query_embedding: np.ndarray,
+            result: tuple[list, list, list]) -> SemanticCacheEntry | None:
+        """
+        Cache the retrieval result of a query, evicting the least recently used entry if the cache is full.
+        :param query: user query
+        :param query_embedding: embedding of the query, shape (dim,)
+        :param result: chunks, similarities and metadata retrieved for the query
+        :return: the cached entry (None if the cache is disabled)
+        """
+
+        if self.max_size <= 0:
+            return None
+        query_embedding = l2_normalize(query_embedding).reshape(-1)
+        if self._embeddings is None:
+            self._embeddings = np.zeros((self.max_size, len(query_embedding)), dtype=np.float32)
+
+        slot = int(np.argmin(self._last_used))  # free slot, or least recently used entry
+        self._clock += 1
+        self._last_used[slot] = self._clock
+        self._embeddings[slot] = query_embedding
+        self._entries[slot] = SemanticCacheEntry(query, result)
+        return self._entries[slot]
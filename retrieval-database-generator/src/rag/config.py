@@ -17,7 +17,89 @@ class Config:
 
     top_k: int = 3  # The number of element pre-selected in the database.
     reranking: bool = True  # Activate the reranking option.
+    reranking_weight: float = 0.5  # Weight of the question similarity in the reranked score (0.5 = average).
     best_k: int = 1  # The number of element among --top-k added top the prompt (must be <= top_k).
+    deduplication_factor: int = 2  # Duplicated chunks are collapsed among top_k * factor candidates (0 disables it).
+
+    ############################################ Approximate search parameters #########################################
+
+    # (Only used if an IVF index or binary signatures were generated with the database)
+    ann_min_database_size: int = 20000  # Below this number of embeddings, the exact scan is used.
+
+    # (Only used if an IVF index was generated next to the database with --ann-index)
+    ann_nprobe: int = 8  # Number of inverted lists scanned per query. Higher is more accurate but slower.
+
+    # (Only used if the database was generated with --binary-signatures)
+    binary_num_candidates: int = 300  # Number of candidates kept by the Hamming prefilter and rescored exactly.
+
+    # (Only used if the database was generated with --quantization or --projection)
+    quantized_rescoring_factor: int = 10  # top_k * factor candidates are rescored exactly (0 disables rescoring).
+
+    ############################################ Multi-core scan parameters ############################################
+
+    # (Only used by the exact scan. Leave cores to the LLM decoding threads, e.g. 2 scan threads on the 6-core i.MX95)
+    scan_threads: int = 1  # Number of threads scanning partitions of the database (1 = single-threaded scan).
+    scan_min_partition_size: int = 4096  # Minimum number of embeddings per partition (small databases use fewer).
+
+    ############################################## Hybrid search parameters ############################################
+
+    # (Only used if a BM25 index was generated next to the database with --bm25-index)
+    hybrid_search: bool = True  # Fuse the BM25 (lexical) and dense rankings with reciprocal rank fusion.
+    rrf_k: int = 60  # Reciprocal rank fusion constant. Higher values give less weight to the first ranks.
+    lexical_num_candidates: int = 100  # Number of candidates of each ranking fused together.
+    # Only compute the dense similarity of the BM25 candidates instead of scanning the whole database (faster on large
+    # databases, but the chunks without any word of the query can no longer be retrieved)
+    lexical_prefilter: bool = False
+
+    ################################################## Cache parameters ################################################
+
+    query_cache_size: int = 1024  # Number of query embeddings kept in the LRU cache (0 disables the cache).
+    semantic_cache_size: int = 0  # Number of retrieval results kept in the semantic cache (0 disables the cache).
+    semantic_cache_threshold: float = 0.95  # Minimum similarity with a cached query to reuse its result.
+
+    ############################################# Out-of-domain parameters #############################################
+
+    # (Only used if the database was generated with a garbage_model.json file)
+    out_of_domain_detection: bool = True  # Return an "out_of_domain" result without searching for garbage queries.
+    out_of_domain_margin: float = 0.0  # Added to the classifier threshold. Negative values flag more queries.
+
+    ############################################### Diversity parameters ###############################################
+
+    # (Only used if best_k < top_k) The best_k chunks are selected among the top_k ones with maximal marginal relevance.
+    mmr_lambda: float = 1.0  # Trade-off between relevance (1 disables the diversity) and diversity (0) of the chunks.
+    near_duplicate_threshold: float = 0.0  # Chunks this similar to a selected chunk are skipped (0 disables it).
+
+    ############################################ Adaptive top-k parameters #############################################
+
+    # The best chunk is always returned. Fewer chunks make shorter prompts and a faster LLM prefill.
+    min_similarity: float = 0.0  # Chunks below this similarity are dropped (0 disables this cut-off).
+    relative_similarity: float = 0.0  # Chunks below this fraction of the best similarity are dropped (e.g. 0.8).
+    context_token_budget: int = 0  # Maximum number of LLM tokens of the returned chunks (0 disables the budget).
+
+    ################################################ Intent parameters #################################################
+
+    # (Only used if the database contains chunks with an "intent", e.g. the Screen_Manager commands)
+    intent_detection: bool = True  # Detect commands before the retrieval (the result is the matched command chunk).
+    intent_threshold: float = 0.8  # Minimum word n-gram similarity with a command, checked before the embedding model.
+    intent_embedding_threshold: float = 0.9  # Minimum cosine similarity with a command (above 1 disables this stage).
+
+    ############################################### Sharding parameters ################################################
+
+    # (Only used if several databases are given to the ShardedRetriever)
+    routing_centroids: int = 8  # Number of k-means centroids summarizing each database shard for the routing.
+    max_routed_shards: int = 2  # Maximum number of shards searched per query.
+    routing_margin: float = 0.1  # Shards whose routing score is within this margin of the best one are searched.
+
+    ######################################## Asynchronous retrieval parameters #########################################
+
+    # (Only used by the AsyncRetriever)
+    async_max_batch_size: int = 16  # Maximum number of concurrent queries retrieved together.
+    async_batch_delay: float = 0.002  # Time (in seconds) waited for other queries before retrieving a batch.
+
+    ######################################### Speculative retrieval parameters #########################################
+
+    # (Only used by Retriever.start_speculation, with the partial transcripts of a streaming ASR)
+    speculative_min_words: int = 2  # Minimum number of completed words before the first speculative retrieval.
 
     ################################################ Chunking parameters ###############################################
 
@@ -0,0 +1,172 @@
+# Copyright 2025 NXP
+# NXP Proprietary.
+# This software is owned or controlled by NXP and may only be used strictly in
+# accordance with the applicable license terms. By expressly accepting such
+# terms or by downloading, installing, activating and/or otherwise using the
+# software, you are agreeing that you have read, and that you agree to comply
+# with and are bound by, such license terms. If you do not agree to be bound
+# by the applicable license terms, then you may not retain, install, activate
+# or otherwise use the software.
+
+import sys
+import numpy as np
+from collections.abc import Sequence
+from rag.database.columnar_database import DATABASE_INFO_KEYS, OUT_OF_DOMAIN_CLASSIFIER_KEY, INTENT_INDEX_KEY, \
+    get_database_entries
+
+# Keys of a database entry that are not metadata
+_ENTRY_DATA_KEYS = ("embeddings", "chunks", "reranking_embedding")
+
+
+class ValuePool:
+    """Pool of unique metadata values: equal values are stored once and referred to by an integer id."""
+
+    __slots__ = ("values", "_ids")
+
+    def __init__(self):
+        self.values = []
+        self._ids = {}
+
+    def add(self, value) -> int:
+        """
+        :param value: metadata value (strings are interned)
+        :return: id of the value in the pool
+        """
+
+        if isinstance(value, str):
+            value = sys.intern(value)
+        try:
+            key = (type(value), value)
+            value_id = self._ids.get(key)
+        except TypeError:
+            # Unhashable value (e.g. a list): compared by its representation
+            key = (type(value), repr(value))
+            value_id = self._ids.get(key)
+        if value_id is None:
+            value_id = self._ids[key] = len(self.values)
+            self.values.append(value)
+        return value_id
+
+
+class MetadataTable:
+    """
+    Columnar metadata table with one row per database entry: each column holds, for every entry, the id of its value
+    in a shared pool of unique values (-1 if the entry does not have this key).
+    """
+
+    __slots__ = ("keys", "value_ids", "pool")
+
+    def __init__(self, entries: list[dict]):
+        """
+        :param entries: metadata dictionary of each database entry
+        """
+
+        self.pool = ValuePool()
+        self.keys = []
+        key_ids = {}
+        rows = []
+        for entry in entries:
+            row = {}
+            for key, value in entry.items():
+                if key not in key_ids:
+                    key_ids[key] = len(self.keys)
+                    self.keys.append(sys.intern(key))
+                row[key_ids[key]] = self.pool.add(value)
+            rows.append(row)
+
+        self.value_ids = np.full((len(rows), len(self.keys)), -1, dtype=np.int32)
+        for entry_id, row in enumerate(rows):
+            self.value_ids[entry_id, list(row.keys())] = list(row.values())
+
+    def __len__(self) -> int:
+        return len(self.value_ids)
+
+    def row(self, entry_id: int) -> dict:
+        """
+        :param entry_id: index of the database entry
+        :return: metadata dictionary of the entry
+        """
+
+        return {key: self.pool.values[value_id] for key, value_id in zip(self.keys, self.value_ids[entry_id].tolist())
+                if value_id >= 0}
+
+
+class ChunkMetadataList(Sequence):
+    """Read-only list of metadata dictionaries, one per chunk, built on access from the entry metadata table."""
+
+    __slots__ = ("_entry_ids", "_table")
+
+    def __init__(self, entry_ids: np.ndarray, table: MetadataTable):
+        self._entry_ids = entry_ids
+        self._table = table
+
+    def __len__(self) -> int:
+        return len(self._entry_ids)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        return self._table.row(int(self._entry_ids[index]))
+
+
+class ChunkStore:
+    """
+    Compact in-memory store of a pickle RAG database (as created by `generate_embeddings`):
+        - embeddings:           single preallocated (num_embeddings, dim) float32 buffer of L2-normalized embeddings
+        - reranking_embeddings: (num_entries, dim) one L2-normalized reranking embedding per database entry
+        - entry_ids:            (num_embeddings,) database entry of each chunk
+        - chunk_ids:            (num_embeddings,) chunk text id of each embedding
+        - chunk_list:           chunk texts, one per embedding (interned, so duplicated chunks are stored once)
+        - metadata:             columnar metadata table, one row per database entry
+
+    It exposes the same attributes as `ColumnarDatabase`, so the Retriever uses both the same way.
+    """
+
+    __slots__ = ("info", "embeddings", "reranking_embeddings", "entry_ids", "chunk_ids", "chunk_list", "metadata",
+                 "out_of_domain_classifier", "intent_index")
+
+    normalized = True
+
+    def __init__(self, database: dict):
+        """
+        :param database: dictionary containing the database information and one entry per chunked file item, each
+        entry holding its chunks, their embeddings, a reranking embedding and metadata
+        """
+
+        self.info = {key: database[key] for key in DATABASE_INFO_KEYS if key in database}
+        self.out_of_domain_classifier = database.get(OUT_OF_DOMAIN_CLASSIFIER_KEY)
+        self.intent_index = database.get(INTENT_INDEX_KEY)
+        entries = get_database_entries(database)
+        if not entries:
+            raise ValueError("The database does not contain any entry.")
+
+        num_chunks = np.array([len(entry["embeddings"]) for entry in entries], dtype=np.int64)
+        offsets = np.concatenate(([0], np.cumsum(num_chunks)))
+        dim = np.shape(entries[0]["embeddings"])[-1]
+
+        self.embeddings = np.empty((offsets[-1], dim), dtype=np.float32)
+        self.reranking_embeddings = np.zeros((len(entries), dim), dtype=np.float32)
+        self.chunk_list = []
+        for entry_id, entry in enumerate(entries):
+            if len(entry["chunks"]) != num_chunks[entry_id]:
+                raise ValueError("Every entry must contain as many chunks as embeddings.")
+            self.embeddings[offsets[entry_id]:offsets[entry_id + 1]] = np.asarray(entry["embeddings"])
+            if "reranking_embedding" in entry:
+                self.reranking_embeddings[entry_id] = np.asarray(entry["reranking_embedding"]).reshape(-1)
+            self.chunk_list.extend(sys.intern(chunk) for chunk in entry["chunks"])
+
+        # Embeddings sharing the same chunk text share the same chunk id
+        chunk_id_by_text = {}
+        self.chunk_ids = np.array([chunk_id_by_text.setdefault(chunk, len(chunk_id_by_text))
+                                   for chunk in self.chunk_list], dtype=np.int32)
+
+        for matrix in (self.embeddings, self.reranking_embeddings):
+            matrix /= np.maximum(np.linalg.norm(matrix, axis=-1, keepdims=True), 1e-12)
+
+        self.entry_ids = np.repeat(np.arange(len(entries), dtype=np.int32), num_chunks)
+        self.metadata = MetadataTable([{key: value for key, value in entry.items() if key not in _ENTRY_DATA_KEYS}
+                                       for entry in entries])
+
+    @property
+    def metadata_list(self) -> ChunkMetadataList:
+        return ChunkMetadataList(self.entry_ids, self.metadata)
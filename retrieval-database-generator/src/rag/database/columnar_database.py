@@ -0,0 +1,390 @@
+# Copyright 2025 NXP
+# NXP Proprietary.
+# This software is owned or controlled by NXP and may only be used strictly in
+# accordance with the applicable license terms. By expressly accepting such
+# terms or by downloading, installing, activating and/or otherwise using the
+# software, you are agreeing that you have read, and that you agree to comply
+# with and are bound by, such license terms. If you do not agree to be bound
+# by the applicable license terms, then you may not retain, install, activate
+# or otherwise use the software.
+
+import os
+import json
+import mmap
+import hashlib
+import struct
+import numpy as np
+from collections.abc import Sequence
+
+COLUMNAR_DATABASE_EXTENSION = ".ragdb"
+COLUMNAR_DATABASE_MAGIC = b"RAGDB\x00\x01\x00"
+COLUMNAR_DATABASE_VERSION = 1
+DATABASE_INFO_KEYS = ("embedding_model", "database_description", "database_generator_files")
+OUT_OF_DOMAIN_CLASSIFIER_KEY = "out_of_domain_classifier"
+INTENT_INDEX_KEY = "intent_index"
+# Chunked files whose entries are removed by a delta segment
+DELETED_FILES_KEY = "deleted_chunked_files"
+# Keys of a database dictionary that are not entries
+NON_ENTRY_KEYS = DATABASE_INFO_KEYS + (OUT_OF_DOMAIN_CLASSIFIER_KEY, INTENT_INDEX_KEY, DELETED_FILES_KEY)
+# Metadata field of an entry holding the name of its chunked file
+CHUNKED_FILE_KEY = "chunked_file"
+# Key of the side indexes (IVF, BM25) holding the fingerprint of the database they were built for
+DATABASE_FINGERPRINT_KEY = "database_fingerprint"
+_ALIGNMENT = 64
+
+
+def is_columnar_database(rag_db_path: str) -> bool:
+    """
+    :param rag_db_path: path of the RAG database
+    :return: True if the file is a columnar RAG database
+    """
+
+    with open(rag_db_path, "rb") as f:
+        return f.read(len(COLUMNAR_DATABASE_MAGIC)) == COLUMNAR_DATABASE_MAGIC
+
+
+def get_database_fingerprint(rag_db_path: str) -> str:
+    """
+    :param rag_db_path: path of the RAG database
+    :return: fingerprint of the database content (stored in the header of the columnar databases, so that their
+    sections are not read; SHA-256 of the file for the other databases)
+    """
+
+    if is_columnar_database(rag_db_path):
+        fingerprint = ColumnarDatabase(rag_db_path).header.get("fingerprint")
+        if fingerprint is not None:
+            return fingerprint
+    digest = hashlib.sha256()
+    with open(rag_db_path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def check_database_fingerprint(index: dict, index_path: str, rag_db_path: str) -> None:
+    """
+    Check that a side index was built for the current version of the database.
+    :param index: loaded index
+    :param index_path: path of the index file
+    :param rag_db_path: path of the RAG database
+    :return: None
+    :raise ValueError: if the database was re-generated or updated after the index was built
+    """
+
+    if DATABASE_FINGERPRINT_KEY not in index or \
+            str(index[DATABASE_FINGERPRINT_KEY]) != get_database_fingerprint(rag_db_path):
+        raise ValueError(f"{index_path} was built for another version of {rag_db_path}, please re-generate it.")
+
+
+def encode_strings(strings: list[str]) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Concatenate strings in a single utf-8 blob.
+    :param strings: list of strings
+    :return: offsets of shape (len(strings) + 1,) and the utf-8 blob; string i is blob[offsets[i]:offsets[i + 1]]
+    """
+
+    encoded_strings = [string.encode("utf-8") for string in strings]
+    offsets = np.zeros(len(encoded_strings) + 1, dtype=np.uint64)
+    offsets[1:] = np.cumsum([len(string) for string in encoded_strings], dtype=np.uint64)
+    return offsets, np.frombuffer(b"".join(encoded_strings), dtype=np.uint8)
+
+
+def write_columnar_database(destination_path: str, header: dict, arrays: dict[str, np.ndarray]) -> None:
+    """
+    Save a columnar database file. The file is written next to the destination and then renamed, so that a process
+    mapping the previous file keeps its pages (rewriting a mapped file in place makes the readers crash with SIGBUS).
+    :param destination_path: path of the created file
+    :param header: JSON-serializable database information
+    :param arrays: named arrays saved as sections of the file
+    :return: None
+    """
+
+    arrays = {name: np.ascontiguousarray(array) for name, array in arrays.items()}
+    sections = {}
+    offset = 0
+    for name, array in arrays.items():
+        sections[name] = {"offset": offset, "dtype": array.dtype.str, "shape": list(array.shape)}
+        offset += -(-array.nbytes // _ALIGNMENT) * _ALIGNMENT
+
+    header = dict(header, format_version=COLUMNAR_DATABASE_VERSION, sections=sections)
+    digest = hashlib.sha256(json.dumps(header, sort_keys=True).encode("utf-8"))
+    for array in arrays.values():
+        digest.update(memoryview(array.reshape(-1)).cast("B"))
+    header["fingerprint"] = digest.hexdigest()
+    header_bytes = json.dumps(header, ensure_ascii=False).encode("utf-8")
+    data_start = -(-(len(COLUMNAR_DATABASE_MAGIC) + 8 + len(header_bytes)) // _ALIGNMENT) * _ALIGNMENT
+
+    temporary_path = destination_path + ".tmp"
+    with open(temporary_path, "wb") as f:
+        f.write(COLUMNAR_DATABASE_MAGIC)
+        f.write(struct.pack("<Q", len(header_bytes)))
+        f.write(header_bytes)
+        for name, array in arrays.items():
+            f.seek(data_start + sections[name]["offset"])
+            f.write(array.tobytes())
+        f.truncate(data_start + offset)
+    os.replace(temporary_path, destination_path)
+
+
+def get_database_entries(database: dict) -> list[dict]:
+    """
+    :param database: dictionary as created by `generate_embeddings`
+    :return: database entries (chunks, embeddings and metadata of each chunked file item), in the Retriever order
+    """
+
+    return [value for key, value in database.items() if key not in NON_ENTRY_KEYS]
+
+
+def get_chunked_file(entry: dict) -> str | None:
+    """
+    :param entry: database entry (or its metadata)
+    :return: name of the chunked file the entry was generated from (its source for databases generated before this
+    field was stored)
+    """
+
+    return entry.get(CHUNKED_FILE_KEY, entry.get("source"))
+
+
+def stack_database_embeddings(database: dict) -> np.ndarray:
+    """
+    Stack the embeddings of every database entry in a single matrix.
+    :param database: dictionary as created by `generate_embeddings`
+    :return: L2-normalized float32 matrix of shape (num_embeddings, dim), rows in the Retriever order
+    """
+
+    embeddings = np.concatenate([np.asarray(entry["embeddings"], dtype=np.float32)
+                                 for entry in get_database_entries(database)], axis=0)
+    embeddings /= np.maximum(np.linalg.norm(embeddings, axis=-1, keepdims=True), 1e-12)
+    return embeddings
+
+
+def save_columnar_database(destination_path: str,
+                           database: dict,
+                           extra_arrays: dict[str, np.ndarray] = None,
+                           extra_header: dict = None) -> None:
+    """
+    Save a database dictionary (as created by `generate_embeddings`) in the columnar format.
+    :param destination_path: path of the created file
+    :param database: dictionary containing the database information and one entry per chunked file item, each entry
+    holding its chunks, their embeddings, a reranking embedding and metadata
+    :param extra_arrays: additional arrays (e.g. quantized embeddings) saved as sections of the file
+    :param extra_header: additional JSON-serializable information saved in the header
+    :return: None
+    """
+
+    header = {key: database[key] for key in DATABASE_INFO_KEYS if key in database}
+    header.update(extra_header or {})
+    extra_arrays = dict(extra_arrays or {})
+    if OUT_OF_DOMAIN_CLASSIFIER_KEY in database:
+        classifier = database[OUT_OF_DOMAIN_CLASSIFIER_KEY]
+        extra_arrays["out_of_domain_domain_centroids"] = classifier["domain_centroids"]
+        extra_arrays["out_of_domain_garbage_centroids"] = classifier["garbage_centroids"]
+        header["out_of_domain_threshold"] = float(classifier["threshold"])
+    if INTENT_INDEX_KEY in database:
+        header[INTENT_INDEX_KEY] = database[INTENT_INDEX_KEY]
+    entries = get_database_entries(database)
+    if not entries:
+        raise ValueError("The database does not contain any entry.")
+
+    embeddings = stack_database_embeddings(database)
+    dim = embeddings.shape[1]
+
+    reranking_embeddings = np.zeros((len(entries), dim), dtype=np.float32)
+    for i, entry in enumerate(entries):
+        if "reranking_embedding" in entry:
+            reranking_embeddings[i] = np.asarray(entry["reranking_embedding"], dtype=np.float32).reshape(-1)
+    reranking_embeddings /= np.maximum(np.linalg.norm(reranking_embeddings, axis=-1, keepdims=True), 1e-12)
+
+    entry_ids = np.repeat(np.arange(len(entries), dtype=np.uint32),
+                          [len(entry["chunks"]) for entry in entries])
+    if len(entry_ids) != len(embeddings):
+        raise ValueError("Every entry must contain as many chunks as embeddings.")
+
+    # Identical chunk texts are stored once, each embedding refers to its text through a chunk id
+    chunk_id_by_text = {}
+    chunk_ids = np.array([chunk_id_by_text.setdefault(chunk, len(chunk_id_by_text))
+                          for entry in entries for chunk in entry["chunks"]], dtype=np.uint32)
+    text_offsets, text_blob = encode_strings(list(chunk_id_by_text))
+    metadata_offsets, metadata_blob = encode_strings([
+        json.dumps({key: value for key, value in entry.items()
+                    if key not in ("embeddings", "chunks", "reranking_embedding")}, ensure_ascii=False)
+        for entry in entries
+    ])
+
+    header.update(num_embeddings=len(embeddings), num_entries=len(entries), dim=dim, dtype="float32",
+                  normalized=True)
+    write_columnar_database(destination_path, header=header, arrays={
+        "embeddings": embeddings,
+        "reranking_embeddings": reranking_embeddings,
+        "entry_ids": entry_ids,
+        "chunk_ids": chunk_ids,
+        "text_offsets": text_offsets,
+        "text_blob": text_blob,
+        "metadata_offsets": metadata_offsets,
+        "metadata_blob": metadata_blob,
+        **extra_arrays,
+    })
+
+
+class TextColumn(Sequence):
+    """
+    Read-only list of strings stored in a utf-8 blob, decoded on access. If `ids` is given, element i is the string
+    ids[i] of the blob (so that identical strings are only stored once).
+    """
+
+    def __init__(self, offsets: np.ndarray, blob: np.ndarray, ids: np.ndarray = None):
+        self._offsets = offsets
+        self._blob = blob
+        self._ids = ids
+
+    def __len__(self) -> int:
+        return len(self._offsets) - 1 if self._ids is None else len(self._ids)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        index = int(index)
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("TextColumn index out of range")
+        if self._ids is not None:
+            index = int(self._ids[index])
+        return self._blob[int(self._offsets[index]):int(self._offsets[index + 1])].tobytes().decode("utf-8")
+
+
+class MetadataColumn(Sequence):
+    """
+    Read-only list of metadata dictionaries, one per embedding. The metadata is stored once per database entry and
+    decoded on access.
+    """
+
+    def __init__(self, entry_ids: np.ndarray, metadata: TextColumn):
+        self._entry_ids = entry_ids
+        self._metadata = metadata
+
+    def __len__(self) -> int:
+        return len(self._entry_ids)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        return json.loads(self._metadata[int(self._entry_ids[index])])
+
+
+class ColumnarDatabase:
+    """
+    Memory-mapped reader of a columnar RAG database (.ragdb).
+
+    Layout of the file:
+        - magic number (8 bytes)
+        - header length (uint64, little-endian)
+        - header (utf-8 JSON): database information, dimension, dtype and the offset/dtype/shape of every array section
+        - array sections, each one aligned on 64 bytes:
+            * embeddings:             (num_embeddings, dim) L2-normalized embeddings
+            * reranking_embeddings:   (num_entries, dim) one L2-normalized reranking embedding per entry
+            * entry_ids:              (num_embeddings,) database entry of each embedding
+            * chunk_ids:              (num_embeddings,) chunk text of each embedding
+            * text_offsets/text_blob: utf-8 chunk texts, each distinct text is stored once
+            * metadata_offsets/metadata_blob: utf-8 JSON metadata, one per database entry
+
+    Arrays are views on the mapped file, shared between processes and paged on demand. Chunk texts and metadata are
+    only decoded when they are accessed.
+    """
+
+    def __init__(self, rag_db_path: str):
+        """
+        :param rag_db_path: path of the columnar database file
+        """
+
+        self.path = rag_db_path
+        with open(rag_db_path, "rb") as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        if self._mmap[:len(COLUMNAR_DATABASE_MAGIC)] != COLUMNAR_DATABASE_MAGIC:
+            raise ValueError(f"{rag_db_path} is not a columnar RAG database.")
+        header_start = len(COLUMNAR_DATABASE_MAGIC) + 8
+        header_length, = struct.unpack("<Q", self._mmap[len(COLUMNAR_DATABASE_MAGIC):header_start])
+        self.header = json.loads(self._mmap[header_start:header_start + header_length].decode("utf-8"))
+        if self.header.get("format_version") != COLUMNAR_DATABASE_VERSION:
+            raise ValueError(f"Unsupported columnar database version: {self.header.get('format_version')}")
+        self._data_start = -(-(header_start + header_length) // _ALIGNMENT) * _ALIGNMENT
+
+    def has_array(self, name: str) -> bool:
+        return name in self.header["sections"]
+
+    def array(self, name: str) -> np.ndarray:
+        """
+        :param name: name of the array section
+        :return: read-only view of the array on the mapped file (no copy)
+        """
+
+        section = self.header["sections"][name]
+        dtype = np.dtype(section["dtype"])
+        count = int(np.prod(section["shape"], dtype=np.int64))
+        array = np.frombuffer(self._mmap, dtype=dtype, count=count, offset=self._data_start + section["offset"])
+        return array.reshape(section["shape"])
+
+    @property
+    def info(self) -> dict:
+        """Database information (embedding model, description, generator files) stored in the header."""
+        return {key: self.header[key] for key in DATABASE_INFO_KEYS if key in self.header}
+
+    @property
+    def normalized(self) -> bool:
+        """True if the stored embeddings are L2-normalized."""
+        return self.header.get("normalized", False)
+
+    @property
+    def embeddings(self) -> np.ndarray:
+        return self.array("embeddings")
+
+    @property
+    def reranking_embeddings(self) -> np.ndarray:
+        return self.array("reranking_embeddings")
+
+    @property
+    def entry_ids(self) -> np.ndarray:
+        return self.array("entry_ids")
+
+    @property
+    def chunk_ids(self) -> np.ndarray:
+        """Chunk text id of each embedding (embeddings sharing the same text share the same id)."""
+        if self.has_array("chunk_ids"):
+            return self.array("chunk_ids")
+        return np.arange(self.header["num_embeddings"], dtype=np.uint32)
+
+    @property
+    def chunk_list(self) -> TextColumn:
+        chunk_ids = self.array("chunk_ids") if self.has_array("chunk_ids") else None
+        return TextColumn(self.array("text_offsets"), self.array("text_blob"), chunk_ids)
+
+    @property
+    def metadata_list(self) -> MetadataColumn:
+        return MetadataColumn(self.array("entry_ids"),
+                              TextColumn(self.array("metadata_offsets"), self.array("metadata_blob")))
+
+    @property
+    def out_of_domain_classifier(self) -> dict | None:
+        """Out-of-domain classifier built from the garbage model chunks (None if the database has none)."""
+        if "out_of_domain_threshold" not in self.header:
+            return None
+        return {
+            "domain_centroids": self.array("out_of_domain_domain_centroids"),
+            "garbage_centroids": self.array("out_of_domain_garbage_centroids"),
+            "threshold": self.header["out_of_domain_threshold"],
+        }
+
+    @property
+    def intent_index(self) -> dict | None:
+        """Command phrases of the entries with an intent (None if the database has none)."""
+        return self.header.get(INTENT_INDEX_KEY)
+
+
+def get_columnar_database_path(rag_db_path: str) -> str:
+    """
+    :param rag_db_path: path of a RAG database
+    :return: path of the same database in the columnar format (e.g. rag_database.pkl -> rag_database.ragdb)
+    """
+
+    return os.path.splitext(rag_db_path)[0] + COLUMNAR_DATABASE_EXTENSION
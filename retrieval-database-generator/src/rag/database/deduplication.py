@@ -0,0 +1,62 @@
+# Copyright 2025 NXP
+# NXP Proprietary.
+# This software is owned or controlled by NXP and may only be used strictly in
+# accordance with the applicable license terms. By expressly accepting such
+# terms or by downloading, installing, activating and/or otherwise using the
+# software, you are agreeing that you have read, and that you agree to comply
+# with and are bound by, such license terms. If you do not agree to be bound
+# by the applicable license terms, then you may not retain, install, activate
+# or otherwise use the software.
+
+import json
+import numpy as np
+from rag.database.columnar_database import NON_ENTRY_KEYS
+
+
+def deduplicate_database(database: dict) -> tuple[dict, int]:
+    """
+    Deduplicate a database dictionary (as created by `generate_embeddings`):
+        - an embedding row is removed if the same vector was already stored with the same chunk text and the same
+          metadata (e.g. an embedding tiled over identical chunks, or a file embedded twice), and entries left
+          without any row are removed. Rows with different metadata (intent, source, chunked file...) are kept, so
+          that the same chunk can still be retrieved for each of them;
+        - identical chunk texts are shared by every row referring to them (many embedding keys, such as the HiRAG
+          question-answer and question-only embeddings of the same answer, map to a single chunk), so they are only
+          stored once.
+    Entries are renumbered from 0 in their original order.
+    :param database: dictionary containing the database information and one entry per chunked file item
+    :return: deduplicated database dictionary and the number of removed embedding rows
+    """
+
+    deduplicated_database = {key: database[key] for key in NON_ENTRY_KEYS if key in database}
+    chunks = {}
+    seen_rows = set()
+    num_removed_rows = 0
+    num_entries = 0
+
+    for key, entry in database.items():
+        if key in NON_ENTRY_KEYS:
+            continue
+        vectors = np.asarray(entry["embeddings"], dtype=np.float32)
+        metadata = json.dumps({key: value for key, value in entry.items()
+                               if key not in ("embeddings", "chunks", "reranking_embedding")},
+                              sort_keys=True, default=str)
+        kept_rows = []
+        for row, (vector, chunk) in enumerate(zip(vectors, entry["chunks"])):
+            chunk = chunks.setdefault(chunk, chunk)
+            row_key = (vector.tobytes(), chunk, metadata)
+            if row_key not in seen_rows:
+                seen_rows.add(row_key)
+                kept_rows.append(row)
+        num_removed_rows += len(vectors) - len(kept_rows)
+        if not kept_rows:
+            continue
+
+        entry = dict(entry)
+        if len(kept_rows) < len(vectors):
+            entry["embeddings"] = entry["embeddings"][kept_rows]
+        entry["chunks"] = [chunks[entry["chunks"][row]] for row in kept_rows]
+        deduplicated_database[num_entries] = entry
+        num_entries += 1
+
+    return deduplicated_database, num_removed_rows
@@ -0,0 +1,77 @@
+# Copyright 2025 NXP
+# NXP Proprietary.
+# This software is owned or controlled by NXP and may only be used strictly in
+# accordance with the applicable license terms. By expressly accepting such
+# terms or by downloading, installing, activating and/or otherwise using the
+# software, you are agreeing that you have read, and that you agree to comply
+# with and are bound by, such license terms. If you do not agree to be bound
+# by the applicable license terms, then you may not retain, install, activate
+# or otherwise use the software.
+
+
+import os
+import numpy as np
+from rag.utils import load_pkl, save_pkl, load_json, save_json
+from rag.database.columnar_database import NON_ENTRY_KEYS, OUT_OF_DOMAIN_CLASSIFIER_KEY, INTENT_INDEX_KEY
+from rag.search.out_of_domain import get_out_of_domain_classifier_path, save_out_of_domain_classifier, \
+    load_out_of_domain_classifier
+from rag.search.intent_index import get_intent_index_path
+
+# Arrays of a database entry stored as torch tensors in the pickle format
+_TENSOR_KEYS = ("embeddings", "reranking_embedding")
+
+# Database keys saved in files next to the pickle file (path, save and load functions), as eIQ GenAI Flow expects every
+# key of the pickle file but the database information to be an entry
+_SIDE_FILES = {
+    OUT_OF_DOMAIN_CLASSIFIER_KEY: (get_out_of_domain_classifier_path, save_out_of_domain_classifier,
+                                   load_out_of_domain_classifier),
+    INTENT_INDEX_KEY: (get_intent_index_path, save_json, load_json),
+}
+
+
+def save_pkl_database(destination_path: str, database: dict, rag_db_path: str = None) -> None:
+    """
+    Save a database dictionary (as created by `generate_embeddings`) in the pickle format read by eIQ GenAI Flow: the
+    embeddings of the entries are stored as torch tensors, and the out-of-domain classifier and the intent index are
+    saved in files next to the database.
+    :param destination_path: path of the created pickle file
+    :param database: database dictionary (its embeddings may be NumPy arrays)
+    :param rag_db_path: path the database is used from, which names the files saved next to it (default:
+    destination_path)
+    :return: None
+    """
+
+    # Only needed to write this format: the retrieval and the ragdb format do not use torch
+    import torch
+
+    rag_db_path = rag_db_path or destination_path
+    for key, (get_path, save, _) in _SIDE_FILES.items():
+        if key in database:
+            save(get_path(rag_db_path), database[key])
+        elif os.path.isfile(get_path(rag_db_path)):
+            # stale file of a previous database
+            os.remove(get_path(rag_db_path))
+
+    data = {}
+    for key, value in database.items():
+        if key in _SIDE_FILES:
+            continue
+        if key not in NON_ENTRY_KEYS:
+            value = {name: torch.from_numpy(np.array(item, dtype=np.float32)) if name in _TENSOR_KEYS else item
+                     for name, item in value.items()}
+        data[key] = value
+    save_pkl(destination_path=destination_path, data=data)
+
+
+def load_pkl_database(rag_db_path: str) -> dict:
+    """
+    :param rag_db_path: path of a pickle RAG database
+    :return: database dictionary, with the out-of-domain classifier and the intent index saved next to the database
+    (unpickling the torch tensors of the embeddings imports torch)
+    """
+
+    database = load_pkl(rag_db_path)
+    for key, (get_path, _, load) in _SIDE_FILES.items():
+        if os.path.isfile(get_path(rag_db_path)):
+            database[key] = load(get_path(rag_db_path))
+    return database
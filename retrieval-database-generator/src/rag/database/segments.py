@@ -0,0 +1,414 @@
+# Copyright 2025 NXP
+# NXP Proprietary.
+# This software is owned or controlled by NXP and may only be used strictly in
+# accordance with the applicable license terms. By expressly accepting such
+# terms or by downloading, installing, activating and/or otherwise using the
+# software, you are agreeing that you have read, and that you agree to comply
+# with and are bound by, such license terms. If you do not agree to be bound
+# by the applicable license terms, then you may not retain, install, activate
+# or otherwise use the software.
+
+import os
+import re
+import numpy as np
+from collections.abc import Sequence
+from typing import Callable
+from rag.utils import load_pkl, save_pkl
+from rag.database.chunk_store import ChunkStore
+from rag.database.columnar_database import DELETED_FILES_KEY, get_chunked_file, get_database_entries
+from rag.search.dense_search import DenseSearchEngine, as_query_matrix, l2_normalize, top_k
+from rag.search.bm25_index import BM25Index, build_bm25_index, get_lexical_documents
+from rag.search.intent_index import build_intent_index
+from rag.search.out_of_domain import extend_out_of_domain_classifier, is_garbage_entry, get_question_embeddings
+
+DELTA_DIRECTORY_EXTENSION = ".deltas"
+_DELTA_FILE_PATTERN = re.compile(r"^delta_(\d+)\.pkl$")
+
+
+def get_delta_directory(rag_db_path: str) -> str:
+    """
+    :param rag_db_path: path of the RAG database
+    :return: directory of the delta segments of the database (e.g. rag_database.pkl -> rag_database.deltas)
+    """
+
+    return os.path.splitext(rag_db_path)[0] + DELTA_DIRECTORY_EXTENSION
+
+
+def get_delta_paths(rag_db_path: str) -> list[str]:
+    """
+    :param rag_db_path: path of the RAG database
+    :return: paths of the delta segments of the database, in the order they must be applied
+    """
+
+    delta_directory = get_delta_directory(rag_db_path)
+    if not os.path.isdir(delta_directory):
+        return []
+    numbered_files = [(int(match.group(1)), file_name) for file_name in os.listdir(delta_directory)
+                      if (match := _DELTA_FILE_PATTERN.match(file_name))]
+    return [os.path.join(delta_directory, file_name) for _, file_name in sorted(numbered_files)]
+
+
+def save_delta(rag_db_path: str, delta: dict) -> str:
+    """
+    Save a delta segment after the existing ones.
+    :param rag_db_path: path of the RAG database
+    :param delta: delta segment: database dictionary with the new entries and the list of the chunked files whose
+    previous entries are removed
+    :return: path of the saved delta segment
+    """
+
+    delta_directory = get_delta_directory(rag_db_path)
+    os.makedirs(delta_directory, exist_ok=True)
+    delta_paths = get_delta_paths(rag_db_path)
+    number = 1
+    if delta_paths:
+        number = int(_DELTA_FILE_PATTERN.match(os.path.basename(delta_paths[-1])).group(1)) + 1
+    delta_path = os.path.join(delta_directory, f"delta_{number:06d}.pkl")
+    save_pkl(destination_path=delta_path, data=delta)
+    return delta_path
+
+
+def load_deltas(rag_db_path: str) -> list[dict]:
+    """
+    :param rag_db_path: path of the RAG database
+    :return: delta segments of the database, in the order they must be applied
+    """
+
+    return [load_pkl(delta_path) for delta_path in get_delta_paths(rag_db_path)]
+
+
+def get_chunked_files(base_info: dict, deltas: list[dict]) -> list[str]:
+    """
+    :param base_info: information of the base database (see DATABASE_INFO_KEYS)
+    :param deltas: delta segments, in order
+    :return: chunked files of the database once the delta segments are applied
+    """
+
+    chunked_files = list(base_info.get("database_generator_files", []))
+    for delta in deltas:
+        deleted = set(delta.get(DELETED_FILES_KEY, ()))
+        chunked_files = [file_name for file_name in chunked_files if file_name not in deleted]
+        chunked_files.extend(file_name for file_name in delta.get("database_generator_files", [])
+                             if file_name not in chunked_files)
+    return chunked_files
+
+
+def read_database_entries(database) -> list[dict]:
+    """
+    Rebuild the entries of a loaded database, as created by `generate_embeddings`.
+    :param database: ChunkStore, ColumnarDatabase or SegmentedDatabase
+    :return: database entries, in the Retriever order (without the entries deleted by delta segments)
+    """
+
+    entry_ids = np.asarray(database.entry_ids)
+    bounds = np.searchsorted(entry_ids, np.arange(len(database.reranking_embeddings) + 1))
+    embeddings, reranking_embeddings = database.embeddings, database.reranking_embeddings
+    chunk_list, metadata_list = database.chunk_list, database.metadata_list
+    deleted_entries = database.deleted_entries if isinstance(database, SegmentedDatabase) else None
+    entries = []
+    for entry_id, (start, stop) in enumerate(zip(bounds[:-1].tolist(), bounds[1:].tolist())):
+        if deleted_entries is not None and entry_id < len(deleted_entries) and deleted_entries[entry_id]:
+            continue
+        entry = dict(metadata_list[start])
+        entry.update(embeddings=np.array(embeddings[start:stop], dtype=np.float32),
+                     chunks=[chunk_list[row] for row in range(start, stop)],
+                     reranking_embedding=np.array(reranking_embeddings[entry_id], dtype=np.float32))
+        entries.append(entry)
+    return entries
+
+
+class SegmentedList(Sequence):
+    """Read-only concatenation of a base list and of a delta list."""
+
+    __slots__ = ("_base", "_delta")
+
+    def __init__(self, base: Sequence, delta: Sequence):
+        self._base = base
+        self._delta = delta
+
+    def __len__(self) -> int:
+        return len(self._base) + len(self._delta)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        index = int(index)
+        if index < 0:
+            index += len(self)
+        if index < len(self._base):
+            return self._base[index]
+        return self._delta[index - len(self._base)]
+
+
+class SegmentedArray:
+    """
+    Read-only concatenation of a base array and of a delta array along the first axis. Rows are gathered from both
+    arrays on access, so a memory-mapped base is never copied.
+    """
+
+    def __init__(self, base: np.ndarray, delta: np.ndarray):
+        self._base = base
+        self._delta = delta
+        self.dtype = np.result_type(base.dtype, delta.dtype)
+        self.shape = (len(base) + len(delta),) + tuple(base.shape[1:])
+
+    def __len__(self) -> int:
+        return self.shape[0]
+
+    @property
+    def ndim(self) -> int:
+        return len(self.shape)
+
+    def __getitem__(self, index) -> np.ndarray:
+        if isinstance(index, slice):
+            index = np.arange(*index.indices(len(self)))
+        index = np.asarray(index)
+        if index.ndim == 0:
+            row = int(index) + len(self) if int(index) < 0 else int(index)
+            return self._base[row] if row < len(self._base) else self._delta[row - len(self._base)]
+        rows = np.where(index < 0, index + len(self), index)
+        in_base = rows < len(self._base)
+        values = np.empty(rows.shape + self.shape[1:], dtype=self.dtype)
+        values[in_base] = self._base[rows[in_base]]
+        values[~in_base] = self._delta[rows[~in_base] - len(self._base)]
+        return values
+
+    def __array__(self, dtype=None, copy=None) -> np.ndarray:
+        # Only used by the callers needing the whole matrix: the base is copied
+        return np.concatenate((np.asarray(self._base, dtype=dtype), np.asarray(self._delta, dtype=dtype)))
+
+
+class SegmentedDatabase:
+    """
+    Database made of a base database (pickle or columnar) and of delta segments applied in order: each segment removes
+    the entries of some chunked files (updated or deleted files) and adds new entries (added or updated files). Only
+    the small segments are shipped and loaded after a knowledge update; `compact_database` merges them in the base.
+
+    The rows of the base keep their index, the deleted ones are only flagged in `deleted_rows`, and the rows of the
+    segments come after them: the base arrays are used without any copy (e.g. memory-mapped), and the search
+    structures built on the base (IVF and BM25 indexes, quantized and projected embeddings, binary signatures) stay
+    valid (see `SegmentedSearchEngine`).
+
+    It exposes the same attributes as `ChunkStore` and `ColumnarDatabase`, so the Retriever uses it the same way.
+    """
+
+    def __init__(self, base, deltas: list[dict]):
+        """
+        :param base: ChunkStore or ColumnarDatabase of the base database
+        :param deltas: delta segments saved by `save_delta`, in order
+        """
+
+        embedding_model = base.info.get("embedding_model")
+        deleted_files = set()
+        delta_entries = []
+        for delta in deltas:
+            if embedding_model is not None and delta.get("embedding_model", embedding_model) != embedding_model:
+                raise ValueError(f"A delta segment was generated with {delta['embedding_model']} instead of "
+                                 f"{embedding_model}.")
+            deleted = set(delta.get(DELETED_FILES_KEY, ()))
+            deleted_files |= deleted
+            delta_entries = [entry for entry in delta_entries if get_chunked_file(entry) not in deleted]
+            delta_entries.extend(get_database_entries(delta))
+        self.num_deltas = len(deltas)
+        self.normalized = base.normalized
+
+        # Entries of the base that are deleted
+        base_entry_ids = np.asarray(base.entry_ids)
+        num_base_entries = len(base.reranking_embeddings)
+        self.deleted_entries = np.zeros(num_base_entries, dtype=bool)
+        if deleted_files:
+            metadata_list = base.metadata_list
+            first_rows = np.searchsorted(base_entry_ids, np.arange(num_base_entries))
+            self.deleted_entries = np.array([get_chunked_file(metadata_list[row]) in deleted_files
+                                             for row in first_rows.tolist()], dtype=bool)
+        self.deleted_rows = self.deleted_entries[base_entry_ids]
+        self.num_base_rows = len(base_entry_ids)
+
+        self.delta_database = dict(enumerate(delta_entries))
+        dim = base.embeddings.shape[1]
+        delta_store = ChunkStore(self.delta_database) if delta_entries else None
+        self.delta_embeddings = delta_store.embeddings if delta_store else np.empty((0, dim), dtype=np.float32)
+        delta_reranking_embeddings = (delta_store.reranking_embeddings if delta_store
+                                      else np.empty((0, dim), dtype=np.float32))
+        delta_entry_ids = delta_store.entry_ids.astype(np.int64) if delta_store else np.empty(0, dtype=np.int64)
+        # Chunk ids of the segments do not collide with the ones of the base
+        base_chunk_ids = np.asarray(base.chunk_ids).astype(np.int64)
+        chunk_id_offset = int(np.max(base_chunk_ids, initial=-1)) + 1
+        delta_chunk_ids = delta_store.chunk_ids.astype(np.int64) if delta_store else np.empty(0, dtype=np.int64)
+
+        self.embeddings = SegmentedArray(base.embeddings, self.delta_embeddings)
+        self.reranking_embeddings = SegmentedArray(base.reranking_embeddings, delta_reranking_embeddings)
+        self.entry_ids = np.concatenate((base_entry_ids.astype(np.int64), delta_entry_ids + num_base_entries))
+        self.chunk_ids = np.concatenate((base_chunk_ids, delta_chunk_ids + chunk_id_offset))
+        self.chunk_list = SegmentedList(base.chunk_list, delta_store.chunk_list if delta_store else [])
+        self.metadata_list = SegmentedList(base.metadata_list, delta_store.metadata_list if delta_store else [])
+
+        self.info = dict(base.info)
+        if "database_generator_files" in self.info:
+            self.info["database_generator_files"] = get_chunked_files(base.info, deltas)
+
+        self.out_of_domain_classifier = base.out_of_domain_classifier
+        delta_domain_rows = [row for row, entry_id in enumerate(delta_entry_ids.tolist())
+                             if not is_garbage_entry(delta_entries[entry_id])]
+        if self.out_of_domain_classifier is not None and delta_domain_rows:
+            self.out_of_domain_classifier = extend_out_of_domain_classifier(
+                self.out_of_domain_classifier,
+                np.concatenate([self.delta_embeddings[delta_domain_rows]] + get_question_embeddings(delta_entries)))
+
+        self.intent_index = self._merge_intent_indexes(base.intent_index, self.deleted_rows,
+                                                       build_intent_index(self.delta_database))
+
+    @staticmethod
+    def _merge_intent_indexes(base_intent_index: dict | None,
+                              deleted_rows: np.ndarray,
+                              delta_intent_index: dict | None) -> dict | None:
+        """
+        :param base_intent_index: intent index of the base database
+        :param deleted_rows: True for each deleted row of the base
+        :param delta_intent_index: intent index of the entries of the segments
+        :return: intent index of the segmented database (rows in the segmented order)
+        """
+
+        intent_index = {"phrases": [], "intents": [], "rows": []}
+        if base_intent_index is not None:
+            for phrase, intent, row in zip(*(base_intent_index[key] for key in ("phrases", "intents", "rows"))):
+                if not deleted_rows[row]:
+                    intent_index["phrases"].append(phrase)
+                    intent_index["intents"].append(intent)
+                    intent_index["rows"].append(int(row))
+        if delta_intent_index is not None:
+            intent_index["phrases"].extend(delta_intent_index["phrases"])
+            intent_index["intents"].extend(delta_intent_index["intents"])
+            intent_index["rows"].extend(row + len(deleted_rows) for row in delta_intent_index["rows"])
+        return intent_index if intent_index["phrases"] else None
+
+
+def _search_kept_rows(search: Callable[[int], tuple[np.ndarray, np.ndarray]],
+                      deleted_rows: np.ndarray,
+                      k: int) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Search the base rows that are not deleted: the number of candidates is doubled until each query has k kept rows
+    (a single search when the deleted rows are not among the best ones).
+    :param search: function returning the similarities and indexes of the best base rows for each query, shape
+    (num_queries, num_candidates), from the number of candidates
+    :param deleted_rows: True for each deleted row of the base
+    :param k: number of rows to retrieve per query
+    :return: similarities and indexes of shape (num_queries, k) of the best kept rows (-inf similarities if a query
+    has fewer kept rows)
+    """
+
+    num_rows = len(deleted_rows)
+    num_candidates = min(num_rows, k + min(k, int(deleted_rows.sum())))
+    while True:
+        similarities, indices = search(num_candidates)
+        kept = ~deleted_rows[indices]
+        if num_candidates >= num_rows or np.all(kept.sum(axis=-1) >= k):
+            break
+        num_candidates = min(num_rows, 2 * num_candidates)
+    # Kept candidates first, in their order
+    positions = np.argsort(~kept, axis=-1, kind="stable")[:, :k]
+    similarities = np.where(np.take_along_axis(kept, positions, axis=-1),
+                            np.take_along_axis(similarities, positions, axis=-1), -np.inf)
+    return similarities.astype(np.float32), np.take_along_axis(indices, positions, axis=-1)
+
+
+class SegmentedSearchEngine(DenseSearchEngine):
+    """
+    Search engine of a SegmentedDatabase: the search engine of the base (with its indexes) searches the base rows and
+    drops the deleted ones, an exact scan searches the few rows of the delta segments, and the two results are merged
+    by similarity.
+    """
+
+    def __init__(self, base_search_engine: DenseSearchEngine, database: SegmentedDatabase):
+        """
+        :param base_search_engine: search engine over the embeddings of the base database
+        :param database: segmented database
+        """
+
+        self.base_search_engine = base_search_engine
+        self.delta_search_engine = DenseSearchEngine(database.delta_embeddings, normalize=False)
+        self.deleted_rows = database.deleted_rows
+        self.num_kept_rows = int(len(self.deleted_rows) - self.deleted_rows.sum()) + len(self.delta_search_engine)
+        self.embeddings = SegmentedArray(base_search_engine.embeddings, self.delta_search_engine.embeddings)
+
+    def score(self, query_embeddings) -> np.ndarray:
+        """
+        :param query_embeddings: query embedding(s) of shape (dim,) or (num_queries, dim)
+        :return: exact similarities of shape (num_queries, num_embeddings) (-inf for the deleted rows)
+        """
+
+        queries = l2_normalize(as_query_matrix(query_embeddings))
+        similarities = np.concatenate((queries @ self.base_search_engine.embeddings.T,
+                                       self.delta_search_engine.score(queries)), axis=1)
+        similarities[:, :len(self.deleted_rows)][:, self.deleted_rows] = -np.inf
+        return similarities
+
+    def search(self, query_embeddings, k: int) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Find the k most similar database embeddings for each query, among the kept rows of the base and the rows of the
+        delta segments.
+        :param query_embeddings: query embedding(s) of shape (dim,) or (num_queries, dim)
+        :param k: number of embeddings to retrieve per query
+        :return: similarities and indexes of shape (k,) for a single query or (num_queries, k) for a batch
+        """
+
+        queries = l2_normalize(as_query_matrix(query_embeddings))
+        k = min(k, self.num_kept_rows)
+        similarities, indices = _search_kept_rows(lambda num_candidates: self.base_search_engine.search(
+            queries, k=num_candidates), self.deleted_rows, k)
+        if len(self.delta_search_engine):
+            delta_similarities, delta_indices = self.delta_search_engine.search(queries, k=k)
+            similarities, positions = top_k(np.concatenate((similarities, delta_similarities), axis=1), k)
+            indices = np.take_along_axis(np.concatenate((indices, delta_indices + len(self.deleted_rows)), axis=1),
+                                         positions, axis=-1)
+
+        if np.ndim(query_embeddings) == 1:
+            return similarities[0], indices[0]
+        return similarities, indices
+
+
+class SegmentedLexicalIndex:
+    """
+    BM25 index of a SegmentedDatabase: the index of the base without its deleted rows, and a small index of the rows
+    of the delta segments built when the database is loaded (its term statistics only cover the segments until they
+    are compacted).
+    """
+
+    def __init__(self, base_index: BM25Index, database: SegmentedDatabase):
+        """
+        :param base_index: BM25 index of the base database
+        :param database: segmented database
+        """
+
+        self.base_index = base_index
+        self.deleted_rows = database.deleted_rows
+        self.delta_index = None
+        if database.delta_database:
+            self.delta_index = BM25Index(build_bm25_index(get_lexical_documents(database.delta_database)),
+                                         num_documents=len(database.delta_embeddings))
+
+    def score(self, query: str) -> tuple[np.ndarray, np.ndarray]:
+        """
+        :param query: user query
+        :return: documents containing at least one query term and their BM25 scores
+        """
+
+        documents, scores = self.base_index.score(query)
+        kept = ~self.deleted_rows[documents]
+        documents, scores = documents[kept], scores[kept]
+        if self.delta_index is not None:
+            delta_documents, delta_scores = self.delta_index.score(query)
+            documents = np.concatenate((documents, delta_documents + len(self.deleted_rows)))
+            scores = np.concatenate((scores, delta_scores))
+        return documents, scores
+
+    def search(self, query: str, k: int) -> tuple[np.ndarray, np.ndarray]:
+        """
+        :param query: user query
+        :param k: maximum number of documents to retrieve
+        :return: BM25 scores and indexes of the (at most) k best documents, sorted by decreasing score
+        """
+
+        documents, scores = self.score(query)
+        scores, positions = top_k(scores, k)
+        return scores, documents[positions]
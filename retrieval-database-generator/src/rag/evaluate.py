@@ -0,0 +1,360 @@
+# Copyright 2025 NXP
+# NXP Proprietary.
+# This software is owned or controlled by NXP and may only be used strictly in
+# accordance with the applicable license terms. By expressly accepting such
+# terms or by downloading, installing, activating and/or otherwise using the
+# software, you are agreeing that you have read, and that you agree to comply
+# with and are bound by, such license terms. If you do not agree to be bound
+# by the applicable license terms, then you may not retain, install, activate
+# or otherwise use the software.
+
+
+import io
+import os
+import json
+import time
+import typer
+import itertools
+import tempfile
+import numpy as np
+from enum import Enum
+from colorama import Fore
+from contextlib import redirect_stdout
+from rag.config import Config
+from rag.retrieval import Retriever
+from rag.utils import load_json, get_file_list
+from rag.models.embedding_models.embedding_models import EmbeddingModel
+from rag.search.dense_search import as_query_matrix
+from rag.database.columnar_database import DATABASE_INFO_KEYS
+from rag.database.segments import SegmentedDatabase, load_deltas, read_database_entries
+from rag.preprocessing.generate_embeddings import DatabaseFormat
+from rag.preprocessing.update_database import load_base_database
+from rag.bench import BenchmarkMode, save_benchmark_database, summarize_latencies
+
+
+class RerankingMode(str, Enum):
+    """Reranking values evaluated."""
+    ON = "on"
+    OFF = "off"
+
+
+def load_qa_pairs(chunked_file_paths: list[str]) -> dict[str, set[str]]:
+    """
+    Gather the question/answer pairs of HiRAG chunk files: the chunk of an item is its answer.
+    :param chunked_file_paths: paths of chunk files (the items without a question and an answer are ignored)
+    :return: relevant chunks (answers) of each question
+    """
+
+    qa_pairs = {}
+    for chunked_file_path in chunked_file_paths:
+        for item in load_json(chunked_file_path).values():
+            if "question" in item and "answer" in item:
+                qa_pairs.setdefault(item["question"], set()).add(item["answer"])
+    return qa_pairs
+
+
+def load_questions(questions_path: str) -> list[str]:
+    """
+    :param questions_path: path of a text file with one question per line
+    :return: questions of the file
+    """
+
+    with open(questions_path, "r", encoding="utf-8") as f:
+        return [line.strip() for line in f if line.strip()]
+
+
+def score_results(results: list[tuple[list, list, list]], relevant_chunks: list[set[str]]) -> dict:
+    """
+    :param results: retrieved (chunks, similarities, metadata) of each query
+    :param relevant_chunks: relevant chunks of each query
+    :return: recall@k (fraction of the queries with a relevant chunk among the retrieved ones) and MRR (mean
+    reciprocal rank of the first relevant chunk, 0 if none is retrieved)
+    """
+
+    ranks = [next((rank for rank, chunk in enumerate(chunks, start=1) if chunk in relevant), None)
+             for (chunks, _, _), relevant in zip(results, relevant_chunks)]
+    return {"recall@k": round(float(np.mean([rank is not None for rank in ranks])), 4),
+            "mrr": round(float(np.mean([1 / rank if rank else 0. for rank in ranks])), 4)}
+
+
+def retrieve_timed(retriever: Retriever, queries: list[str], query_matrix: np.ndarray, warmup: int = 3) -> tuple:
+    """
+    Retrieve embedded queries one at a time (the embedding model latency is measured separately).
+    :param retriever: evaluated retriever
+    :param queries: queries
+    :param query_matrix: embeddings of the queries, shape (num_queries, dim)
+    :param warmup: number of untimed queries run first
+    :return: results of the queries and their latency statistics
+    """
+
+    for row in range(min(warmup, len(queries))):
+        retriever.retrieve_embeddings(queries[row:row + 1], query_matrix[row:row + 1])
+    results, latencies = [], []
+    for row in range(len(queries)):
+        start_time = time.perf_counter()
+        results.extend(retriever.retrieve_embeddings(queries[row:row + 1], query_matrix[row:row + 1]))
+        latencies.append(time.perf_counter() - start_time)
+    return results, summarize_latencies(latencies)
+
+
+def create_retriever(rag_db_path: str, embedding_model: EmbeddingModel, top_k: int, best_k: int,
+                     reranking: bool) -> Retriever:
+    """
+    :param rag_db_path: path of the database
+    :param embedding_model: embedding model shared by the retrievers
+    :param top_k: number of chunks pre-selected by the search
+    :param best_k: number of chunks returned
+    :param reranking: rerank the pre-selected chunks
+    :return: retriever of the configuration, using the approximate search structures of the database whatever its
+    size
+    """
+
+    # The optional stages (caches, hybrid search, out-of-domain and intent detection) are disabled in every retriever,
+    # the reference included, so that only the evaluated parameters differ
+    with redirect_stdout(io.StringIO()):
+        return Retriever(top_k=top_k, reranking=reranking, best_k=best_k, rag_db_path=rag_db_path,
+                         ann_min_database_size=0, query_cache_size=0, semantic_cache_size=0, hybrid_search=False,
+                         out_of_domain_detection=False, intent_detection=False, embedding_model=embedding_model)
+
+
+def evaluate_retrieval(rag_db_path: str,
+                       qa_pairs: dict[str, set[str]],
+                       questions: list[str],
+                       top_k_list: list[int],
+                       best_k_list: list[int],
+                       reranking_list: list[bool],
+                       modes: list[BenchmarkMode],
+                       max_recall_loss: float = 0.01,
+                       max_mrr_loss: float = 0.01) -> dict:
+    """
+    Replay questions with known relevant chunks through the Retriever under every configuration (top_k, best_k,
+    reranking and search mode) and report their recall@k, MRR and per-query latency side by side.
+    The questions without relevant chunks (e.g. questions.txt) are scored against the best chunk retrieved by the
+    reference configuration (exact search on the copy of the `exact` mode, with the default top_k, best_k and
+    reranking).
+    :param rag_db_path: path of the evaluated database
+    :param qa_pairs: relevant chunks of each question (e.g. from the HiRAG chunk files)
+    :param questions: questions without relevant chunks
+    :param top_k_list: top_k values evaluated
+    :param best_k_list: best_k values evaluated (the ones above top_k are skipped)
+    :param reranking_list: reranking values evaluated
+    :param modes: search modes evaluated (a copy of the database is saved with the search structures of each mode)
+    :param max_recall_loss: recall@k loss tolerated when recommending the fastest configuration
+    :param max_mrr_loss: MRR loss tolerated when recommending the fastest configuration
+    :return: evaluation report (JSON-serializable)
+    """
+
+    embedding_model = EmbeddingModel(name="all-MiniLM-L6-v2")
+    datasets = {"qa_pairs": list(qa_pairs), "questions": questions}
+    query_matrices, embed_latencies = {}, []
+    for name, queries in datasets.items():
+        embeddings = []
+        for query in queries:
+            start_time = time.perf_counter()
+            embeddings.append(as_query_matrix(embedding_model.encode(query)))
+            embed_latencies.append(time.perf_counter() - start_time)
+        query_matrices[name] = np.concatenate(embeddings) if embeddings else None
+
+    base = load_base_database(rag_db_path)
+    deltas = load_deltas(rag_db_path)
+    database = SegmentedDatabase(base, deltas) if deltas else base
+    database_dict = {key: database.info[key] for key in DATABASE_INFO_KEYS if key in database.info}
+    database_dict.update(enumerate(read_database_entries(database)))
+
+    report = {"database": os.path.basename(rag_db_path), "num_qa_pairs": len(qa_pairs),
+              "num_questions": len(questions), "embed": summarize_latencies(embed_latencies) if embed_latencies else {},
+              "results": []}
+    with tempfile.TemporaryDirectory(prefix="rag_evaluation_") as directory:
+        exact_db_path = save_benchmark_database(database_dict, directory, BenchmarkMode.EXACT, DatabaseFormat.RAGDB)
+        relevant_chunks = {"qa_pairs": list(qa_pairs.values())}
+        if questions:
+            reference = create_retriever(exact_db_path, embedding_model, top_k=Config.top_k, best_k=Config.best_k,
+                                         reranking=Config.reranking)
+            # one query at a time, as the evaluated configurations (a batch may break the similarity ties differently)
+            reference_results, _ = retrieve_timed(reference, questions, query_matrices["questions"])
+            relevant_chunks["questions"] = [{chunks[0]} for chunks, _, _ in reference_results]
+
+        for mode in modes:
+            mode = BenchmarkMode(mode)
+            mode_db_path = exact_db_path
+            if mode != BenchmarkMode.EXACT:
+                mode_db_path = save_benchmark_database(database_dict, directory, mode, DatabaseFormat.RAGDB)
+            for top_k, best_k, reranking in itertools.product(top_k_list, best_k_list, reranking_list):
+                if best_k > top_k:
+                    continue
+                retriever = create_retriever(mode_db_path, embedding_model, top_k=top_k, best_k=best_k,
+                                             reranking=reranking)
+                result = {"mode": mode.value, "top_k": top_k, "best_k": best_k, "reranking": reranking,
+                          "search_engine": type(retriever.search_engine).__name__}
+                for name, queries in datasets.items():
+                    if queries:
+                        results, latency = retrieve_timed(retriever, queries, query_matrices[name])
+                        result[name] = {**score_results(results, relevant_chunks[name]), "latency": latency}
+                report["results"].append(result)
+                print_result(result)
+
+    # scored on the question/answer pairs if there are some
+    dataset = "qa_pairs" if qa_pairs else "questions"
+    if report["results"] and dataset in report["results"][0]:
+        report["recommended"] = recommend_configurations(report["results"], dataset, max_recall_loss=max_recall_loss,
+                                                         max_mrr_loss=max_mrr_loss)
+        for best_k, result in report["recommended"].items():
+            print(Fore.LIGHTGREEN_EX, f"\rFastest configuration with best_k={best_k} within {max_recall_loss} of the "
+                                      f"best recall@k and {max_mrr_loss} of its MRR:", describe_configuration(result),
+                  Fore.RESET)
+    return report
+
+
+def recommend_configurations(results: list[dict], dataset: str, max_recall_loss: float, max_mrr_loss: float) -> dict:
+    """
+    Recommend the fastest configuration keeping the quality of the best one (highest recall@k, then highest MRR).
+    Configurations are only compared with the same best_k: the more chunks are retrieved, the higher the recall@k.
+    :param results: evaluation results of the configurations
+    :param dataset: dataset the configurations are compared on ("qa_pairs" or "questions")
+    :param max_recall_loss: recall@k loss tolerated
+    :param max_mrr_loss: MRR loss tolerated
+    :return: recommended configuration of each best_k
+    """
+
+    recommended = {}
+    for best_k in sorted({result["best_k"] for result in results}):
+        group = [result for result in results if result["best_k"] == best_k]
+        best = max(group, key=lambda result: (result[dataset]["recall@k"], result[dataset]["mrr"]))
+        candidates = [result for result in group
+                      if result[dataset]["recall@k"] >= best[dataset]["recall@k"] - max_recall_loss
+                      and result[dataset]["mrr"] >= best[dataset]["mrr"] - max_mrr_loss]
+        recommended[str(best_k)] = min(candidates, key=lambda result: result[dataset]["latency"]["p50_ms"])
+    return recommended
+
+
+def describe_configuration(result: dict) -> str:
+    """
+    :param result: evaluation result of a configuration
+    :return: short description of the configuration
+    """
+
+    return (f"mode={result['mode']} top_k={result['top_k']} best_k={result['best_k']} "
+            f"reranking={result['reranking']}")
+
+
+def print_result(result: dict) -> None:
+    """
+    Print the scores and latency of a configuration on one line.
+    :param result: evaluation result of a configuration
+    :return: None
+    """
+
+    scores = [f"{name}: recall@k {result[name]['recall@k']:.3f}, MRR {result[name]['mrr']:.3f}, "
+              f"p50 {result[name]['latency']['p50_ms']:.3f} ms, p95 {result[name]['latency']['p95_ms']:.3f} ms"
+              for name in ("qa_pairs", "questions") if name in result]
+    print(Fore.LIGHTGREEN_EX, f"\r{describe_configuration(result):<52} " + " | ".join(scores), Fore.RESET)
+
+
+def main():
+    app = typer.Typer(
+        name="Retrieval evaluation",
+        add_completion=False,
+        context_settings={"help_option_names": ["-h", "--help"]},
+    )
+
+    src_dir_path = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    default_questions_path = os.path.join(os.path.dirname(os.path.dirname(src_dir_path)), "eiq_genai_flow",
+                                          "_internal", "utils", "questions.txt")
+
+    @app.command()
+    def parse_args(
+            rag_db_name: str = typer.Option(
+                "rag_database.pkl",
+                "--rag-database", "-d",
+                help=f"RAG database file name in data{os.sep} to evaluate.",
+                show_default=True
+            ),
+            chunked_files: list[str] = typer.Option(
+                ["all"],
+                "--chunked-file", "-f",
+                help=f"HiRAG chunk file in data{os.sep}chunked_files whose question/answer pairs are replayed "
+                     "('-f all' for all files).",
+                show_default=True
+            ),
+            questions_path: str = typer.Option(
+                default_questions_path,
+                "--questions",
+                help="Text file with one question per line, scored against the reference configuration (exact "
+                     "search with the default parameters). Empty to skip it.",
+            ),
+            top_k_list: list[int] = typer.Option(
+                [Config.top_k],
+                "--top-k", "-t",
+                help="top_k value to evaluate ('-t 3 -t 5 ...' for several values).",
+                show_default=True
+            ),
+            best_k_list: list[int] = typer.Option(
+                [Config.best_k],
+                "--best-k", "-b",
+                help="best_k value to evaluate ('-b 1 -b 3 ...' for several values).",
+                show_default=True
+            ),
+            reranking_modes: list[RerankingMode] = typer.Option(
+                ["on", "off"],
+                "--reranking", "-r",
+                help="Reranking value to evaluate ('-r on -r off' for both).",
+                show_default=True
+            ),
+            modes: list[BenchmarkMode] = typer.Option(
+                [mode.value for mode in BenchmarkMode],
+                "--mode", "-m",
+                help="Search mode to evaluate ('-m exact -m int8 ...' for several modes).",
+                show_default=True
+            ),
+            max_recall_loss: float = typer.Option(
+                0.01,
+                "--max-recall-loss",
+                help="Recall@k loss tolerated when recommending the fastest configuration.",
+                show_default=True
+            ),
+            max_mrr_loss: float = typer.Option(
+                0.01,
+                "--max-mrr-loss",
+                help="MRR loss tolerated when recommending the fastest configuration.",
+                show_default=True
+            ),
+            output_path: str = typer.Option(
+                "retrieval_evaluation.json",
+                "--output", "-o",
+                help="Path of the JSON report.",
+                show_default=True
+            )
+    ):
+        """
+        Evaluate the recall@k, MRR and latency of retrieval configurations with the HiRAG question/answer pairs.
+        """
+
+        origin_folder = os.path.join(src_dir_path, "data", "chunked_files")
+        if chunked_files == ["all"]:
+            chunked_files = get_file_list(repo_path=origin_folder, extensions=".json")
+        questions = []
+        if questions_path and os.path.isfile(questions_path):
+            questions = load_questions(questions_path)
+        elif questions_path:
+            print(Fore.RED, f"Warning: there is no {questions_path} file, only the question/answer pairs are "
+                            "evaluated.", Fore.RESET)
+
+        report = evaluate_retrieval(rag_db_path=os.path.join(src_dir_path, "data", rag_db_name),
+                                    qa_pairs=load_qa_pairs([os.path.join(origin_folder, file_name)
+                                                            for file_name in chunked_files]),
+                                    questions=questions,
+                                    top_k_list=top_k_list,
+                                    best_k_list=best_k_list,
+                                    reranking_list=[reranking == RerankingMode.ON for reranking in reranking_modes],
+                                    modes=modes,
+                                    max_recall_loss=max_recall_loss,
+                                    max_mrr_loss=max_mrr_loss)
+        with open(output_path, "w") as f:
+            json.dump(report, f, indent=2)
+        print(Fore.LIGHTGREEN_EX, "\rSuccessfully saved the evaluation report at: ", output_path, Fore.RESET)
+
+    app()
+
+
+if __name__ == '__main__':
+    main()
@@ -10,12 +10,10 @@
 
 import os
 import sys
-import torch
-import torch.nn.functional as F
 import numpy as np
-from transformers import AutoTokenizer
+from tokenizers import Tokenizer
 from colorama import Fore
-from rag.utils import get_number_of_cores
+from rag.utils import get_number_of_cores, load_json
 import onnxruntime as ort
 
 
@@ -54,7 +52,14 @@ class AllMiniL6V2(EmbeddingModel):
     def __init__(self, name: str, use_onnx: bool = False, use_quant: bool = False):
         """Ensure the correct initialization via parent class."""
         super().__init__(name)
-        self._tokenizer = AutoTokenizer.from_pretrained(self.tokenizer_path)
+        # The tokenizers library is used directly, as importing transformers also imports torch.
+        # Like the transformers tokenizer with padding=True and truncation=True, the texts are truncated to the model
+        # maximum length and padded to the longest text of the batch.
+        tokenizer_config = load_json(os.path.join(self.tokenizer_path, "tokenizer_config.json"))
+        self._tokenizer = Tokenizer.from_file(os.path.join(self.tokenizer_path, "tokenizer.json"))
+        self._tokenizer.enable_truncation(max_length=tokenizer_config["model_max_length"])
+        self._tokenizer.enable_padding(pad_id=self._tokenizer.token_to_id(tokenizer_config["pad_token"]),
+                                       pad_token=tokenizer_config["pad_token"])
         session_options = ort.SessionOptions()
         session_options.intra_op_num_threads = get_number_of_cores()
         # session_options.add_session_config_entry("session.intra_op.allow_spinning", "0")
@@ -68,17 +73,18 @@ class AllMiniL6V2(EmbeddingModel):
             texts = [texts]
 
         # Tokenize all texts into input IDs, attention masks, and token type IDs
-        input_ids = self._tokenizer(texts, padding=True, truncation=True, return_tensors='pt')['input_ids']
+        input_ids = np.array([encoding.ids for encoding in self._tokenizer.encode_batch(texts)], dtype=np.int64)
 
-        input_feed = {"input_ids": np.array(input_ids, dtype=np.int64),
-                      "token_type_ids": np.ones_like(input_ids),
-                      "attention_mask": np.zeros_like(input_ids)}
+        input_feed = {"input_ids": input_ids,
+                      "token_type_ids": np.ones_like(input_ids, dtype=np.int64),
+                      "attention_mask": np.zeros_like(input_ids, dtype=np.int64)}
         last_hidden_state, _ = self._embedding_model.run(output_names=["last_hidden_state", "pooler_output"],
                                                          input_feed=input_feed)
-        last_hidden_state = torch.tensor(last_hidden_state, dtype=torch.float32)
+        last_hidden_state = np.asarray(last_hidden_state, dtype=np.float32)
 
-        attention_mask = torch.ones_like(input_ids)
-        input_mask_expanded = attention_mask.unsqueeze(-1).expand(last_hidden_state.size()).float()
-        embeddings = torch.sum(last_hidden_state * input_mask_expanded, 1) / torch.clamp(input_mask_expanded.sum(1),
-                                                                                         min=1e-9)
-        return F.normalize(embeddings, p=2, dim=1)
+        # Mean pooling and L2 normalization in NumPy: torch is not needed for inference
+        attention_mask = np.ones(input_ids.shape, dtype=np.float32)
+        input_mask_expanded = np.broadcast_to(attention_mask[..., np.newaxis], last_hidden_state.shape)
+        embeddings = np.sum(last_hidden_state * input_mask_expanded, 1) / np.maximum(input_mask_expanded.sum(1), 1e-9)
+        norms = np.linalg.norm(embeddings, ord=2, axis=1, keepdims=True)
+        return embeddings / np.maximum(norms, 1e-12)
@@ -0,0 +1,155 @@
+# Copyright 2025 NXP
+# NXP Proprietary.
+# This software is owned or controlled by NXP and may only be used strictly in
+# accordance with the applicable license terms. By expressly accepting such
+# terms or by downloading, installing, activating and/or otherwise using the
+# software, you are agreeing that you have read, and that you agree to comply
+# with and are bound by, such license terms. If you do not agree to be bound
+# by the applicable license terms, then you may not retain, install, activate
+# or otherwise use the software.
+
+import os
+import re
+from collections import deque
+from collections.abc import Iterable
+from colorama import Fore
+
+_WORD_PATTERN = re.compile(r"\w+")
+
+
+def split_words(text: str) -> list[str]:
+    """
+    :param text: input text
+    :return: case-folded words of the text (punctuation and whitespaces are word boundaries)
+    """
+
+    return _WORD_PATTERN.findall(text.casefold())
+
+
+class PhraseMatcher:
+    """
+    Aho-Corasick automaton over words: every phrase (one or several words) of the list is found in a single pass over
+    the words of a text, whatever the number of phrases. Phrases only match whole words, case-insensitively.
+    """
+
+    def __init__(self, phrases: Iterable[str]):
+        """
+        :param phrases: phrases to look for
+        """
+
+        self._transitions = [{}]  # word -> next state, for each state of the trie
+        self._fail = [0]  # longest proper suffix state of each state
+        self._matches = [()]  # phrases ending at each state (including the ones of its suffix states)
+        self.phrases = set()
+
+        for phrase in phrases:
+            words = split_words(phrase)
+            if not words:
+                continue
+            state = 0
+            for word in words:
+                if word not in self._transitions[state]:
+                    self._transitions.append({})
+                    self._fail.append(0)
+                    self._matches.append(())
+                    self._transitions[state][word] = len(self._transitions) - 1
+                state = self._transitions[state][word]
+            phrase = " ".join(words)
+            self._matches[state] = (phrase,)
+            self.phrases.add(phrase)
+
+        # Breadth-first computation of the failure links
+        queue = deque(self._transitions[0].values())
+        while queue:
+            state = queue.popleft()
+            for word, next_state in self._transitions[state].items():
+                fail = self._fail[state]
+                while fail and word not in self._transitions[fail]:
+                    fail = self._fail[fail]
+                self._fail[next_state] = self._transitions[fail].get(word, 0)
+                self._matches[next_state] += self._matches[self._fail[next_state]]
+                queue.append(next_state)
+
+    def __len__(self) -> int:
+        return len(self.phrases)
+
+    def _next_state(self, state: int, word: str) -> int:
+        while state and word not in self._transitions[state]:
+            state = self._fail[state]
+        return self._transitions[state].get(word, 0)
+
+    def find(self, text: str) -> list[str]:
+        """
+        :param text: input text
+        :return: phrases found in the text (in order of appearance)
+        """
+
+        state, found = 0, []
+        for word in split_words(text):
+            state = self._next_state(state, word)
+            found.extend(self._matches[state])
+        return found
+
+    def contains(self, text: str) -> bool:
+        """
+        :param text: input text
+        :return: True if at least one phrase is found in the text
+        """
+
+        state = 0
+        for word in split_words(text):
+            state = self._next_state(state, word)
+            if self._matches[state]:
+                return True
+        return False
+
+
+class CensoredPhraseFilter:
+    """
+    Detect censored phrases in queries. The deny-list is made of default phrases and, optionally, of the phrases of a
+    text file (one phrase per line, lines starting with '#' are ignored), which is reloaded when it is modified.
+    """
+
+    def __init__(self, phrases: Iterable[str], deny_list_path: str = None):
+        """
+        :param phrases: default censored phrases
+        :param deny_list_path: deny-list file with additional censored phrases
+        """
+
+        self.default_phrases = list(phrases)
+        self.deny_list_path = deny_list_path
+        self._deny_list_mtime = None
+        self.reload()
+
+    def _get_deny_list_mtime(self) -> int | None:
+        try:
+            return os.stat(self.deny_list_path).st_mtime_ns
+        except OSError:
+            return None
+
+    def reload(self) -> None:
+        """
+        Rebuild the matcher from the default phrases and the deny-list file.
+        :return: None
+        """
+
+        phrases = list(self.default_phrases)
+        self._deny_list_mtime = None
+        if self.deny_list_path is not None:
+            self._deny_list_mtime = self._get_deny_list_mtime()
+            if self._deny_list_mtime is None:
+                print(Fore.RED, f"Warning: the deny-list {self.deny_list_path} does not exist.", Fore.RESET)
+            else:
+                with open(self.deny_list_path, "r", encoding="utf-8") as f:
+                    phrases.extend(line for line in f.read().splitlines() if not line.lstrip().startswith("#"))
+        self.matcher = PhraseMatcher(phrases)
+
+    def __call__(self, query: str) -> bool:
+        """
+        :param query: user query
+        :return: True if the query contains a censored phrase
+        """
+
+        if self.deny_list_path is not None and self._get_deny_list_mtime() != self._deny_list_mtime:
+            self.reload()
+        return self.matcher.contains(query)
@@ -0,0 +1,119 @@
+# Copyright 2025 NXP
+# NXP Proprietary.
+# This software is owned or controlled by NXP and may only be used strictly in
+# accordance with the applicable license terms. By expressly accepting such
+# terms or by downloading, installing, activating and/or otherwise using the
+# software, you are agreeing that you have read, and that you agree to comply
+# with and are bound by, such license terms. If you do not agree to be bound
+# by the applicable license terms, then you may not retain, install, activate
+# or otherwise use the software.
+
+import os
+import typer
+from colorama import Fore
+from rag.search.quantization import QuantizationMethod
+from rag.search.projection import ProjectionMethod
+from rag.database.columnar_database import save_columnar_database, get_columnar_database_path
+from rag.database.pkl_database import load_pkl_database
+from rag.preprocessing.generate_embeddings import build_search_arrays
+
+
+def convert_database(rag_db_path: str,
+                     destination_path: str = None,
+                     quantization: QuantizationMethod = QuantizationMethod.NONE,
+                     binary_signatures: bool = False,
+                     projection: ProjectionMethod = ProjectionMethod.NONE,
+                     projection_dim: int = 96) -> str:
+    """
+    Convert a pickle RAG database (rag_database.pkl) to the memory-mapped columnar format (rag_database.ragdb).
+    :param rag_db_path: path of the pickle database
+    :param destination_path: path of the created columnar database (default: same name with the .ragdb extension)
+    :param quantization: also store quantized embeddings with this method
+    :param binary_signatures: also store the 1-bit sign signatures of the embeddings
+    :param projection: also store the embeddings projected to `projection_dim` dimensions with this method
+    :param projection_dim: dimension of the projected embeddings
+    :return: path of the created columnar database
+    """
+
+    if not os.path.isfile(rag_db_path):
+        raise FileNotFoundError(f"There is no {rag_db_path} file.")
+
+    if destination_path is None:
+        destination_path = get_columnar_database_path(rag_db_path)
+
+    database = load_pkl_database(rag_db_path)
+    extra_arrays, extra_header = build_search_arrays(database, quantization=quantization,
+                                                     binary_signatures=binary_signatures, projection=projection,
+                                                     projection_dim=projection_dim)
+
+    save_columnar_database(destination_path=destination_path, database=database, extra_arrays=extra_arrays,
+                           extra_header=extra_header)
+    print(Fore.LIGHTGREEN_EX, f"\rSuccessfully converted {os.path.basename(rag_db_path)} to: ", destination_path,
+          Fore.RESET)
+    return destination_path
+
+
+def main():
+    app = typer.Typer(
+        name="Database conversion",
+        add_completion=False,
+        context_settings={"help_option_names": ["-h", "--help"]},
+    )
+
+    src_dir_path = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+    @app.command()
+    def parse_args(
+            rag_db_name: str = typer.Option(
+                "rag_database.pkl",
+                "--rag-database", "-d",
+                help=f"Pickle RAG database file name in data{os.sep} to convert.",
+                show_default=True
+            ),
+            output_name: str = typer.Option(
+                None,
+                "--output", "-o",
+                help=f"Converted database file name in data{os.sep} (default: same name with the .ragdb extension).",
+            ),
+            quantization: QuantizationMethod = typer.Option(
+                "none",
+                "--quantization", "-q",
+                help="Also store quantized embeddings (int8: 4x smaller, pq: 32x smaller) that are scanned instead of "
+                     "the float32 ones.",
+                show_default=True
+            ),
+            binary_signatures: bool = typer.Option(
+                False,
+                "--binary-signatures", "-b",
+                help="Also store 1-bit signatures of the embeddings, used as a fast Hamming prefilter on large "
+                     "databases.",
+            ),
+            projection: ProjectionMethod = typer.Option(
+                "none",
+                "--projection", "-p",
+                help="Also store the embeddings projected to --projection-dim dimensions (pca: learned on the "
+                     "corpus, matryoshka: truncated, for Matryoshka embedding models only). They are scanned instead "
+                     "of the float32 ones, and the best candidates are rescored at full dimension.",
+                show_default=True
+            ),
+            projection_dim: int = typer.Option(
+                96,
+                "--projection-dim",
+                help="Dimension of the projected embeddings (64 to 128 for the 384 dimensions of all-MiniLM-L6-v2).",
+                show_default=True
+            )
+    ):
+        """
+        Convert a pickle RAG database to the memory-mapped columnar format.
+        """
+
+        rag_db_path = os.path.join(src_dir_path, "data", rag_db_name)
+        destination_path = os.path.join(src_dir_path, "data", output_name) if output_name else None
+        convert_database(rag_db_path=rag_db_path, destination_path=destination_path, quantization=quantization,
+                         binary_signatures=binary_signatures, projection=projection, projection_dim=projection_dim)
+
+    app()
+
+
+if __name__ == '__main__':
+    main()
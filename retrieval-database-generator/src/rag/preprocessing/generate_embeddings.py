@@ -10,18 +10,134 @@
 
 import os
 import typer
-import torch
+import numpy as np
+from enum import Enum
 from tqdm import tqdm
 from colorama import Fore
-from rag.utils import load_json, save_pkl, get_file_list
+from rag.utils import load_json, get_file_list
 from rag.models.embedding_models.embedding_models import EmbeddingModel
+from rag.search.ivf_index import build_ivf_index, save_ivf_index, get_ivf_index_path
+from rag.search.quantization import QuantizationMethod, quantize_embeddings
+from rag.search.projection import ProjectionMethod, project_embeddings
+from rag.search.binary_search import compute_binary_signatures
+from rag.search.bm25_index import build_bm25_index, save_bm25_index, get_bm25_index_path, get_lexical_documents
+from rag.search.out_of_domain import build_out_of_domain_classifier, is_garbage_entry, get_question_embeddings
+from rag.search.intent_index import build_intent_index
+from rag.database.columnar_database import save_columnar_database, stack_database_embeddings, get_database_entries, \
+    COLUMNAR_DATABASE_EXTENSION, OUT_OF_DOMAIN_CLASSIFIER_KEY, INTENT_INDEX_KEY, CHUNKED_FILE_KEY
+from rag.database.deduplication import deduplicate_database
+from rag.database.pkl_database import save_pkl_database
 
 
-def generate_embeddings(files_to_keep: list[str],) -> None:
+class DatabaseFormat(str, Enum):
+    """RAG database formats supported."""
+    PKL = "pkl"
+    RAGDB = "ragdb"
+
+
+def build_search_arrays(database: dict,
+                        quantization: QuantizationMethod = QuantizationMethod.NONE,
+                        binary_signatures: bool = False,
+                        projection: ProjectionMethod = ProjectionMethod.NONE,
+                        projection_dim: int = 96) -> tuple[dict, dict]:
+    """
+    Build the optional search structures stored in a columnar database.
+    :param database: dictionary as created by `generate_embeddings`
+    :param quantization: store quantized embeddings with this method
+    :param binary_signatures: store the 1-bit sign signatures of the embeddings
+    :param projection: store embeddings projected to `projection_dim` dimensions with this method
+    :param projection_dim: dimension of the projected embeddings
+    :return: arrays and header information to add to the columnar database
+    """
+
+    extra_arrays, extra_header = {}, {}
+    if quantization == QuantizationMethod.NONE and not binary_signatures and projection == ProjectionMethod.NONE:
+        return extra_arrays, extra_header
+    if quantization != QuantizationMethod.NONE and projection != ProjectionMethod.NONE:
+        raise ValueError("The embeddings can either be quantized or projected, not both.")
+
+    embeddings = stack_database_embeddings(database)
+    if quantization != QuantizationMethod.NONE:
+        extra_arrays.update(quantize_embeddings(embeddings, method=quantization))
+        extra_header["quantization"] = QuantizationMethod(quantization).value
+    if projection != ProjectionMethod.NONE:
+        extra_arrays.update(project_embeddings(embeddings, method=projection, dim=projection_dim))
+        extra_header["projection"] = ProjectionMethod(projection).value
+        extra_header["projection_dim"] = projection_dim
+    if binary_signatures:
+        extra_arrays["binary_signatures"] = compute_binary_signatures(embeddings)
+        extra_header["binary_signatures"] = True
+    return extra_arrays, extra_header
+
+
+def embed_chunked_file(embedding_model: EmbeddingModel, file_name: str, chunks: dict) -> list[dict]:
+    """
+    Create the database entries of a chunked file: the embeddings of the chunks of each item, a reranking embedding
+    and the metadata of the item.
+    :param embedding_model: embedding model
+    :param file_name: name of the chunked file
+    :param chunks: content of the chunked file (one item per id)
+    :return: database entries of the file
+    """
+
+    entries = []
+    for id, item in tqdm(chunks.items(), desc=f"Generating embeddings for {file_name} file"):
+        entry = {}
+        if not ("chunks" in item):
+            raise ValueError(f"Every item must contain at least a chunks attribute.\n {id}: {item}")
+        item_chunks = item.pop("chunks")
+        if "complete_chunks" in item:
+            embeddings = embedding_model.encode(item["complete_chunks"])
+            embeddings = np.tile(embeddings, (len(item_chunks), 1))
+            reranking_embedding = embedding_model.encode(item["complete_chunks"].split(';')[0])  # Question only
+        else:
+            embeddings = embedding_model.encode(item_chunks)
+            reranking_embedding = np.mean(embeddings, axis=0)
+        entry["embeddings"] = embeddings
+        entry["reranking_embedding"] = reranking_embedding
+        entry["chunks"] = item_chunks
+        entry["chunked_file_id"] = id
+        for key, value in item.items():
+            entry[key] = value
+
+        if "source" not in entry:
+            entry["source"] = file_name
+        # used to remove the entries of the file when it is updated or deleted (see update_database)
+        entry[CHUNKED_FILE_KEY] = file_name
+
+        entries.append(entry)
+    return entries
+
+
+def generate_embeddings(files_to_keep: list[str],
+                        ann_index: bool = False,
+                        ann_num_lists: int = 0,
+                        database_format: DatabaseFormat = DatabaseFormat.PKL,
+                        quantization: QuantizationMethod = QuantizationMethod.NONE,
+                        binary_signatures: bool = False,
+                        projection: ProjectionMethod = ProjectionMethod.NONE,
+                        projection_dim: int = 96,
+                        deduplicate: bool = True,
+                        bm25_index: bool = False,
+                        out_of_domain_centroids: int = 16) -> None:
     """
     Create embeddings from the chunks files saved in --origin-folder. If --files-to-keep is left to the default value
-    all files will be used.
+    all files will be used. If --ann-index is set, an approximate nearest-neighbour (IVF) index is also built and saved
+    next to the database. The database is saved as a pickle file (rag_database.pkl) or as a memory-mapped columnar file
+    (rag_database.ragdb), optionally with quantized embeddings (--quantization), binary signatures
+    (--binary-signatures) and embeddings projected to fewer dimensions (--projection). Unless --no-deduplication is
+    set, duplicated embeddings are removed and identical chunk texts are only stored once. If --bm25-index is set, a
+    BM25 index of the chunks (and of the questions of HiRAG chunks) is also saved next to the database for the hybrid
+    search. If a garbage_model.json file is embedded, an out-of-domain classifier (--out-of-domain-centroids centroids
+    of the garbage model and of the domain chunks) is stored in the database (next to it for a pickle database), so
+    that the Retriever detects out-of-domain queries before searching. The chunks of the items with an "intent" are
+    also stored in an intent index, used by the Retriever to detect commands without the embedding model.
     """
+    if (quantization != QuantizationMethod.NONE or binary_signatures or projection != ProjectionMethod.NONE) \
+            and database_format != DatabaseFormat.RAGDB:
+        raise ValueError("Quantized embeddings, binary signatures and projected embeddings can only be stored in the "
+                         "'ragdb' database format.")
+
     src_dir_path = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
     origin_folder = os.path.join(src_dir_path, "data", "chunked_files")
     saving_folder = os.path.join(src_dir_path, "data")
@@ -37,6 +153,7 @@ def generate_embeddings(files_to_keep: list[str],) -> None:
     )
     data["database_generator_files"] = []
     index = 0
+    domain_embeddings, garbage_embeddings = [], []
 
     if files_to_keep == ["all"]:
         files_to_keep = get_file_list(repo_path=origin_folder, extensions=".json")
@@ -52,34 +169,64 @@ def generate_embeddings(files_to_keep: list[str],) -> None:
             raise ValueError(f"There is no {file_name} in {origin_folder}.")
 
         # generate embeddings from documentation
-        for id, item in tqdm(chunks.items(), desc=f"Generating embeddings for {file_name} file"):
-            data[index] = {}
-            if not ("chunks" in item):
-                raise ValueError(f"Every item must contain at least a chunks attribute.\n {id}: {item}")
-            chunks = item.pop("chunks")
-            if "complete_chunks" in item:
-                embeddings = embedding_model.encode(item["complete_chunks"])
-                embeddings = torch.tile(embeddings, (len(chunks), 1))
-                reranking_embedding = embedding_model.encode(item["complete_chunks"].split(';')[0])  # Question only
-            else:
-                embeddings = embedding_model.encode(chunks)
-                reranking_embedding = torch.mean(embeddings, dim=0)
-            data[index]["embeddings"] = embeddings
-            data[index]["reranking_embedding"] = reranking_embedding
-            data[index]["chunks"] = chunks
-            data[index]["chunked_file_id"] = id
-            for key, value in item.items():
-                data[index][key] = value
-
-            if "source" not in data[index]:
-                data[index]["source"] = file_name
-
+        for entry in embed_chunked_file(embedding_model, file_name, chunks):
+            data[index] = entry
+            # Commands must reach the retrieval, so they are not part of the garbage model for the classifier
+            (garbage_embeddings if is_garbage_entry(entry) else domain_embeddings).append(entry["embeddings"])
             index += 1
 
-    # save in pkl
-    destination_path = os.path.join(saving_folder, "rag_database.pkl")
-    save_pkl(destination_path=destination_path, data=data)
-    print(Fore.LIGHTGREEN_EX, "\rSuccessfully saved rag_database.pkl at: ", destination_path, Fore.RESET)
+    if deduplicate:
+        data, num_removed_rows = deduplicate_database(data)
+        if num_removed_rows:
+            print(Fore.LIGHTGREEN_EX, f"\rRemoved {num_removed_rows} duplicated embeddings.", Fore.RESET)
+
+    if out_of_domain_centroids > 0 and garbage_embeddings and domain_embeddings:
+        data[OUT_OF_DOMAIN_CLASSIFIER_KEY] = build_out_of_domain_classifier(
+            np.concatenate(domain_embeddings), np.concatenate(garbage_embeddings),
+            num_centroids=out_of_domain_centroids,
+            question_embeddings=get_question_embeddings(get_database_entries(data)))
+
+    intent_index = build_intent_index(data)
+    if intent_index is not None:
+        data[INTENT_INDEX_KEY] = intent_index
+
+    if database_format == DatabaseFormat.RAGDB:
+        extra_arrays, extra_header = build_search_arrays(data, quantization=quantization,
+                                                         binary_signatures=binary_signatures, projection=projection,
+                                                         projection_dim=projection_dim)
+
+        # save in the memory-mapped columnar format
+        destination_path = os.path.join(saving_folder, f"rag_database{COLUMNAR_DATABASE_EXTENSION}")
+        save_columnar_database(destination_path=destination_path, database=data, extra_arrays=extra_arrays,
+                               extra_header=extra_header)
+    else:
+        # save in pkl
+        destination_path = os.path.join(saving_folder, "rag_database.pkl")
+        save_pkl_database(destination_path=destination_path, database=data)
+    print(Fore.LIGHTGREEN_EX, f"\rSuccessfully saved {os.path.basename(destination_path)} at: ", destination_path,
+          Fore.RESET)
+
+    ivf_index_path = get_ivf_index_path(destination_path)
+    if ann_index:
+        # The index refers to the embeddings in the order they are loaded by the Retriever
+        ivf_index = build_ivf_index(stack_database_embeddings(data), num_lists=ann_num_lists)
+        save_ivf_index(destination_path=ivf_index_path, ivf_index=ivf_index, rag_db_path=destination_path)
+        print(Fore.LIGHTGREEN_EX, f"\rSuccessfully saved IVF index ({len(ivf_index['centroids'])} lists) at: ",
+              ivf_index_path, Fore.RESET)
+    elif os.path.isfile(ivf_index_path):
+        # stale file of a previous database
+        os.remove(ivf_index_path)
+
+    bm25_index_path = get_bm25_index_path(destination_path)
+    if bm25_index:
+        # The index refers to the chunks in the order they are loaded by the Retriever
+        lexical_index = build_bm25_index(get_lexical_documents(data))
+        save_bm25_index(destination_path=bm25_index_path, bm25_index=lexical_index, rag_db_path=destination_path)
+        print(Fore.LIGHTGREEN_EX, f"\rSuccessfully saved BM25 index ({len(lexical_index['terms'])} terms) at: ",
+              bm25_index_path, Fore.RESET)
+    elif os.path.isfile(bm25_index_path):
+        # stale file of a previous database
+        os.remove(bm25_index_path)
 
 
 def main():
@@ -97,10 +244,85 @@ def main():
                 help=f"File name in data{os.sep}chunked_files to embed in database "
                      "('-f all' for all files and '-f file1 -f file2 ...' for a list of files)",
                 show_default=True
+            ),
+            ann_index: bool = typer.Option(
+                False,
+                "--ann-index", "-a",
+                help="Also build an approximate nearest-neighbour (IVF) index, saved next to the database. "
+                     "Recommended for databases with more than ~20k embeddings.",
+            ),
+            ann_num_lists: int = typer.Option(
+                0,
+                "--ann-lists", "-l",
+                help="Number of inverted lists of the IVF index (0 = 4 * sqrt(number of embeddings)).",
+                show_default=True
+            ),
+            database_format: DatabaseFormat = typer.Option(
+                "pkl",
+                "--format",
+                help="Format of the generated database. 'ragdb' is a memory-mapped columnar format that loads almost "
+                     "instantly and only decodes the retrieved chunks. (eIQ GenAI Flow uses pkl)",
+                show_default=True
+            ),
+            quantization: QuantizationMethod = typer.Option(
+                "none",
+                "--quantization", "-q",
+                help="Also store quantized embeddings (int8: 4x smaller, pq: 32x smaller) that are scanned instead of "
+                     "the float32 ones. Requires '--format ragdb'.",
+                show_default=True
+            ),
+            binary_signatures: bool = typer.Option(
+                False,
+                "--binary-signatures", "-b",
+                help="Also store 1-bit signatures of the embeddings, used as a fast Hamming prefilter on large "
+                     "databases. Requires '--format ragdb'.",
+            ),
+            projection: ProjectionMethod = typer.Option(
+                "none",
+                "--projection", "-p",
+                help="Also store the embeddings projected to --projection-dim dimensions (pca: learned on the "
+                     "corpus, matryoshka: truncated, for Matryoshka embedding models only). They are scanned instead "
+                     "of the float32 ones, and the best candidates are rescored at full dimension. Requires "
+                     "'--format ragdb'.",
+                show_default=True
+            ),
+            projection_dim: int = typer.Option(
+                96,
+                "--projection-dim",
+                help="Dimension of the projected embeddings (64 to 128 for the 384 dimensions of all-MiniLM-L6-v2).",
+                show_default=True
+            ),
+            no_deduplication: bool = typer.Option(
+                False,
+                "--no-deduplication",
+                help="Keep duplicated embeddings (same vector and same chunk) in the database.",
+            ),
+            bm25_index: bool = typer.Option(
+                False,
+                "--bm25-index",
+                help="Also build a BM25 (lexical) index of the chunks, saved next to the database. The retriever fuses "
+                     "it with the dense search, which helps with exact terms such as part numbers or error codes.",
+            ),
+            out_of_domain_centroids: int = typer.Option(
+                16,
+                "--out-of-domain-centroids",
+                help="Number of centroids of the garbage model and of the domain chunks stored in the out-of-domain "
+                     "classifier (built if garbage_model.json is embedded, 0 disables it).",
+                show_default=True
             )
     ):
 
-        generate_embeddings(files_to_keep=chunked_files_to_embed)
+        generate_embeddings(files_to_keep=chunked_files_to_embed,
+                            ann_index=ann_index,
+                            ann_num_lists=ann_num_lists,
+                            database_format=database_format,
+                            quantization=quantization,
+                            binary_signatures=binary_signatures,
+                            projection=projection,
+                            projection_dim=projection_dim,
+                            deduplicate=not no_deduplication,
+                            bm25_index=bm25_index,
+                            out_of_domain_centroids=out_of_domain_centroids)
 
     app()
 
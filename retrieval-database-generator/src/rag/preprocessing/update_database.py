@@ -0,0 +1,229 @@
+# Copyright 2025 NXP
+# NXP Proprietary.
+# This software is owned or controlled by NXP and may only be used strictly in
+# accordance with the applicable license terms. By expressly accepting such
+# terms or by downloading, installing, activating and/or otherwise using the
+# software, you are agreeing that you have read, and that you agree to comply
+# with and are bound by, such license terms. If you do not agree to be bound
+# by the applicable license terms, then you may not retain, install, activate
+# or otherwise use the software.
+
+import os
+import shutil
+import typer
+import numpy as np
+from enum import Enum
+from colorama import Fore
+from rag.utils import load_json
+from rag.models.embedding_models.embedding_models import EmbeddingModel
+from rag.search.ivf_index import build_ivf_index, save_ivf_index, load_ivf_index, get_ivf_index_path
+from rag.search.quantization import QuantizationMethod
+from rag.search.projection import ProjectionMethod
+from rag.search.bm25_index import build_bm25_index, save_bm25_index, get_bm25_index_path, get_lexical_documents
+from rag.search.out_of_domain import build_out_of_domain_classifier, is_garbage_entry, \
+    get_out_of_domain_classifier_path, get_question_embeddings
+from rag.search.intent_index import build_intent_index, get_intent_index_path
+from rag.database.chunk_store import ChunkStore
+from rag.database.columnar_database import ColumnarDatabase, is_columnar_database, save_columnar_database, \
+    stack_database_embeddings, get_database_entries, DATABASE_INFO_KEYS, DELETED_FILES_KEY, \
+    OUT_OF_DOMAIN_CLASSIFIER_KEY, INTENT_INDEX_KEY
+from rag.database.deduplication import deduplicate_database
+from rag.database.pkl_database import load_pkl_database, save_pkl_database
+from rag.database.segments import SegmentedDatabase, get_chunked_files, get_delta_directory, load_deltas, \
+    read_database_entries, save_delta
+from rag.preprocessing.generate_embeddings import embed_chunked_file, build_search_arrays
+
+
+class UpdateOperation(str, Enum):
+    """Operations on the chunked files of a RAG database."""
+    ADD = "add"
+    UPDATE = "update"
+    DELETE = "delete"
+    COMPACT = "compact"
+
+
+def load_base_database(rag_db_path: str) -> ChunkStore | ColumnarDatabase:
+    """
+    :param rag_db_path: path of the RAG database (pickle or columnar)
+    :return: loaded base database (without its delta segments)
+    """
+
+    if not os.path.isfile(rag_db_path):
+        raise FileNotFoundError(f"There is no {rag_db_path} file.")
+    if is_columnar_database(rag_db_path):
+        return ColumnarDatabase(rag_db_path)
+    return ChunkStore(load_pkl_database(rag_db_path))
+
+
+def create_delta(rag_db_path: str, operation: UpdateOperation, file_names: list[str], origin_folder: str) -> str:
+    """
+    Save a delta segment adding, updating or deleting chunked files of a database. Only this small file has to be
+    shipped next to the database (in its .deltas directory) for the Retriever to use the new knowledge.
+    :param rag_db_path: path of the RAG database
+    :param operation: add (new files), update (re-embedded files) or delete
+    :param file_names: names of the chunked files
+    :param origin_folder: folder of the chunked files
+    :return: path of the saved delta segment
+    """
+
+    base_info = load_base_database(rag_db_path).info
+    chunked_files = get_chunked_files(base_info, load_deltas(rag_db_path))
+    if operation == UpdateOperation.ADD:
+        already_embedded = [file_name for file_name in file_names if file_name in chunked_files]
+        if already_embedded:
+            raise ValueError(f"{', '.join(already_embedded)} already in the database, use the update operation.")
+    elif chunked_files:
+        missing_files = [file_name for file_name in file_names if file_name not in chunked_files]
+        if missing_files:
+            raise ValueError(f"{', '.join(missing_files)} not in the database, use the add operation.")
+
+    delta = {DELETED_FILES_KEY: [] if operation == UpdateOperation.ADD else list(file_names)}
+    if operation != UpdateOperation.DELETE:
+        embedding_model = EmbeddingModel(name="all-MiniLM-L6-v2")
+        if base_info.get("embedding_model", embedding_model.embedding_model_version) != \
+                embedding_model.embedding_model_version:
+            raise ValueError(f"The database was generated with {base_info['embedding_model']}, the delta segment "
+                             f"would be generated with {embedding_model.embedding_model_version}.")
+        delta["embedding_model"] = embedding_model.embedding_model_version
+        delta["database_generator_files"] = list(file_names)
+        index = 0
+        for file_name in file_names:
+            file_path = os.path.join(origin_folder, file_name)
+            if not os.path.isfile(file_path):
+                raise ValueError(f"There is no {file_name} in {origin_folder}.")
+            for entry in embed_chunked_file(embedding_model, file_name, load_json(file_path)):
+                delta[index] = entry
+                index += 1
+        delta, _ = deduplicate_database(delta)
+
+    return save_delta(rag_db_path, delta)
+
+
+def compact_database(rag_db_path: str, out_of_domain_centroids: int = 16) -> str:
+    """
+    Merge the delta segments in the base database, in its format, and rebuild the indexes saved next to it (IVF,
+    BM25), the out-of-domain classifier and the intent index. The delta segments are then removed.
+    :param rag_db_path: path of the RAG database
+    :param out_of_domain_centroids: number of centroids of the out-of-domain classifier (if the database has one)
+    :return: path of the compacted database
+    """
+
+    base = load_base_database(rag_db_path)
+    deltas = load_deltas(rag_db_path)
+    if not deltas:
+        print(Fore.LIGHTGREEN_EX, f"\r{os.path.basename(rag_db_path)} has no delta segment.", Fore.RESET)
+        return rag_db_path
+
+    segmented_database = SegmentedDatabase(base, deltas)
+    entries = read_database_entries(segmented_database)
+    database = {key: segmented_database.info[key] for key in DATABASE_INFO_KEYS if key in segmented_database.info}
+    database.update(enumerate(entries))
+    database, _ = deduplicate_database(database)
+
+    entries = get_database_entries(database)
+    if base.out_of_domain_classifier is not None and out_of_domain_centroids > 0:
+        domain_embeddings = [entry["embeddings"] for entry in entries if not is_garbage_entry(entry)]
+        garbage_embeddings = [entry["embeddings"] for entry in entries if is_garbage_entry(entry)]
+        if domain_embeddings and garbage_embeddings:
+            database[OUT_OF_DOMAIN_CLASSIFIER_KEY] = build_out_of_domain_classifier(
+                np.concatenate(domain_embeddings), np.concatenate(garbage_embeddings),
+                num_centroids=out_of_domain_centroids, question_embeddings=get_question_embeddings(entries))
+    intent_index = build_intent_index(database)
+    if intent_index is not None:
+        database[INTENT_INDEX_KEY] = intent_index
+
+    # The compacted database and the files saved next to it are first written at temporary paths, and only replace
+    # the current ones once they are all built
+    temporary_path = rag_db_path + ".compacting"
+    side_file_paths = [get_ivf_index_path, get_bm25_index_path]
+    if isinstance(base, ColumnarDatabase):
+        extra_arrays, extra_header = build_search_arrays(
+            database, quantization=base.header.get("quantization") or QuantizationMethod.NONE,
+            binary_signatures=base.header.get("binary_signatures", False),
+            projection=base.header.get("projection") or ProjectionMethod.NONE,
+            projection_dim=base.header.get("projection_dim", 0))
+        save_columnar_database(destination_path=temporary_path, database=database, extra_arrays=extra_arrays,
+                               extra_header=extra_header)
+    else:
+        save_pkl_database(destination_path=temporary_path, database=database, rag_db_path=temporary_path)
+        side_file_paths += [get_out_of_domain_classifier_path, get_intent_index_path]
+
+    ivf_index_path = get_ivf_index_path(rag_db_path)
+    if os.path.isfile(ivf_index_path):
+        num_lists = len(load_ivf_index(ivf_index_path)["centroids"])
+        save_ivf_index(destination_path=get_ivf_index_path(temporary_path),
+                       ivf_index=build_ivf_index(stack_database_embeddings(database), num_lists=num_lists),
+                       rag_db_path=temporary_path)
+    if os.path.isfile(get_bm25_index_path(rag_db_path)):
+        save_bm25_index(destination_path=get_bm25_index_path(temporary_path),
+                        bm25_index=build_bm25_index(get_lexical_documents(database)), rag_db_path=temporary_path)
+
+    for get_path in side_file_paths:
+        if os.path.isfile(get_path(temporary_path)):
+            os.replace(get_path(temporary_path), get_path(rag_db_path))
+        elif os.path.isfile(get_path(rag_db_path)):
+            # stale file of the previous database
+            os.remove(get_path(rag_db_path))
+    os.replace(temporary_path, rag_db_path)
+
+    shutil.rmtree(get_delta_directory(rag_db_path))
+    print(Fore.LIGHTGREEN_EX, f"\rSuccessfully compacted {len(deltas)} delta segments in: ", rag_db_path, Fore.RESET)
+    return rag_db_path
+
+
+def main():
+    app = typer.Typer(
+        name="Database update",
+        add_completion=False,
+        context_settings={"help_option_names": ["-h", "--help"]},
+    )
+
+    src_dir_path = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+    @app.command()
+    def parse_args(
+            operation: UpdateOperation = typer.Argument(
+                ...,
+                help="'add', 'update' or 'delete' chunked files with a new delta segment, or 'compact' the delta "
+                     "segments in the database.",
+            ),
+            chunked_files: list[str] = typer.Option(
+                [],
+                "--file", "-f",
+                help=f"Chunked file name in data{os.sep}chunked_files ('-f file1 -f file2 ...' for a list of files).",
+            ),
+            rag_db_name: str = typer.Option(
+                "rag_database.pkl",
+                "--rag-database", "-d",
+                help=f"RAG database file name in data{os.sep}.",
+                show_default=True
+            ),
+            out_of_domain_centroids: int = typer.Option(
+                16,
+                "--out-of-domain-centroids",
+                help="Number of centroids of the out-of-domain classifier rebuilt by the compaction.",
+                show_default=True
+            )
+    ):
+        """
+        Update a RAG database without regenerating it: each update is saved as a small delta segment (in the .deltas
+        directory next to the database) that the Retriever applies on the database when it is loaded.
+        """
+
+        rag_db_path = os.path.join(src_dir_path, "data", rag_db_name)
+        if operation == UpdateOperation.COMPACT:
+            compact_database(rag_db_path, out_of_domain_centroids=out_of_domain_centroids)
+            return
+        if not chunked_files:
+            raise typer.BadParameter("At least one chunked file is required (--file).")
+
+        delta_path = create_delta(rag_db_path, operation, chunked_files,
+                                  origin_folder=os.path.join(src_dir_path, "data", "chunked_files"))
+        print(Fore.LIGHTGREEN_EX, f"\rSuccessfully saved delta segment ({operation.value} "
+                                  f"{', '.join(chunked_files)}) at: ", delta_path, Fore.RESET)
+
+    app()
+
+
+if __name__ == '__main__':
+    main()
@@ -10,13 +10,36 @@
 
 import os
 import sys
-import torch
-import torch.nn.functional as F
 import errno
 import time
+import numpy as np
 from colorama import Fore
-from rag.utils import load_pkl, check_censored_word_presence, pretty_print
+from rag.config import Config
+from rag.utils import pretty_print, CENSORED_WORDS, CENSORED_PHRASE_FILTER
+from rag.phrase_matcher import CensoredPhraseFilter
 from rag.models.embedding_models.embedding_models import EmbeddingModel
+from rag.database.columnar_database import ColumnarDatabase, is_columnar_database, check_database_fingerprint
+from rag.database.chunk_store import ChunkStore
+from rag.database.pkl_database import load_pkl_database
+from rag.database.segments import SegmentedDatabase, SegmentedLexicalIndex, SegmentedSearchEngine, load_deltas
+from rag.search.dense_search import DenseSearchEngine, as_query_matrix, l2_normalize, top_k
+from rag.search.ivf_index import IVFSearchEngine, load_ivf_index, get_ivf_index_path
+from rag.search.quantization import create_quantized_search_engine
+from rag.search.projection import create_projected_search_engine
+from rag.search.binary_search import BinarySearchEngine
+from rag.search.partitioned_search import PartitionedSearchEngine
+from rag.search.mmr import maximal_marginal_relevance
+from rag.search.adaptive_top_k import TokenCounter, get_adaptive_k
+from rag.search.bm25_index import BM25Index, load_bm25_index, get_bm25_index_path, reciprocal_rank_fusion
+from rag.cache.query_embedding_cache import QueryEmbeddingCache
+from rag.cache.semantic_cache import SemanticCache
+from rag.search.out_of_domain import OutOfDomainClassifier
+from rag.search.intent_index import IntentMatcher
+from rag.speculative_retrieval import SpeculativeRetrieval
+
+# Source of the (empty) results returned without searching the database
+CENSORED_SOURCE = "censored_queries"
+OUT_OF_DOMAIN_SOURCE = "out_of_domain"
 
 
 class Retriever:
@@ -26,6 +49,35 @@ class Retriever:
                  best_k: int,
                  rag_db_path: str,
                  verbose: bool = False,
+                 ann_nprobe: int = Config.ann_nprobe,
+                 ann_min_database_size: int = Config.ann_min_database_size,
+                 quantized_rescoring_factor: int = Config.quantized_rescoring_factor,
+                 binary_num_candidates: int = Config.binary_num_candidates,
+                 scan_threads: int = Config.scan_threads,
+                 scan_min_partition_size: int = Config.scan_min_partition_size,
+                 reranking_weight: float = Config.reranking_weight,
+                 deduplication_factor: int = Config.deduplication_factor,
+                 query_cache_size: int = Config.query_cache_size,
+                 query_cache_path: str = None,
+                 semantic_cache_size: int = Config.semantic_cache_size,
+                 semantic_cache_threshold: float = Config.semantic_cache_threshold,
+                 hybrid_search: bool = Config.hybrid_search,
+                 rrf_k: int = Config.rrf_k,
+                 lexical_num_candidates: int = Config.lexical_num_candidates,
+                 lexical_prefilter: bool = Config.lexical_prefilter,
+                 deny_list_path: str = None,
+                 out_of_domain_detection: bool = Config.out_of_domain_detection,
+                 out_of_domain_margin: float = Config.out_of_domain_margin,
+                 intent_detection: bool = Config.intent_detection,
+                 intent_threshold: float = Config.intent_threshold,
+                 intent_embedding_threshold: float = Config.intent_embedding_threshold,
+                 embedding_model: EmbeddingModel = None,
+                 min_similarity: float = Config.min_similarity,
+                 relative_similarity: float = Config.relative_similarity,
+                 context_token_budget: int = Config.context_token_budget,
+                 context_tokenizer_path: str = None,
+                 mmr_lambda: float = Config.mmr_lambda,
+                 near_duplicate_threshold: float = Config.near_duplicate_threshold,
                  ):
 
         src_dir_path = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
@@ -33,24 +85,72 @@ class Retriever:
         self.top_k = top_k
         self.best_k = best_k
         self.reranking = reranking
+        self.reranking_weight = reranking_weight
+        self.deduplication_factor = deduplication_factor
+        self.ann_min_database_size = ann_min_database_size
+        self.rrf_k = rrf_k
+        self.lexical_num_candidates = lexical_num_candidates
+        self.lexical_prefilter = lexical_prefilter
+        # The default filter is built once at import time and shared by every retriever
+        self.is_censored = CENSORED_PHRASE_FILTER
+        if deny_list_path is not None:
+            self.is_censored = CensoredPhraseFilter(CENSORED_WORDS, deny_list_path=deny_list_path)
+        self.mmr_lambda = mmr_lambda
+        self.near_duplicate_threshold = near_duplicate_threshold
+        self.min_similarity = min_similarity
+        self.relative_similarity = relative_similarity
+        self.context_token_budget = context_token_budget
+        self.count_tokens = None
+        if context_token_budget > 0:
+            if context_tokenizer_path is None:
+                raise ValueError("The tokenizer of the LLM is required by the context token budget.")
+            self.count_tokens = TokenCounter(context_tokenizer_path)
 
         if hasattr(sys, '_MEIPASS'):
             # Update path for Pyinstaller package
             src_dir_path = src_dir_path.replace("_internal", "rag/src")
 
-        self.embedding_model = EmbeddingModel(name="all-MiniLM-L6-v2")
+        # The embedding model can be shared by several retrievers (e.g. the shards of a ShardedRetriever)
+        self.embedding_model = embedding_model if embedding_model is not None else EmbeddingModel(
+            name="all-MiniLM-L6-v2")
+        self.query_cache = QueryEmbeddingCache(max_size=query_cache_size,
+                                               embedding_model_version=self.embedding_model.embedding_model_version,
+                                               cache_path=query_cache_path)
+        self.semantic_cache = SemanticCache(max_size=semantic_cache_size, threshold=semantic_cache_threshold,
+                                            rag_db_path=rag_db_path)
 
         if not os.path.isfile(rag_db_path):
             raise FileNotFoundError(errno.ENOENT, os.strerror(errno.ENOENT), rag_db_path)
 
-        database = load_pkl(rag_db_path)
+        if is_columnar_database(rag_db_path):
+            # Memory-mapped database: embeddings are shared and paged on demand, texts are decoded on access
+            database = ColumnarDatabase(rag_db_path)
+            columnar_database = database
+        else:
+            # Compact in-memory store: single embedding buffer, interned chunks and columnar metadata
+            database = ChunkStore(load_pkl_database(rag_db_path))
+            columnar_database = None
+
+        # Knowledge updates shipped as delta segments are applied on the base database
+        base_database = database
+        deltas = load_deltas(rag_db_path)
+        self.num_delta_segments = len(deltas)
+        if deltas:
+            database = SegmentedDatabase(database, deltas)
+
+        self.database_info = database.info
+        database_info = self.database_info
+        self.chunk_list, self.embedding_list, self.metadata_list = (database.chunk_list, database.embeddings,
+                                                                    database.metadata_list)
+        self.reranking_embedding_list, self.entry_id_list = database.reranking_embeddings, database.entry_ids
+        self.chunk_id_list = database.chunk_ids
 
         rag_db_info = {}
         embedding_model_version = None
 
         # Check if the database contains the "embedding_model" key
-        if "embedding_model" in database:
-            embedding_model_version = database.pop("embedding_model")
+        if "embedding_model" in database_info:
+            embedding_model_version = database_info["embedding_model"]
             # Verify if the stored embedding model matches the current one
             if embedding_model_version != self.embedding_model.embedding_model_version:
                 raise UserWarning(
@@ -64,55 +164,135 @@ class Retriever:
                   "Warning: Unable to verify if the same embedding model was used during database generation.",
                   Fore.RESET)
 
-        if "database_description" in database:
-            rag_db_info["Description"] = database.pop("database_description")
+        if "database_description" in database_info:
+            rag_db_info["Description"] = database_info["database_description"]
         if embedding_model_version:
             rag_db_info["Embedding model used for generation"] = embedding_model_version
-        if "database_generator_files" in database:
-            rag_db_info["Chunk files used for generation"] = database.pop("database_generator_files")
+        if "database_generator_files" in database_info:
+            rag_db_info["Chunk files used for generation"] = database_info["database_generator_files"]
+        if self.num_delta_segments:
+            rag_db_info["Delta segments"] = self.num_delta_segments
+
+        self.search_engine = self._init_search_engine(rag_db_path, columnar_database, base_database.embeddings,
+                                                      base_database.normalized, ann_nprobe, ann_min_database_size,
+                                                      quantized_rescoring_factor, binary_num_candidates, scan_threads,
+                                                      scan_min_partition_size)
+        rag_db_info["Search engine"] = type(self.search_engine).__name__
+        self.lexical_index = self._init_lexical_index(rag_db_path, hybrid_search)
+        if self.lexical_index is not None:
+            rag_db_info["Search engine"] += f" + {type(self.lexical_index).__name__} (reciprocal rank fusion)"
+        if deltas:
+            # The search structures of the base stay valid: its deleted rows are dropped from the results and the rows
+            # of the delta segments are searched separately
+            self.search_engine = SegmentedSearchEngine(self.search_engine, database)
+            if self.lexical_index is not None:
+                self.lexical_index = SegmentedLexicalIndex(self.lexical_index, database)
+
+        self.out_of_domain_classifier = None
+        if out_of_domain_detection and database.out_of_domain_classifier is not None:
+            self.out_of_domain_classifier = OutOfDomainClassifier(database.out_of_domain_classifier,
+                                                                  margin=out_of_domain_margin)
+            rag_db_info["Out-of-domain detection"] = (f"{len(self.out_of_domain_classifier.garbage_centroids)} "
+                                                      f"garbage model centroids")
+
+        self.intent_matcher = None
+        if intent_detection and database.intent_index is not None:
+            self.intent_matcher = IntentMatcher(database.intent_index, self.embedding_list, threshold=intent_threshold,
+                                                embedding_threshold=intent_embedding_threshold)
+            rag_db_info["Intent detection"] = f"{len(self.intent_matcher)} command phrases"
+
         if self.verbose:
             pretty_print(name="RAG database information", result_dictionary=rag_db_info)
         else:
             if "Description" in rag_db_info:
                 print(Fore.LIGHTGREEN_EX, f"\rDatabase used: {rag_db_info['Description']}", Fore.RESET)
 
-        self.chunk_list, self.embedding_list, self.metadata_list = self._split_database(database)
-
-    @staticmethod
-    def _split_database(database: dict) -> tuple[list, torch.Tensor, list]:
+    def _init_search_engine(self,
+                            rag_db_path: str,
+                            columnar_database: ColumnarDatabase | None,
+                            embeddings: np.ndarray,
+                            normalized: bool,
+                            ann_nprobe: int,
+                            ann_min_database_size: int,
+                            quantized_rescoring_factor: int,
+                            binary_num_candidates: int,
+                            scan_threads: int,
+                            scan_min_partition_size: int) -> DenseSearchEngine:
         """
-        Split the input dictionary into three aligned components.
-        :param database: Input dictionary containing the chunks (text) and their related embeddings and metadata.
-        :return: List of chunks, tensor of embeddings, and list of metadata. The elements are aligned.
+        Use the quantized or projected embeddings stored in the database (if any). Otherwise, for large databases, use
+        the binary signatures stored in the database or the IVF index saved next to the database (if any), and the
+        exact scan in every other case (partitioned on several threads if scan_threads > 1).
+        :param rag_db_path: path of the RAG database
+        :param columnar_database: memory-mapped database (None for pickle databases)
+        :param embeddings: database embeddings of shape (num_embeddings, dim)
+        :param normalized: True if the database embeddings are already L2-normalized
+        :param ann_nprobe: number of inverted lists scanned per query
+        :param ann_min_database_size: minimum number of embeddings for the approximate (IVF, binary) search
+        :param quantized_rescoring_factor: number of candidates rescored exactly per pre-selected chunk
+        :param binary_num_candidates: number of candidates kept by the Hamming prefilter
+        :param scan_threads: number of threads of the exact scan
+        :param scan_min_partition_size: minimum number of embeddings per partition of the exact scan
+        :return: search engine over the database embeddings
         """
 
-        embedding_list = torch.empty((0, database[0]['embeddings'].shape[1]))
-        chunk_list = []
-        metadata_list = []
-
-        for key, value in database.items():
-            num_elements = value['embeddings'].shape[0]
-            embeddings = value.pop('embeddings')
-            embedding_list = torch.cat((embedding_list, embeddings), dim=0)
-            # Store chunks (keeping them as a list since they are likely text)
-            chunk_list.extend(value.pop('chunks'))
-            # Store metadata (keeping it as a list of dictionaries to avoid tensor conversion issues)
-            metadata_list.extend([value.copy() for _ in range(num_elements)])  # Copy to avoid modifying original dict
-
-        return chunk_list, embedding_list, metadata_list
-
-    @staticmethod
-    def _similarity(x: torch.Tensor, y: torch.Tensor) -> torch.Tensor:
+        embeddings = np.asarray(embeddings, dtype=np.float32)
+        # Already L2-normalized embeddings are used without any copy
+        normalize = not normalized
+
+        if columnar_database is not None and columnar_database.header.get("quantization"):
+            return create_quantized_search_engine(embeddings,
+                                                  method=columnar_database.header["quantization"],
+                                                  get_array=columnar_database.array,
+                                                  rescoring_factor=quantized_rescoring_factor)
+        if columnar_database is not None and columnar_database.header.get("projection"):
+            return create_projected_search_engine(embeddings, get_array=columnar_database.array,
+                                                  rescoring_factor=quantized_rescoring_factor)
+
+        def create_exact_search_engine() -> DenseSearchEngine:
+            if scan_threads > 1:
+                return PartitionedSearchEngine(embeddings, num_threads=scan_threads,
+                                               min_partition_size=scan_min_partition_size, normalize=normalize)
+            return DenseSearchEngine(embeddings, normalize=normalize)
+
+        if len(embeddings) < ann_min_database_size:
+            return create_exact_search_engine()
+
+        if columnar_database is not None and columnar_database.header.get("binary_signatures"):
+            return BinarySearchEngine(embeddings, num_candidates=binary_num_candidates,
+                                      binary_signatures=columnar_database.array("binary_signatures"),
+                                      normalize=normalize)
+
+        ivf_index_path = get_ivf_index_path(rag_db_path)
+        if os.path.isfile(ivf_index_path):
+            try:
+                ivf_index = load_ivf_index(ivf_index_path)
+                check_database_fingerprint(ivf_index, ivf_index_path, rag_db_path)
+                return IVFSearchEngine(embeddings, ivf_index, nprobe=ann_nprobe, normalize=normalize)
+            except ValueError as e:
+                print(Fore.RED, f"Warning: {e} The exact search is used instead.", Fore.RESET)
+
+        return create_exact_search_engine()
+
+    def _init_lexical_index(self, rag_db_path: str, hybrid_search: bool) -> BM25Index | None:
         """
-        :param x: first input
-        :param y: second input
-        :return: similarity between the two inputs
+        :param rag_db_path: path of the RAG database
+        :param hybrid_search: use the BM25 index saved next to the database (if any)
+        :return: BM25 index over the database chunks, None if the hybrid search is not used
         """
 
-        return F.cosine_similarity(x, y, dim=-1)
+        bm25_index_path = get_bm25_index_path(rag_db_path)
+        if not hybrid_search or not os.path.isfile(bm25_index_path):
+            return None
+        try:
+            lexical_index = load_bm25_index(bm25_index_path)
+            check_database_fingerprint(lexical_index, bm25_index_path, rag_db_path)
+            return BM25Index(lexical_index, num_documents=len(self.search_engine))
+        except ValueError as e:
+            print(Fore.RED, f"Warning: {e} The dense search only is used instead.", Fore.RESET)
+        return None
 
     @staticmethod
-    def _top_k(array: torch.Tensor, k: int) -> tuple[torch.Tensor, torch.Tensor]:
+    def _top_k(array: np.ndarray, k: int) -> tuple[np.ndarray, np.ndarray]:
         """
         Get the k highest value(s) and their indexes in the input array.
         :param array: input array in which we look for the highest value(s)
@@ -120,103 +300,401 @@ class Retriever:
         :return: the index(es) of the highest value(s) in the input array and the corresponding element(s) in the array
         """
 
-        values, indices = torch.topk(array, k, dim=-1)  # Returns values and indices
+        values, indices = top_k(array, k)  # Returns values and indices
         return values, indices
 
-    def _find_top_k(self, query_embedding: torch.Tensor) -> tuple[torch.Tensor, torch.Tensor]:
+    def _hybrid_search(self, query_embedding: np.ndarray, query: str, k: int) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Fuse the dense and the BM25 rankings of a query with reciprocal rank fusion. With `lexical_prefilter`, the
+        BM25 candidates are used as a prefilter: the dense similarity is only computed on them instead of the whole
+        database.
+        :param query_embedding: embedding of the query, shape (dim,)
+        :param query: user query
+        :param k: number of chunks to retrieve
+        :return: similarities and indices of the k best fused chunks, in the fused order
+        """
+
+        num_candidates = max(k, self.lexical_num_candidates)
+        _, lexical_index_list = self.lexical_index.search(query, k=num_candidates)
+        query_embedding = l2_normalize(query_embedding)
+
+        if self.lexical_prefilter and len(lexical_index_list) >= k:
+            # lexical candidate generation: only the BM25 candidates are scored
+            _, positions = self._top_k(self.search_engine.embeddings[lexical_index_list] @ query_embedding,
+                                       num_candidates)
+            dense_index_list = lexical_index_list[positions]
+        else:
+            _, dense_index_list = self.search_engine.search(query_embedding, k=num_candidates)
+
+        _, fused_index_list = reciprocal_rank_fusion([dense_index_list, lexical_index_list], rrf_k=self.rrf_k)
+        fused_index_list = fused_index_list[:k]
+        return self.search_engine.embeddings[fused_index_list] @ query_embedding, fused_index_list
+
+    def _search(self, query_embedding: np.ndarray, query_list: list[str], k: int) -> tuple[np.ndarray, np.ndarray]:
         """
-        Compute similarity between query embedding and the database embeddings and find the top_k.
-        :param query_embedding: embedding of the query
+        Search the k most relevant chunks with the search engine, fused with the BM25 ranking if a BM25 index is used.
+        :param query_embedding: embedding of the query, or matrix of embeddings for a batch of queries
+        :param query_list: queries (aligned with the embeddings)
+        :param k: number of chunks to retrieve
+        :return: similarities and indices of the retrieved chunks, shape (k,) or (num_queries, k), sorted by decreasing
+        similarity (in the fused order with the hybrid search)
+        """
+
+        if self.lexical_index is None:
+            return self.search_engine.search(query_embedding, k=k)
+
+        query_matrix = as_query_matrix(query_embedding)
+        k = min(k, len(self.search_engine))
+        similarity_matrix = np.empty((len(query_matrix), k), dtype=np.float32)
+        index_matrix = np.empty((len(query_matrix), k), dtype=np.int64)
+        for row, (embedding, query) in enumerate(zip(query_matrix, query_list)):
+            similarity_matrix[row], index_matrix[row] = self._hybrid_search(embedding, query, k)
+
+        if np.ndim(query_embedding) == 1:
+            return similarity_matrix[0], index_matrix[0]
+        return similarity_matrix, index_matrix
+
+    def _find_top_k(self, query_embedding: np.ndarray, query_list: list[str]) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Compute similarity between query embedding(s) and the database embeddings and find the top_k.
+        :param query_embedding: embedding of the query, or matrix of embeddings for a batch of queries
+        :param query_list: queries (aligned with the embeddings), used by the hybrid search
         :return: selected indices in the database and the related similarities
         """
 
-        # compute similarity between database embeddings and the query
-        sim = self._similarity(self.embedding_list, query_embedding)
+        if self.lexical_index is not None:
+            # the fused ranking depends on the number of candidates: it is not widened, so that a query retrieves the
+            # same chunks alone or in a batch. The chunks are selected (and deduplicated) in the fused order, the later
+            # steps (best_k selection, adaptive top-k) expect decreasing similarities
+            num_candidates = self.top_k * max(self.deduplication_factor, 1)
+            top_similarity_list, top_index_list = self._search(query_embedding, query_list, k=num_candidates)
+            if self.deduplication_factor > 0:
+                top_similarity_list, top_index_list, _ = self._deduplicate(top_similarity_list, top_index_list)
+            order = np.argsort(-top_similarity_list, axis=-1, kind="stable")
+            return (np.take_along_axis(top_similarity_list, order, axis=-1),
+                    np.take_along_axis(top_index_list, order, axis=-1))
+
+        if self.deduplication_factor <= 0:
+            # compute similarity between database embeddings and the query with a single matrix product
+            return self._search(query_embedding, query_list, k=self.top_k)
+
+        # search more candidates so that top_k distinct chunks remain after collapsing the duplicated ones, and widen
+        # the search if a chunk is retrieved so many times that there are not enough distinct chunks
+        num_candidates = self.top_k * self.deduplication_factor
+        while True:
+            top_similarity_list, top_index_list = self._search(query_embedding, query_list, k=num_candidates)
+            top_similarity_list, top_index_list, num_distinct = self._deduplicate(top_similarity_list, top_index_list)
+            if num_distinct >= self.top_k or num_candidates >= len(self.search_engine):
+                return top_similarity_list, top_index_list
+            num_candidates *= 2
+
+    def _deduplicate(self,
+                     similarity_list: np.ndarray,
+                     index_list: np.ndarray) -> tuple[np.ndarray, np.ndarray, int]:
+        """
+        Collapse the candidates sharing the same chunk text (e.g. the question-answer and question-only embeddings of
+        the same HiRAG answer), so that best_k slots are not wasted on the same chunk. Only the most relevant candidate
+        of each chunk is kept; duplicates are only used if there are not enough distinct chunks.
+        :param similarity_list: candidate similarities, sorted by decreasing relevance (similarity, or fused rank with
+        the hybrid search), shape (n,) or (num_queries, n)
+        :param index_list: candidate indices in the database, same shape as similarity_list
+        :return: top_k similarities and indices, shape (top_k,) or (num_queries, top_k), and the minimum number of
+        distinct chunks among the candidates of a query
+        """
 
-        # Select top-k similarities
-        top_similarity_list, top_index_list = self._top_k(array=sim.flatten(), k=self.top_k)
+        chunk_ids = self.chunk_id_list[index_list]
+        # A candidate is a duplicate if a more similar candidate has the same chunk id (stable sort keeps the order)
+        order = np.argsort(chunk_ids, axis=-1, kind="stable")
+        sorted_chunk_ids = np.take_along_axis(chunk_ids, order, axis=-1)
+        sorted_duplicates = np.zeros(chunk_ids.shape, dtype=bool)
+        sorted_duplicates[..., 1:] = sorted_chunk_ids[..., 1:] == sorted_chunk_ids[..., :-1]
+        duplicates = np.empty_like(sorted_duplicates)
+        np.put_along_axis(duplicates, order, sorted_duplicates, axis=-1)
+
+        # Distinct chunks first (in similarity order), then the duplicates
+        selection = np.argsort(duplicates, axis=-1, kind="stable")[..., :self.top_k]
+        return (np.take_along_axis(similarity_list, selection, axis=-1),
+                np.take_along_axis(index_list, selection, axis=-1),
+                int(np.min(np.sum(~duplicates, axis=-1))))
+
+    def _rerank_similarities(self,
+                             top_index_list: np.ndarray,
+                             top_similarity_list: np.ndarray,
+                             query_embedding: np.ndarray) -> np.ndarray:
+        """
+        Blend the similarity of the relevant chunks with the similarity of the question part of the chunk (if it
+        exists). The reranking embeddings of all the candidates are gathered and scored at once, for a single query or
+        for a batch of queries.
+        :param top_index_list: indices of the most similar chunks, shape (top_k,) or (num_queries, top_k)
+        :param top_similarity_list: similarities of the most similar chunks, same shape as top_index_list
+        :param query_embedding: user query embedding(s), shape (dim,) or (num_queries, dim)
+        :return: reranked similarities, same shape as top_index_list
+        """
+
+        # Gather the normalized reranking embeddings of the candidates, shape (..., top_k, dim)
+        questions_embeddings = self.reranking_embedding_list[self.entry_id_list[top_index_list]]
+
+        # Compute cosine similarity
+        new_similarity_list = np.einsum("...kd,...d->...k", questions_embeddings, l2_normalize(query_embedding))
 
-        return top_similarity_list, top_index_list
+        # Compute final similarity by blending both similarities (a weight of 0.5 is the average)
+        return (1 - self.reranking_weight) * top_similarity_list + self.reranking_weight * new_similarity_list
 
     def _rerank(self,
-                top_index_list: torch.Tensor,
-                top_similarity_list: torch.Tensor,
-                query_embedding: torch.Tensor) -> tuple[torch.Tensor, torch.Tensor]:
+                top_index_list: np.ndarray,
+                top_similarity_list: np.ndarray,
+                query_embedding: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
         """
-        Rerank the order of the relevant chunks by averaging the similarity with the similarity of the question
+        Rerank the order of the relevant chunks by blending their similarity with the similarity of the question
         part of the chunk (if it exists).
-        :param top_index_list: tensor of indices of the most similar chunks
-        :param top_similarity_list: tensor of similarities of the most similar chunks
-        :param query_embedding: user query embedding
+        :param top_index_list: indices of the most similar chunks, shape (top_k,) or (num_queries, top_k)
+        :param top_similarity_list: similarities of the most similar chunks, same shape as top_index_list
+        :param query_embedding: user query embedding(s), shape (dim,) or (num_queries, dim)
         :return: reranked indexes in the database and the related updated similarities
         """
 
-        # Initialize questions_embeddings tensor
-        questions_embeddings = torch.zeros((len(top_index_list), query_embedding.shape[-1]))
-
-        # Extract reranking embeddings from metadata_list
-        for i, index in enumerate(top_index_list):
-            questions_embeddings[i] = self.metadata_list[index]["reranking_embedding"]
-
-        # Compute similarity using PyTorch's cosine similarity
-        new_similarity_list = self._similarity(questions_embeddings, query_embedding)
-
-        # Compute final similarity by averaging
-        new_similarity_list = (top_similarity_list + new_similarity_list) / 2
+        new_similarity_list = self._rerank_similarities(top_index_list, top_similarity_list, query_embedding)
 
         # Get the reranked indices and similarities
         reranked_similarity_list, new_index_order_list = self._top_k(array=new_similarity_list, k=self.best_k)
 
         # Reorder top indices accordingly
-        # reranked_index_list = [top_index_list[i].item() for i in new_index_order_list]
-        reranked_index_list = top_index_list[new_index_order_list]
+        reranked_index_list = np.take_along_axis(top_index_list, new_index_order_list, axis=-1)
 
         return reranked_index_list, reranked_similarity_list
 
-    def __call__(self, query: str) -> tuple[list, list, list]:
+    def _select_diverse(self,
+                        top_similarity_list: np.ndarray,
+                        top_index_list: np.ndarray,
+                        query_embedding: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
         """
-        Retrieve the most relevant chunks (and their related metadata) in the database for the input query.
+        Select the best_k chunks among the top_k pre-selected ones with maximal marginal relevance, so that
+        near-paraphrases (e.g. HiRAG augmented answers) do not fill the prompt with the same information.
+        :param top_similarity_list: similarities of the top_k chunks, shape (top_k,) or (num_queries, top_k)
+        :param top_index_list: indices of the top_k chunks in the database, same shape as top_similarity_list
+        :param query_embedding: user query embedding(s), shape (dim,) or (num_queries, dim)
+        :return: indices of the best_k chunks in the database and their (reranked) similarities
+        """
+
+        relevance = top_similarity_list
+        if self.reranking:
+            relevance = self._rerank_similarities(top_index_list, top_similarity_list, query_embedding)
+        positions = maximal_marginal_relevance(relevance, self.search_engine.embeddings[top_index_list], self.best_k,
+                                               mmr_lambda=self.mmr_lambda,
+                                               duplicate_threshold=self.near_duplicate_threshold)
+        return np.take_along_axis(top_index_list, positions, axis=-1), np.take_along_axis(relevance, positions, axis=-1)
+
+    def _select_best(self,
+                     top_similarity_list: np.ndarray,
+                     top_index_list: np.ndarray,
+                     query_embedding: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Select the best_k chunks among the top_k pre-selected ones (with or without reranking, and with a diversity
+        selection if it is enabled).
+        :param top_similarity_list: similarities of the top_k chunks, shape (top_k,) or (num_queries, top_k)
+        :param top_index_list: indices of the top_k chunks in the database, same shape as top_similarity_list
+        :param query_embedding: user query embedding(s), shape (dim,) or (num_queries, dim)
+        :return: indices of the best_k chunks in the database and the related similarities
+        """
+
+        if self.best_k < self.top_k:
+            if self.mmr_lambda < 1 or self.near_duplicate_threshold > 0:
+                return self._select_diverse(top_similarity_list, top_index_list, query_embedding)
+            # reranking
+            if self.reranking:
+                return self._rerank(top_index_list, top_similarity_list, query_embedding)
+            return top_index_list[..., :self.best_k], top_similarity_list[..., :self.best_k]
+
+        elif self.best_k == self.top_k:
+            return top_index_list, top_similarity_list
+
+        raise ValueError("best_k value must be inferior or equal to top_k value.")
+
+    def _encode_query(self, query: str) -> np.ndarray:
+        """
+        Get the embedding of a query from the query cache, or compute it with the embedding model.
         :param query: user query
-        :return: most relevant chunks and related metadata
+        :return: query embedding, shape (dim,)
         """
 
-        start_time = time.time()
-        # Check presence of censored words
-        is_query_censored = check_censored_word_presence(query)
-        if is_query_censored:
-            best_chunk_list = ["" for _ in range(self.best_k)]
-            best_similarity_list = [0.0 for _ in range(self.best_k)]
-            best_metadata_list = [{"source": "censored_queries"} for _ in range(self.best_k)]
+        query_embedding = self.query_cache.get(query)
+        if query_embedding is None:
+            query_embedding = as_query_matrix(self.embedding_model.encode(query))[0]
+            self.query_cache.put(query, query_embedding)
+        return query_embedding
+
+    @staticmethod
+    def _copy_result(result: tuple[list, list, list]) -> tuple[list, list, list]:
+        """
+        :param result: chunks, similarities and metadata
+        :return: copy of the result, so that the cached results are not modified by the caller
+        """
+
+        chunk_list, similarity_list, metadata_list = result
+        return list(chunk_list), list(similarity_list), [dict(metadata) for metadata in metadata_list]
+
+    def get_cached_answer(self, query: str) -> tuple[str | None, object]:
+        """
+        Get the final answer (and synthesized audio) stored with `cache_answer` for a semantically similar query.
+        :param query: user query
+        :return: cached answer and audio (None if there are no cached answer or audio)
+        """
+
+        cache_entry, _ = self.semantic_cache.lookup(self._encode_query(query), update_stats=False)
+        if cache_entry is None:
+            return None, None
+        return cache_entry.answer, cache_entry.audio
+
+    def cache_answer(self, query: str, answer: str, audio: object = None) -> None:
+        """
+        Store the final answer (and synthesized audio) generated for a query in the semantic cache, so that they can
+        be reused for semantically similar queries. The query must have been retrieved before.
+        :param query: user query
+        :param answer: answer generated by the LLM
+        :param audio: audio synthesized for the answer
+        :return: None
+        """
+
+        cache_entry, _ = self.semantic_cache.lookup(self._encode_query(query), update_stats=False)
+        if cache_entry is not None:
+            cache_entry.answer, cache_entry.audio = answer, audio
+
+    def _empty_result(self, source: str) -> tuple[list, list, list]:
+        """
+        :param source: source of the result (CENSORED_SOURCE or OUT_OF_DOMAIN_SOURCE)
+        :return: the empty result returned when the database is not searched
+        """
+
+        best_chunk_list = ["" for _ in range(self.best_k)]
+        best_similarity_list = [0.0 for _ in range(self.best_k)]
+        best_metadata_list = [{"source": source} for _ in range(self.best_k)]
+        return best_chunk_list, best_similarity_list, best_metadata_list
+
+    def _censored_result(self) -> tuple[list, list, list]:
+        """
+        :return: the empty result returned when the query contains a censored word
+        """
+
+        return self._empty_result(CENSORED_SOURCE)
+
+    def _out_of_domain_result(self) -> tuple[list, list, list]:
+        """
+        :return: the empty result returned when the query is out-of-domain (it should get the out-of-domain answer
+        without calling the LLM)
+        """
+
+        return self._empty_result(OUT_OF_DOMAIN_SOURCE)
+
+    def _match_intent(self, query: str, query_embedding: np.ndarray = None) -> tuple[list, list, list] | None:
+        """
+        :param query: user query
+        :param query_embedding: embedding of the query (None to only compare the words of the query to the commands)
+        :return: command chunks matching the query and their metadata (with their "intent"), None if no command is
+        confidently detected
+        """
+
+        if self.intent_matcher is None:
+            return None
+        if query_embedding is None:
+            match = self.intent_matcher.match(query, self.best_k)
         else:
-            # text query is transformed in an embedding
-            query_embedding = self.embedding_model.encode(query)
+            match = self.intent_matcher.match_embedding(query_embedding, self.best_k)
+        return None if match is None else self._build_result(*match)
+
+    def is_out_of_domain(self, query_embeddings: np.ndarray) -> np.ndarray:
+        """
+        :param query_embeddings: query embedding(s), shape (dim,) or (num_queries, dim)
+        :return: True for each out-of-domain query, shape (num_queries,) (always False without a classifier)
+        """
 
-            # get top_k retrieved embeddings from data and their similarity
-            top_similarity_list, top_index_list = self._find_top_k(query_embedding=query_embedding)
+        if self.out_of_domain_classifier is None:
+            return np.zeros(as_query_matrix(query_embeddings).shape[0], dtype=bool)
+        return self.out_of_domain_classifier(query_embeddings)
 
-            if self.best_k < self.top_k:
-                # reranking
-                if self.reranking:
-                    best_index_list, best_similarity_list = self._rerank(top_index_list, top_similarity_list,
-                                                                         query_embedding)
-                else:
-                    best_index_list, best_similarity_list = top_index_list[:self.best_k], top_similarity_list[
-                                                                                          :self.best_k]
+    def _build_result(self, best_index_list: np.ndarray, best_similarity_list: np.ndarray) -> tuple[list, list, list]:
+        """
+        Get chunks (texts) and related metadata corresponding to the retrieved embeddings.
+        :param best_index_list: indices of the selected chunks in the database
+        :param best_similarity_list: similarities of the selected chunks
+        :return: most relevant chunks, their similarities and related metadata
+        """
+
+        best_chunk_list = [self.chunk_list[i] for i in best_index_list]
+        best_metadata_list = [self.metadata_list[i] for i in best_index_list]
+        return best_chunk_list, best_similarity_list.tolist(), best_metadata_list
+
+    def adapt_k(self, result: tuple[list, list, list]) -> tuple[list, list, list]:
+        """
+        Drop the chunks that are not worth adding to the prompt (see `get_adaptive_k`).
+        :param result: chunks, similarities and metadata, sorted by decreasing similarity
+        :return: the first chunks of the result (at least one)
+        """
+
+        best_chunk_list, best_similarity_list, best_metadata_list = result
+        k = get_adaptive_k(best_similarity_list, best_chunk_list, min_similarity=self.min_similarity,
+                           relative_similarity=self.relative_similarity, token_budget=self.context_token_budget,
+                           count_tokens=self.count_tokens)
+        if k == len(best_chunk_list):
+            return result
+        return best_chunk_list[:k], best_similarity_list[:k], best_metadata_list[:k]
+
+    def retrieve(self, query: str, update_semantic_cache: bool = True) -> tuple[list, list, list]:
+        """
+        Retrieve the most relevant chunks (and their related metadata) in the database for the input query.
+        :param query: user query
+        :param update_semantic_cache: cache the result in the semantic cache (if it is enabled)
+        :return: most relevant chunks, their similarities and related metadata
+        """
 
-            elif self.best_k == self.top_k:
-                best_index_list, best_similarity_list = top_index_list, top_similarity_list
+        # Check presence of censored words
+        is_query_censored = self.is_censored(query)
+        # commands are detected from the words of the query, without the embedding model
+        intent_result = None if is_query_censored else self._match_intent(query)
+        if is_query_censored:
+            return self._censored_result()
+        if intent_result is not None:
+            return intent_result
+
+        # text query is transformed in an embedding
+        query_embedding = self._encode_query(query)
+
+        # commands and out-of-domain queries skip the search, otherwise reuse the result of a similar query
+        intent_result = self._match_intent(query, query_embedding)
+        if intent_result is not None:
+            return intent_result
+        if self.is_out_of_domain(query_embedding)[0]:
+            return self._out_of_domain_result()
+        cache_entry, _ = self.semantic_cache.lookup(query_embedding)
+        if cache_entry is not None:
+            return self._copy_result(cache_entry.result)
+
+        # get top_k retrieved embeddings from data and their similarity
+        top_similarity_list, top_index_list = self._find_top_k(query_embedding=query_embedding, query_list=[query])
+
+        best_index_list, best_similarity_list = self._select_best(top_similarity_list, top_index_list,
+                                                                  query_embedding)
+
+        # get chunks (texts) and related metadata corresponding to the retrieved embeddings
+        result = self.adapt_k(self._build_result(best_index_list, best_similarity_list))
+        if update_semantic_cache:
+            self.semantic_cache.add(query, query_embedding, self._copy_result(result))
+        return result
 
-            else:
-                raise ValueError("best_k value must be inferior or equal to top_k value.")
+    def __call__(self, query: str) -> tuple[list, list, list]:
+        """
+        Retrieve the most relevant chunks (and their related metadata) in the database for the input query.
+        :param query: user query
+        :return: most relevant chunks and related metadata
+        """
 
-            # get chunks (texts) and related metadata corresponding to the retrieved embeddings
-            best_chunk_list = [self.chunk_list[i] for i in best_index_list]
-            best_metadata_list = [self.metadata_list[i] for i in best_index_list]
-            best_similarity_list = best_similarity_list.tolist()
+        start_time = time.time()
+        best_chunk_list, best_similarity_list, best_metadata_list = self.retrieve(query)
 
         if self.verbose:
             pretty_print(name="RAG", result_dictionary={
                 "Latency": f"{(time.time() - start_time):0.2f}s",
+                "Query cache": self.query_cache.stats,
+                "Semantic cache": self.semantic_cache.stats,
                 "Chunks": best_chunk_list,
                 "Similarities": best_similarity_list,
                 "Metadata": best_metadata_list,
@@ -224,3 +702,75 @@ class Retriever:
             })
 
         return best_chunk_list, best_similarity_list, best_metadata_list
+
+    def start_speculation(self) -> SpeculativeRetrieval:
+        """
+        :return: a speculative retrieval of an utterance, updated with the partial transcripts of the ASR
+        """
+
+        return SpeculativeRetrieval(self)
+
+    def retrieve_embeddings(self, queries: list[str], query_matrix: np.ndarray) -> list[tuple[list, list, list]]:
+        """
+        Search the database for already embedded queries (without the censorship, command, out-of-domain and cache
+        checks). The top_k embeddings and the best_k ones are selected for all the queries at once.
+        :param queries: user queries (used by the hybrid search)
+        :param query_matrix: embeddings of the queries, shape (num_queries, dim)
+        :return: list of (chunks, similarities, metadata) tuples, aligned with the input queries
+        """
+
+        top_similarity_matrix, top_index_matrix = self._find_top_k(query_embedding=query_matrix, query_list=queries)
+        best_index_matrix, best_similarity_matrix = self._select_best(top_similarity_matrix, top_index_matrix,
+                                                                      query_matrix)
+        return [self.adapt_k(self._build_result(best_index_matrix[row], best_similarity_matrix[row]))
+                for row in range(len(queries))]
+
+    def retrieve_batch(self, queries: list[str]) -> list[tuple[list, list, list]]:
+        """
+        Retrieve the most relevant chunks for a batch of queries. The similarities between all the queries and the
+        database are computed with a single matrix product.
+        Queries are embedded one by one, so that padding does not alter their embedding and the results are identical
+        to calling the retriever on each query.
+        :param queries: list of user queries
+        :return: list of (chunks, similarities, metadata) tuples, aligned with the input queries
+        """
+
+        start_time = time.time()
+        # commands are detected from the words of the queries, without the embedding model
+        results = [self._censored_result() if self.is_censored(query) else self._match_intent(query)
+                   for query in queries]
+        unresolved_positions = [position for position, result in enumerate(results) if result is None]
+
+        query_embeddings = {position: self._encode_query(queries[position]) for position in unresolved_positions}
+
+        # commands and out-of-domain queries skip the search, the others reuse the results of similar queries
+        for position, query_embedding in query_embeddings.items():
+            results[position] = self._match_intent(queries[position], query_embedding)
+            if results[position] is not None:
+                continue
+            if self.is_out_of_domain(query_embedding)[0]:
+                results[position] = self._out_of_domain_result()
+                continue
+            cache_entry, _ = self.semantic_cache.lookup(query_embedding)
+            if cache_entry is not None:
+                results[position] = self._copy_result(cache_entry.result)
+        uncached_positions = [position for position in unresolved_positions if results[position] is None]
+
+        if uncached_positions:
+            query_matrix = np.stack([query_embeddings[position] for position in uncached_positions])
+            uncached_results = self.retrieve_embeddings([queries[position] for position in uncached_positions],
+                                                        query_matrix)
+
+            for row, position in enumerate(uncached_positions):
+                results[position] = uncached_results[row]
+                self.semantic_cache.add(queries[position], query_matrix[row], self._copy_result(results[position]))
+
+        if self.verbose:
+            pretty_print(name="RAG batch", result_dictionary={
+                "Latency": f"{(time.time() - start_time):0.2f}s",
+                "Number of queries": len(queries),
+                "Query cache": self.query_cache.stats,
+                "Semantic cache": self.semantic_cache.stats,
+            })
+
+        return results
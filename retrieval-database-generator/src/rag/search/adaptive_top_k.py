@@ -0,0 +1,78 @@
+# Copyright 2025 NXP
+# NXP Proprietary.
+# This software is owned or controlled by NXP and may only be used strictly in
+# accordance with the applicable license terms. By expressly accepting such
+# terms or by downloading, installing, activating and/or otherwise using the
+# software, you are agreeing that you have read, and that you agree to comply
+# with and are bound by, such license terms. If you do not agree to be bound
+# by the applicable license terms, then you may not retain, install, activate
+# or otherwise use the software.
+
+import os
+from tokenizers import Tokenizer
+
+
+class TokenCounter:
+    """
+    Count the LLM tokens of the chunks with the tokenizer of the LLM (e.g. the Danube tokenizer.json). The tokenizers
+    library is used directly, so that neither transformers nor torch is imported. Counts are cached per chunk.
+    """
+
+    def __init__(self, tokenizer_path: str):
+        """
+        :param tokenizer_path: tokenizer.json file of the LLM, or the folder containing it
+        """
+
+        if os.path.isdir(tokenizer_path):
+            tokenizer_path = os.path.join(tokenizer_path, "tokenizer.json")
+        self._tokenizer = Tokenizer.from_file(tokenizer_path)
+        self._num_tokens = {}
+
+    def __call__(self, text: str) -> int:
+        """
+        :param text: chunk text
+        :return: number of tokens of the text (without special tokens)
+        """
+
+        num_tokens = self._num_tokens.get(text)
+        if num_tokens is None:
+            num_tokens = len(self._tokenizer.encode(text, add_special_tokens=False).ids)
+            self._num_tokens[text] = num_tokens
+        return num_tokens
+
+
+def get_adaptive_k(similarity_list: list[float],
+                   chunk_list: list[str],
+                   min_similarity: float = 0.,
+                   relative_similarity: float = 0.,
+                   token_budget: int = 0,
+                   count_tokens: TokenCounter = None) -> int:
+    """
+    Get the number of chunks worth adding to the prompt, among chunks sorted by decreasing similarity. A chunk is
+    dropped (with all the following ones) if its similarity is below `min_similarity`, below `relative_similarity`
+    times the best similarity, or if it does not fit in the token budget. The best chunk is always kept.
+    :param similarity_list: similarities of the chunks, in decreasing order
+    :param chunk_list: texts of the chunks
+    :param min_similarity: minimum similarity of a chunk (0 disables this cut-off)
+    :param relative_similarity: minimum similarity of a chunk relative to the best one, e.g. 0.8 (0 disables it)
+    :param token_budget: maximum number of tokens of the kept chunks (0 disables it)
+    :param count_tokens: token counter of the LLM (required by the token budget)
+    :return: number of chunks to keep
+    """
+
+    if not similarity_list:
+        return 0
+    threshold = -float("inf")
+    if min_similarity > 0:
+        threshold = min_similarity
+    if relative_similarity > 0:
+        threshold = max(threshold, relative_similarity * similarity_list[0])
+    num_tokens = count_tokens(chunk_list[0]) if token_budget > 0 else 0
+    for k in range(1, len(similarity_list)):
+        if similarity_list[k] < threshold:
+            return k
+        if token_budget > 0:
+            num_tokens += count_tokens(chunk_list[k])
+            if num_tokens > token_budget:
+                return k
+    return len(similarity_list)
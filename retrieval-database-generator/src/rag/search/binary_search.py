@@ -0,0 +1,103 @@
+# Copyright 2025 NXP
+# NXP Proprietary.
+# This software is owned or controlled by NXP and may only be used strictly in
+# accordance with the applicable license terms. By expressly accepting such
+# terms or by downloading, installing, activating and/or otherwise using the
+# software, you are agreeing that you have read, and that you agree to comply
+# with and are bound by, such license terms. If you do not agree to be bound
+# by the applicable license terms, then you may not retain, install, activate
+# or otherwise use the software.
+
+import numpy as np
+from rag.search.dense_search import DenseSearchEngine, as_query_matrix, l2_normalize, top_k
+
+# Number of set bits in each byte value (used when np.bitwise_count is not available, i.e. NumPy < 2.0)
+_POPCOUNT_TABLE = np.unpackbits(np.arange(256, dtype=np.uint8)[:, None], axis=1).sum(axis=1).astype(np.uint8)
+
+
+def compute_binary_signatures(embeddings) -> np.ndarray:
+    """
+    Compute the 1-bit sign signature of each embedding, packed in 64-bit words.
+    :param embeddings: embeddings of shape (n, dim) or (dim,)
+    :return: uint64 signatures of shape (n, ceil(dim / 64))
+    """
+
+    embeddings = as_query_matrix(embeddings)
+    num_words = -(-embeddings.shape[1] // 64)
+    bits = np.zeros((embeddings.shape[0], num_words * 64), dtype=bool)
+    bits[:, :embeddings.shape[1]] = embeddings > 0
+    return np.packbits(bits, axis=1, bitorder="little").view(np.uint64)
+
+
+def popcount(words: np.ndarray) -> np.ndarray:
+    """
+    :param words: array of unsigned integers
+    :return: number of set bits of each element (same shape as the input)
+    """
+
+    if hasattr(np, "bitwise_count"):
+        return np.bitwise_count(words)
+    bytes_view = np.ascontiguousarray(words).view(np.uint8).reshape(words.shape + (words.dtype.itemsize,))
+    return _POPCOUNT_TABLE[bytes_view].sum(axis=-1, dtype=np.uint16)
+
+
+def hamming_distances(signatures: np.ndarray, query_signature: np.ndarray) -> np.ndarray:
+    """
+    :param signatures: database signatures of shape (n, num_words)
+    :param query_signature: query signature of shape (num_words,)
+    :return: Hamming distance between the query and every database signature, shape (n,)
+    """
+
+    return popcount(np.bitwise_xor(signatures, query_signature)).sum(axis=1, dtype=np.uint16)
+
+
+class BinarySearchEngine(DenseSearchEngine):
+    """
+    Two-stage search engine: a Hamming-distance prefilter over the packed sign signatures selects `num_candidates`
+    candidates, and the exact cosine similarity is only computed on these candidates.
+    """
+
+    def __init__(self, embeddings, num_candidates: int, binary_signatures: np.ndarray = None,
+                 normalize: bool = True):
+        """
+        :param embeddings: database embeddings of shape (num_embeddings, dim)
+        :param num_candidates: number of candidates kept by the Hamming prefilter
+        :param binary_signatures: signatures computed by `compute_binary_signatures` (computed here if None)
+        :param normalize: L2-normalize the embeddings (can be skipped if they are already normalized)
+        """
+
+        super().__init__(embeddings, normalize=normalize)
+        if binary_signatures is None:
+            binary_signatures = compute_binary_signatures(self.embeddings)
+        if len(binary_signatures) != len(self):
+            raise ValueError(f"The database contains {len(binary_signatures)} binary signatures for {len(self)} "
+                             f"embeddings. Please re-generate the database.")
+        self.binary_signatures = binary_signatures
+        self.num_candidates = num_candidates
+
+    def search(self, query_embeddings, k: int) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Find (approximately) the k most similar database embeddings for each query.
+        :param query_embeddings: query embedding(s) of shape (dim,) or (num_queries, dim)
+        :param k: number of embeddings to retrieve per query
+        :return: similarities and indexes of shape (k,) for a single query or (num_queries, k) for a batch
+        """
+
+        queries = l2_normalize(as_query_matrix(query_embeddings))
+        query_signatures = compute_binary_signatures(queries)
+        k = min(k, len(self))
+        num_candidates = max(k, self.num_candidates)
+        similarities = np.empty((queries.shape[0], k), dtype=np.float32)
+        indices = np.empty((queries.shape[0], k), dtype=np.int64)
+
+        for row, (query, query_signature) in enumerate(zip(queries, query_signatures)):
+            distances = hamming_distances(self.binary_signatures, query_signature)
+            # Closest signatures = highest negative distances
+            _, candidates = top_k(-distances.astype(np.int32), num_candidates)
+            candidates = np.sort(candidates)
+            candidate_similarities, candidate_positions = top_k(self.embeddings[candidates] @ query, k)
+            similarities[row], indices[row] = candidate_similarities, candidates[candidate_positions]
+
+        if np.ndim(query_embeddings) == 1:
+            return similarities[0], indices[0]
+        return similarities, indices
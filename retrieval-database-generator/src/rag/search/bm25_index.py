@@ -0,0 +1,208 @@
+# Copyright 2025 NXP
+# NXP Proprietary.
+# This software is owned or controlled by NXP and may only be used strictly in
+# accordance with the applicable license terms. By expressly accepting such
+# terms or by downloading, installing, activating and/or otherwise using the
+# software, you are agreeing that you have read, and that you agree to comply
+# with and are bound by, such license terms. If you do not agree to be bound
+# by the applicable license terms, then you may not retain, install, activate
+# or otherwise use the software.
+
+import os
+import re
+import numpy as np
+from collections import Counter
+from rag.search.dense_search import top_k
+from rag.database.columnar_database import DATABASE_FINGERPRINT_KEY, get_database_entries, get_database_fingerprint
+
+BM25_INDEX_EXTENSION = ".bm25.npz"
+
+# Words, numbers and compound identifiers such as part numbers or error codes (e.g. "imx8mp-evk", "0x1f", "e.42")
+_TOKEN_PATTERN = re.compile(r"\w+(?:[-./:]\w+)*")
+_SUB_TOKEN_PATTERN = re.compile(r"\w+")
+
+
+def get_bm25_index_path(rag_db_path: str) -> str:
+    """
+    :param rag_db_path: path of the RAG database
+    :return: path of the BM25 index saved next to the database (e.g. rag_database.pkl -> rag_database.bm25.npz)
+    """
+
+    return os.path.splitext(rag_db_path)[0] + BM25_INDEX_EXTENSION
+
+
+def get_lexical_documents(database: dict) -> list[str]:
+    """
+    :param database: dictionary as created by `generate_embeddings`
+    :return: text indexed by the BM25 index for each embedding (the chunk, and the question of HiRAG chunks), in the
+    Retriever order
+    """
+
+    return [f"{entry['question']} {chunk}" if "question" in entry else chunk
+            for entry in get_database_entries(database) for chunk in entry["chunks"]]
+
+
+def tokenize(text: str) -> list[str]:
+    """
+    Split a text in lower-case terms. Compound identifiers are kept as a whole (so that exact part numbers and error
+    codes match) and also split in their parts.
+    :param text: input text
+    :return: list of terms
+    """
+
+    terms = []
+    for token in _TOKEN_PATTERN.findall(text.lower()):
+        terms.append(token)
+        sub_tokens = _SUB_TOKEN_PATTERN.findall(token)
+        if len(sub_tokens) > 1:
+            terms.extend(sub_tokens)
+    return terms
+
+
+def build_bm25_index(documents: list[str], k1: float = 1.2, b: float = 0.75) -> dict:
+    """
+    Build a BM25 inverted index. The BM25 weight of each (term, document) pair is computed at build time, so that the
+    score of a query is only a sum of posting weights.
+    :param documents: text of each document, in the same order as the embeddings in the Retriever
+    :param k1: term frequency saturation
+    :param b: document length normalization
+    :return: dictionary of arrays describing the index (see `save_bm25_index`)
+    """
+
+    term_counts = [Counter(tokenize(document)) for document in documents]
+    document_lengths = np.array([sum(counts.values()) for counts in term_counts], dtype=np.float32)
+    average_length = max(float(document_lengths.mean()), 1.) if len(documents) else 1.
+
+    terms = sorted({term for counts in term_counts for term in counts})
+    term_ids = {term: term_id for term_id, term in enumerate(terms)}
+    posting_terms = np.array([term_ids[term] for counts in term_counts for term in counts], dtype=np.int64)
+    posting_documents = np.repeat(np.arange(len(documents), dtype=np.int32), [len(counts) for counts in term_counts])
+    term_frequencies = np.array([count for counts in term_counts for count in counts.values()], dtype=np.float32)
+
+    # Sort the postings by term (documents stay sorted inside each posting list)
+    order = np.argsort(posting_terms, kind="stable")
+    posting_terms, posting_documents, term_frequencies = (posting_terms[order], posting_documents[order],
+                                                          term_frequencies[order])
+    document_frequencies = np.bincount(posting_terms, minlength=len(terms))
+    term_offsets = np.zeros(len(terms) + 1, dtype=np.int64)
+    term_offsets[1:] = np.cumsum(document_frequencies)
+
+    idf = np.log(1 + (len(documents) - document_frequencies + 0.5) / (document_frequencies + 0.5))
+    length_norm = k1 * (1 - b + b * document_lengths[posting_documents] / average_length)
+    posting_weights = idf[posting_terms] * term_frequencies * (k1 + 1) / (term_frequencies + length_norm)
+
+    return {
+        "terms": np.array(terms, dtype=str),
+        "term_offsets": term_offsets,
+        "posting_documents": posting_documents,
+        "posting_weights": posting_weights.astype(np.float32),
+        "num_documents": np.int64(len(documents)),
+    }
+
+
+def save_bm25_index(destination_path: str, bm25_index: dict, rag_db_path: str) -> None:
+    """
+    Save a BM25 index, with the fingerprint of the database it was built for.
+    :param destination_path: path of the created index file
+    :param bm25_index: index built by `build_bm25_index`
+    :param rag_db_path: path of the saved RAG database the index refers to
+    :return: None
+    """
+
+    with open(destination_path, "wb") as f:
+        np.savez(f, **bm25_index, **{DATABASE_FINGERPRINT_KEY: np.array(get_database_fingerprint(rag_db_path))})
+
+
+def load_bm25_index(bm25_index_path: str) -> dict:
+    """
+    Load a BM25 index.
+    :param bm25_index_path: path of the index file
+    :return: dictionary of arrays describing the index
+    """
+
+    with np.load(bm25_index_path) as data:
+        return {key: data[key] for key in data.files}
+
+
+class BM25Index:
+    """
+    Lexical search over a BM25 inverted index: only the posting lists of the query terms are read, so a query costs
+    the number of postings of its terms instead of a scan of the whole database.
+    """
+
+    def __init__(self, bm25_index: dict, num_documents: int):
+        """
+        :param bm25_index: index built by `build_bm25_index`
+        :param num_documents: number of embeddings in the database (to check that the index is up to date)
+        """
+
+        if int(bm25_index["num_documents"]) != num_documents:
+            raise ValueError(f"The BM25 index was built for {int(bm25_index['num_documents'])} chunks but the "
+                             f"database contains {num_documents} embeddings. Please re-generate the index.")
+        self.num_documents = num_documents
+        self.terms = bm25_index["terms"]
+        self.term_offsets = bm25_index["term_offsets"]
+        self.posting_documents = bm25_index["posting_documents"]
+        self.posting_weights = bm25_index["posting_weights"]
+
+    def __len__(self) -> int:
+        return len(self.term_offsets) - 1
+
+    def score(self, query: str) -> tuple[np.ndarray, np.ndarray]:
+        """
+        :param query: user query
+        :return: documents containing at least one query term and their BM25 scores
+        """
+
+        query_terms = Counter(tokenize(query))
+        if not query_terms or len(self) == 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+
+        terms = np.array(list(query_terms.keys()), dtype=str)
+        positions = np.minimum(np.searchsorted(self.terms, terms), len(self) - 1)
+        found = self.terms[positions] == terms
+        term_ids, counts = positions[found], np.array(list(query_terms.values()))[found]
+        if len(term_ids) == 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+
+        postings = [slice(self.term_offsets[term_id], self.term_offsets[term_id + 1]) for term_id in term_ids]
+        documents = np.concatenate([self.posting_documents[posting] for posting in postings])
+        weights = np.concatenate([self.posting_weights[posting] * count for posting, count in zip(postings, counts)])
+        if len(documents) > self.num_documents // 16:
+            # Long posting lists: sum the weights in a dense score array
+            scores = np.bincount(documents, weights=weights, minlength=self.num_documents)
+            documents = np.flatnonzero(scores)
+            return documents, scores[documents].astype(np.float32)
+        # Short posting lists: sum the weights of each document over the documents of the posting lists only
+        documents, inverse = np.unique(documents, return_inverse=True)
+        return documents.astype(np.int64), np.bincount(inverse, weights=weights).astype(np.float32)
+
+    def search(self, query: str, k: int) -> tuple[np.ndarray, np.ndarray]:
+        """
+        :param query: user query
+        :param k: maximum number of documents to retrieve
+        :return: BM25 scores and indexes of the (at most) k best documents, sorted by decreasing score
+        """
+
+        documents, scores = self.score(query)
+        scores, positions = top_k(scores, k)
+        return scores, documents[positions]
+
+
+def reciprocal_rank_fusion(rankings: list[np.ndarray], rrf_k: int = 60) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Fuse several rankings: each document gets the sum of 1 / (rrf_k + rank) over the rankings it appears in.
+    :param rankings: document indexes of each ranking, sorted from the best document
+    :param rrf_k: constant damping the weight of the first ranks
+    :return: fused scores and document indexes, sorted by decreasing fused score
+    """
+
+    documents = np.concatenate(rankings)
+    rrf_scores = np.concatenate([1. / (rrf_k + 1 + np.arange(len(ranking))) for ranking in rankings])
+    documents, inverse = np.unique(documents, return_inverse=True)
+    fused_scores = np.bincount(inverse, weights=rrf_scores)
+    # Sort by decreasing fused score, ties are broken by the order of the first ranking in which the documents appear
+    first_positions = np.full(len(documents), len(inverse))
+    np.minimum.at(first_positions, inverse, np.arange(len(inverse)))
+    order = np.lexsort((first_positions, -fused_scores))
+    return fused_scores[order], documents[order].astype(np.int64)
@@ -0,0 +1,109 @@
+# Copyright 2025 NXP
+# NXP Proprietary.
+# This software is owned or controlled by NXP and may only be used strictly in
+# accordance with the applicable license terms. By expressly accepting such
+# terms or by downloading, installing, activating and/or otherwise using the
+# software, you are agreeing that you have read, and that you agree to comply
+# with and are bound by, such license terms. If you do not agree to be bound
+# by the applicable license terms, then you may not retain, install, activate
+# or otherwise use the software.
+
+import numpy as np
+
+
+def l2_normalize(array: np.ndarray) -> np.ndarray:
+    """
+    L2-normalize the rows of an array, so that an inner product between two rows is their cosine similarity.
+    :param array: array of shape (..., dim)
+    :return: float32 array of the same shape with unit-norm rows
+    """
+
+    array = np.asarray(array, dtype=np.float32)
+    norms = np.linalg.norm(array, axis=-1, keepdims=True)
+    return array / np.maximum(norms, 1e-12)
+
+
+def as_query_matrix(query_embeddings) -> np.ndarray:
+    """
+    Convert one or several query embeddings (numpy array, torch tensor or list) to a contiguous float32 matrix.
+    :param query_embeddings: embedding(s) of shape (dim,) or (num_queries, dim)
+    :return: float32 matrix of shape (num_queries, dim)
+    """
+
+    queries = np.asarray(query_embeddings, dtype=np.float32)
+    return np.ascontiguousarray(queries.reshape(-1, queries.shape[-1]))
+
+
+def top_k(scores: np.ndarray, k: int) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Get the k highest scores (sorted in descending order) and their indexes along the last axis.
+    A partial sort (argpartition) is used, so the cost is linear in the number of scores instead of N*log(N).
+    :param scores: array of shape (n,) or (num_queries, n)
+    :param k: number of elements to keep (clipped to n)
+    :return: the k highest scores and their indexes, both of shape (k,) or (num_queries, k)
+    """
+
+    k = min(k, scores.shape[-1])
+    if k <= 0:
+        empty_shape = scores.shape[:-1] + (0,)
+        return np.empty(empty_shape, dtype=scores.dtype), np.empty(empty_shape, dtype=np.int64)
+
+    if k < scores.shape[-1]:
+        candidate_indices = np.argpartition(scores, -k, axis=-1)[..., -k:]
+    else:
+        candidate_indices = np.broadcast_to(np.arange(k), scores.shape).copy()
+    candidate_scores = np.take_along_axis(scores, candidate_indices, axis=-1)
+
+    order = np.argsort(-candidate_scores, axis=-1, kind="stable")
+    top_indices = np.take_along_axis(candidate_indices, order, axis=-1).astype(np.int64)
+    top_scores = np.take_along_axis(candidate_scores, order, axis=-1)
+    return top_scores, top_indices
+
+
+class DenseSearchEngine:
+    """
+    Exhaustive search engine over a pre-normalized, contiguous float32 embedding matrix.
+    The cosine similarity between the queries and the whole database is computed with a single matrix product
+    (GEMV for one query, GEMM for a batch of queries).
+    """
+
+    def __init__(self, embeddings, normalize: bool = True):
+        """
+        :param embeddings: database embeddings of shape (num_embeddings, dim)
+        :param normalize: L2-normalize the embeddings (can be skipped if they are already normalized)
+        """
+
+        embeddings = as_query_matrix(embeddings)
+        if normalize:
+            embeddings = l2_normalize(embeddings)
+        self.embeddings = np.ascontiguousarray(embeddings, dtype=np.float32)
+
+    def __len__(self) -> int:
+        return self.embeddings.shape[0]
+
+    @property
+    def dim(self) -> int:
+        return self.embeddings.shape[1]
+
+    def score(self, query_embeddings) -> np.ndarray:
+        """
+        Compute the cosine similarity between the queries and every database embedding.
+        :param query_embeddings: query embedding(s) of shape (dim,) or (num_queries, dim)
+        :return: similarities of shape (num_queries, num_embeddings)
+        """
+
+        queries = l2_normalize(as_query_matrix(query_embeddings))
+        return queries @ self.embeddings.T
+
+    def search(self, query_embeddings, k: int) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Find the k most similar database embeddings for each query.
+        :param query_embeddings: query embedding(s) of shape (dim,) or (num_queries, dim)
+        :param k: number of embeddings to retrieve per query
+        :return: similarities and indexes of shape (k,) for a single query or (num_queries, k) for a batch
+        """
+
+        similarities, indices = top_k(self.score(query_embeddings), k)
+        if np.ndim(query_embeddings) == 1:
+            return similarities[0], indices[0]
+        return similarities, indices
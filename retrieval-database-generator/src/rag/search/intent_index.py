@@ -0,0 +1,153 @@
+# Copyright 2025 NXP
+# NXP Proprietary.
+# This software is owned or controlled by NXP and may only be used strictly in
+# accordance with the applicable license terms. By expressly accepting such
+# terms or by downloading, installing, activating and/or otherwise using the
+# software, you are agreeing that you have read, and that you agree to comply
+# with and are bound by, such license terms. If you do not agree to be bound
+# by the applicable license terms, then you may not retain, install, activate
+# or otherwise use the software.
+
+import os
+import heapq
+import numpy as np
+from collections import Counter, defaultdict
+from rag.phrase_matcher import split_words
+from rag.search.dense_search import l2_normalize, top_k
+from rag.database.columnar_database import get_database_entries
+
+INTENT_INDEX_EXTENSION = ".intents.json"
+
+
+def get_intent_index_path(rag_db_path: str) -> str:
+    """
+    :param rag_db_path: path of the RAG database
+    :return: path of the intent index saved next to a pickle database (e.g. rag_database.pkl ->
+    rag_database.intents.json)
+    """
+
+    return os.path.splitext(rag_db_path)[0] + INTENT_INDEX_EXTENSION
+
+
+def get_ngrams(text: str) -> set[str]:
+    """
+    :param text: input text
+    :return: case-folded words and pairs of consecutive words of the text
+    """
+
+    words = split_words(text)
+    return set(words) | {f"{first} {second}" for first, second in zip(words, words[1:])}
+
+
+def build_intent_index(database: dict) -> dict | None:
+    """
+    Build the index of the command phrases: every chunk of an entry with an "intent" field is a phrase of this intent.
+    :param database: dictionary as created by `generate_embeddings`
+    :return: JSON-serializable dictionary with the phrases, their intent and their embedding row in the Retriever
+    order (None if the database has no intent)
+    """
+
+    phrases, intents, rows = [], [], []
+    row = 0
+    for entry in get_database_entries(database):
+        if "intent" in entry:
+            for offset, chunk in enumerate(entry["chunks"]):
+                phrases.append(chunk)
+                intents.append(str(entry["intent"]))
+                rows.append(row + offset)
+        row += len(entry["chunks"])
+    if not phrases:
+        return None
+    return {"phrases": phrases, "intents": intents, "rows": rows}
+
+
+class IntentMatcher:
+    """
+    Resolve voice commands without the embedding model: the query is compared to the command phrases with the Dice
+    coefficient of their word n-grams (words and pairs of words), computed with a small inverted index. An optional
+    second stage compares the query embedding to the phrase embeddings, which is much cheaper than a search of the
+    whole database. Queries matching no phrase confidently fall through to the normal retrieval.
+    """
+
+    def __init__(self,
+                 intent_index: dict,
+                 embeddings: np.ndarray,
+                 threshold: float,
+                 embedding_threshold: float):
+        """
+        :param intent_index: index built by `build_intent_index`
+        :param embeddings: database embeddings (the phrase embeddings are gathered from their rows)
+        :param threshold: minimum n-gram Dice coefficient between the query and a phrase
+        :param embedding_threshold: minimum cosine similarity between the query and a phrase embedding (above 1 to
+        disable the second stage)
+        """
+
+        self.intents = list(intent_index["intents"])
+        self.rows = np.array(intent_index["rows"], dtype=np.int64)
+        self.threshold = threshold
+        self.embedding_threshold = embedding_threshold
+
+        # Command sets are small: plain Python structures are faster than numpy calls here
+        phrase_ngrams = [get_ngrams(phrase) for phrase in intent_index["phrases"]]
+        self.num_ngrams = [len(ngrams) for ngrams in phrase_ngrams]
+        postings = defaultdict(list)
+        for phrase_id, ngrams in enumerate(phrase_ngrams):
+            for ngram in ngrams:
+                postings[ngram].append(phrase_id)
+        self.postings = {ngram: tuple(phrase_ids) for ngram, phrase_ids in postings.items()}
+
+        self.embeddings = None
+        if embedding_threshold <= 1.:
+            self.embeddings = l2_normalize(np.asarray(embeddings[self.rows]))
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+    def _select(self, scores: np.ndarray, threshold: float, k: int) -> tuple[np.ndarray, np.ndarray] | None:
+        """
+        :param scores: score of each phrase
+        :param threshold: minimum score of the best phrase
+        :param k: maximum number of phrases returned
+        :return: database rows and scores of the k best phrases, None if the best phrase is below the threshold or if
+        a phrase of another intent has the same score
+        """
+
+        best_scores, best_phrases = top_k(scores, k)
+        if len(best_scores) == 0 or best_scores[0] < threshold:
+            return None
+        best_intent = self.intents[best_phrases[0]]
+        if np.any((scores == best_scores[0]) & (np.array(self.intents) != best_intent)):
+            return None
+        return self.rows[best_phrases], best_scores
+
+    def match(self, query: str, k: int) -> tuple[np.ndarray, np.ndarray] | None:
+        """
+        :param query: user query
+        :param k: maximum number of phrases returned
+        :return: database rows and n-gram scores of the best phrases (None if no intent is confidently detected)
+        """
+
+        query_ngrams = get_ngrams(query)
+        counts = Counter(phrase_id for ngram in query_ngrams for phrase_id in self.postings.get(ngram, ()))
+        if not counts:
+            return None
+        scores = {phrase_id: 2 * count / (len(query_ngrams) + self.num_ngrams[phrase_id])
+                  for phrase_id, count in counts.items()}
+        best_phrases = heapq.nlargest(k, scores, key=scores.get)
+        best_score, best_intent = scores[best_phrases[0]], self.intents[best_phrases[0]]
+        if best_score < self.threshold or any(score == best_score and self.intents[phrase_id] != best_intent
+                                              for phrase_id, score in scores.items()):
+            return None
+        return self.rows[best_phrases], np.array([scores[phrase_id] for phrase_id in best_phrases], dtype=np.float32)
+
+    def match_embedding(self, query_embedding: np.ndarray, k: int) -> tuple[np.ndarray, np.ndarray] | None:
+        """
+        :param query_embedding: embedding of the query, shape (dim,)
+        :param k: maximum number of phrases returned
+        :return: database rows and cosine similarities of the best phrases (None if no intent is confidently detected)
+        """
+
+        if self.embeddings is None:
+            return None
+        similarities = self.embeddings @ l2_normalize(query_embedding).reshape(-1)
+        return self._select(similarities, self.embedding_threshold, k)
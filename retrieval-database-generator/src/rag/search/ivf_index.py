@@ -0,0 +1,202 @@
+# Copyright 2025 NXP
+# NXP Proprietary.
+# This software is owned or controlled by NXP and may only be used strictly in
+# accordance with the applicable license terms. By expressly accepting such
+# terms or by downloading, installing, activating and/or otherwise using the
+# software, you are agreeing that you have read, and that you agree to comply
+# with and are bound by, such license terms. If you do not agree to be bound
+# by the applicable license terms, then you may not retain, install, activate
+# or otherwise use the software.
+
+import os
+import numpy as np
+from rag.search.dense_search import DenseSearchEngine, as_query_matrix, l2_normalize, top_k
+from rag.database.columnar_database import DATABASE_FINGERPRINT_KEY, get_database_fingerprint
+
+IVF_INDEX_EXTENSION = ".ivf.npz"
+
+
+def get_ivf_index_path(rag_db_path: str) -> str:
+    """
+    :param rag_db_path: path of the RAG database
+    :return: path of the IVF index saved next to the database (e.g. rag_database.pkl -> rag_database.ivf.npz)
+    """
+
+    return os.path.splitext(rag_db_path)[0] + IVF_INDEX_EXTENSION
+
+
+def _assign(embeddings: np.ndarray, centroids: np.ndarray, batch_size: int = 65536) -> np.ndarray:
+    """
+    Assign each embedding to its most similar centroid.
+    :param embeddings: normalized embeddings of shape (n, dim)
+    :param centroids: normalized centroids of shape (num_lists, dim)
+    :param batch_size: number of embeddings scored at once (bounds the memory used by the similarity matrix)
+    :return: list id of each embedding, shape (n,)
+    """
+
+    assignments = np.empty(embeddings.shape[0], dtype=np.int64)
+    for start in range(0, embeddings.shape[0], batch_size):
+        batch = embeddings[start:start + batch_size]
+        assignments[start:start + batch_size] = np.argmax(batch @ centroids.T, axis=1)
+    return assignments
+
+
+def spherical_kmeans(embeddings: np.ndarray,
+                     num_clusters: int,
+                     num_iterations: int = 20,
+                     max_training_points_per_cluster: int = 64,
+                     seed: int = 0) -> np.ndarray:
+    """
+    Cluster normalized embeddings with a spherical k-means (cosine similarity, normalized centroids).
+    :param embeddings: normalized embeddings of shape (n, dim)
+    :param num_clusters: number of clusters (at most n)
+    :param num_iterations: number of k-means iterations
+    :param max_training_points_per_cluster: the k-means is trained on at most num_clusters * this value embeddings
+    :param seed: random seed used for the training sample and the centroid initialization
+    :return: normalized centroids of shape (num_clusters, dim)
+    """
+
+    num_embeddings = embeddings.shape[0]
+    rng = np.random.default_rng(seed)
+    num_training_points = min(num_embeddings, num_clusters * max_training_points_per_cluster)
+    training_set = embeddings[np.sort(rng.choice(num_embeddings, num_training_points, replace=False))]
+    centroids = training_set[rng.choice(num_training_points, num_clusters, replace=False)].copy()
+
+    for _ in range(num_iterations):
+        assignments = _assign(training_set, centroids)
+        counts = np.bincount(assignments, minlength=num_clusters)
+        # Sum the points of each cluster with a single segmented reduction over the points sorted by cluster
+        order = np.argsort(assignments, kind="stable")
+        non_empty_clusters = np.flatnonzero(counts)
+        starts = np.concatenate(([0], np.cumsum(counts)[:-1]))[non_empty_clusters]
+        sums = np.zeros_like(centroids)
+        sums[non_empty_clusters] = np.add.reduceat(training_set[order], starts, axis=0)
+        # Re-seed empty clusters with random training points
+        empty_clusters = np.flatnonzero(counts == 0)
+        sums[empty_clusters] = training_set[rng.choice(num_training_points, len(empty_clusters))]
+        centroids = l2_normalize(sums)
+    return centroids
+
+
+def build_ivf_index(embeddings,
+                    num_lists: int = 0,
+                    num_iterations: int = 20,
+                    max_training_points_per_list: int = 64,
+                    seed: int = 0) -> dict:
+    """
+    Build an inverted file (IVF) index: the embeddings are clustered with a spherical k-means and each embedding is
+    stored in the inverted list of its closest centroid.
+    :param embeddings: database embeddings of shape (n, dim), in the same order as in the Retriever
+    :param num_lists: number of inverted lists (0 = 4 * sqrt(n))
+    :param num_iterations: number of k-means iterations
+    :param max_training_points_per_list: the k-means is trained on at most num_lists * this value embeddings
+    :param seed: random seed used for the training sample and the centroid initialization
+    :return: dictionary of arrays describing the index (see `save_ivf_index`)
+    """
+
+    embeddings = l2_normalize(as_query_matrix(embeddings))
+    num_embeddings = embeddings.shape[0]
+    if num_lists <= 0:
+        num_lists = int(4 * np.sqrt(num_embeddings))
+    num_lists = max(1, min(num_lists, num_embeddings))
+    centroids = spherical_kmeans(embeddings, num_lists, num_iterations=num_iterations,
+                                 max_training_points_per_cluster=max_training_points_per_list, seed=seed)
+
+    assignments = _assign(embeddings, centroids)
+    list_indices = np.argsort(assignments, kind="stable")
+    list_offsets = np.zeros(num_lists + 1, dtype=np.int64)
+    list_offsets[1:] = np.cumsum(np.bincount(assignments, minlength=num_lists))
+
+    return {
+        "centroids": centroids.astype(np.float32),
+        "list_offsets": list_offsets,
+        "list_indices": list_indices.astype(np.int64),
+        "num_embeddings": np.int64(num_embeddings),
+    }
+
+
+def save_ivf_index(destination_path: str, ivf_index: dict, rag_db_path: str) -> None:
+    """
+    Save an IVF index, with the fingerprint of the database it was built for.
+    :param destination_path: path of the created index file
+    :param ivf_index: index built by `build_ivf_index`
+    :param rag_db_path: path of the saved RAG database the index refers to
+    :return: None
+    """
+
+    with open(destination_path, "wb") as f:
+        np.savez(f, **ivf_index, **{DATABASE_FINGERPRINT_KEY: np.array(get_database_fingerprint(rag_db_path))})
+
+
+def load_ivf_index(ivf_index_path: str) -> dict:
+    """
+    Load an IVF index.
+    :param ivf_index_path: path of the index file
+    :return: dictionary of arrays describing the index
+    """
+
+    with np.load(ivf_index_path) as data:
+        return {key: data[key] for key in data.files}
+
+
+class IVFSearchEngine(DenseSearchEngine):
+    """
+    Approximate search engine: only the `nprobe` inverted lists whose centroids are the most similar to the query
+    are scanned. `nprobe` is the recall/latency knob (nprobe = num_lists is equivalent to an exact scan).
+    """
+
+    def __init__(self, embeddings, ivf_index: dict, nprobe: int, normalize: bool = True):
+        """
+        :param embeddings: database embeddings of shape (num_embeddings, dim)
+        :param ivf_index: index built by `build_ivf_index` on the same embeddings
+        :param nprobe: number of inverted lists scanned per query
+        :param normalize: L2-normalize the embeddings (can be skipped if they are already normalized)
+        """
+
+        super().__init__(embeddings, normalize=normalize)
+        if int(ivf_index["num_embeddings"]) != len(self):
+            raise ValueError(f"The IVF index was built for {int(ivf_index['num_embeddings'])} embeddings but the "
+                             f"database contains {len(self)} embeddings. Please re-generate the index.")
+        self.centroids = np.ascontiguousarray(ivf_index["centroids"], dtype=np.float32)
+        self.list_offsets = ivf_index["list_offsets"]
+        self.list_indices = ivf_index["list_indices"]
+        self.nprobe = max(1, min(nprobe, self.num_lists))
+
+    @property
+    def num_lists(self) -> int:
+        return self.centroids.shape[0]
+
+    def _candidates(self, query: np.ndarray) -> np.ndarray:
+        """
+        :param query: normalized query embedding of shape (dim,)
+        :return: database indexes stored in the `nprobe` closest inverted lists
+        """
+
+        _, probed_lists = top_k(self.centroids @ query, self.nprobe)
+        return np.concatenate([self.list_indices[self.list_offsets[i]:self.list_offsets[i + 1]]
+                               for i in probed_lists])
+
+    def search(self, query_embeddings, k: int) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Find (approximately) the k most similar database embeddings for each query.
+        :param query_embeddings: query embedding(s) of shape (dim,) or (num_queries, dim)
+        :param k: number of embeddings to retrieve per query
+        :return: similarities and indexes of shape (k,) for a single query or (num_queries, k) for a batch
+        """
+
+        queries = l2_normalize(as_query_matrix(query_embeddings))
+        k = min(k, len(self))
+        similarities = np.empty((queries.shape[0], k), dtype=np.float32)
+        indices = np.empty((queries.shape[0], k), dtype=np.int64)
+
+        for row, query in enumerate(queries):
+            candidates = self._candidates(query)
+            if len(candidates) < k:
+                # Not enough candidates in the probed lists: fall back to the exact scan for this query
+                candidates = np.arange(len(self))
+            candidate_similarities, candidate_positions = top_k(self.embeddings[candidates] @ query, k)
+            similarities[row], indices[row] = candidate_similarities, candidates[candidate_positions]
+
+        if np.ndim(query_embeddings) == 1:
+            return similarities[0], indices[0]
+        return similarities, indices
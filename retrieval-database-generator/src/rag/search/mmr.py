@@ -0,0 +1,58 @@
+# Copyright 2025 NXP
+# NXP Proprietary.
+# This software is owned or controlled by NXP and may only be used strictly in
+# accordance with the applicable license terms. By expressly accepting such
+# terms or by downloading, installing, activating and/or otherwise using the
+# software, you are agreeing that you have read, and that you agree to comply
+# with and are bound by, such license terms. If you do not agree to be bound
+# by the applicable license terms, then you may not retain, install, activate
+# or otherwise use the software.
+
+import numpy as np
+
+
+def maximal_marginal_relevance(relevance: np.ndarray,
+                               embeddings: np.ndarray,
+                               k: int,
+                               mmr_lambda: float,
+                               duplicate_threshold: float = 0.) -> np.ndarray:
+    """
+    Select k diverse candidates with maximal marginal relevance (MMR): each step selects the candidate maximizing
+    mmr_lambda * relevance - (1 - mmr_lambda) * (highest cosine similarity with the already selected candidates).
+    Candidates whose similarity with a selected candidate reaches the duplicate threshold are skipped, unless only
+    near-duplicates are left. The steps are vectorized over a batch of queries.
+    :param relevance: relevance of the candidates, shape (n,) or (num_queries, n)
+    :param embeddings: L2-normalized embeddings of the candidates, shape (n, dim) or (num_queries, n, dim)
+    :param k: number of candidates to select (clipped to n)
+    :param mmr_lambda: trade-off between relevance (1) and diversity (0)
+    :param duplicate_threshold: cosine similarity above which a candidate is a near-duplicate (0 disables it)
+    :return: positions of the selected candidates, sorted by decreasing relevance, shape (k,) or (num_queries, k)
+    """
+
+    relevance_matrix = np.atleast_2d(relevance)
+    embeddings = embeddings.reshape(relevance_matrix.shape + embeddings.shape[-1:])
+    num_queries, num_candidates = relevance_matrix.shape
+    k = min(k, num_candidates)
+
+    # pairwise similarities of the candidates of each query, shape (num_queries, n, n)
+    pairwise_similarities = embeddings @ embeddings.transpose(0, 2, 1)
+    rows = np.arange(num_queries)
+    selection = np.empty((num_queries, k), dtype=np.int64)
+    is_selected = np.zeros((num_queries, num_candidates), dtype=bool)
+    redundancy = np.full((num_queries, num_candidates), -np.inf, dtype=np.float32)
+
+    for step in range(k):
+        scores = relevance_matrix.copy() if step == 0 else mmr_lambda * relevance_matrix - (1 - mmr_lambda) * redundancy
+        scores[is_selected] = -np.inf
+        if duplicate_threshold > 0 and step > 0:
+            distinct_scores = np.where(redundancy >= duplicate_threshold, -np.inf, scores)
+            has_distinct = np.isfinite(distinct_scores).any(axis=-1, keepdims=True)
+            scores = np.where(has_distinct, distinct_scores, scores)
+        best_positions = np.argmax(scores, axis=-1)
+        selection[:, step] = best_positions
+        is_selected[rows, best_positions] = True
+        redundancy = np.maximum(redundancy, pairwise_similarities[rows, best_positions])
+
+    order = np.argsort(-np.take_along_axis(relevance_matrix, selection, axis=-1), axis=-1, kind="stable")
+    selection = np.take_along_axis(selection, order, axis=-1)
+    return selection.reshape(np.shape(relevance)[:-1] + (k,))
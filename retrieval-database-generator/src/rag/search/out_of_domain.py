@@ -0,0 +1,182 @@
+# Copyright 2025 NXP
+# NXP Proprietary.
+# This software is owned or controlled by NXP and may only be used strictly in
+# accordance with the applicable license terms. By expressly accepting such
+# terms or by downloading, installing, activating and/or otherwise using the
+# software, you are agreeing that you have read, and that you agree to comply
+# with and are bound by, such license terms. If you do not agree to be bound
+# by the applicable license terms, then you may not retain, install, activate
+# or otherwise use the software.
+
+import os
+import numpy as np
+from rag.search.dense_search import as_query_matrix, l2_normalize
+from rag.search.ivf_index import spherical_kmeans
+from rag.database.columnar_database import get_chunked_file
+
+GARBAGE_MODEL_FILE_NAME = "garbage_model.json"
+OUT_OF_DOMAIN_CLASSIFIER_EXTENSION = ".ood.npz"
+
+
+def get_out_of_domain_classifier_path(rag_db_path: str) -> str:
+    """
+    :param rag_db_path: path of the RAG database
+    :return: path of the out-of-domain classifier saved next to a pickle database (e.g. rag_database.pkl ->
+    rag_database.ood.npz)
+    """
+
+    return os.path.splitext(rag_db_path)[0] + OUT_OF_DOMAIN_CLASSIFIER_EXTENSION
+
+
+def save_out_of_domain_classifier(destination_path: str, classifier: dict) -> None:
+    """
+    Save an out-of-domain classifier.
+    :param destination_path: path of the created classifier file
+    :param classifier: classifier built by `build_out_of_domain_classifier`
+    :return: None
+    """
+
+    with open(destination_path, "wb") as f:
+        np.savez(f, domain_centroids=classifier["domain_centroids"], garbage_centroids=classifier["garbage_centroids"],
+                 threshold=np.float64(classifier["threshold"]))
+
+
+def load_out_of_domain_classifier(classifier_path: str) -> dict:
+    """
+    Load an out-of-domain classifier.
+    :param classifier_path: path of the classifier file
+    :return: dictionary describing the classifier (see `OutOfDomainClassifier`)
+    """
+
+    with np.load(classifier_path) as data:
+        return {"domain_centroids": data["domain_centroids"], "garbage_centroids": data["garbage_centroids"],
+                "threshold": float(data["threshold"])}
+
+
+def is_garbage_model_file(file_name: str) -> bool:
+    """
+    :param file_name: name of a chunked file
+    :return: True if the chunks of the file belong to the garbage model (garbage_model.json, whatever its case)
+    """
+
+    return os.path.basename(file_name).lower() == GARBAGE_MODEL_FILE_NAME
+
+
+def is_garbage_entry(entry: dict) -> bool:
+    """
+    :param entry: database entry
+    :return: True if the entry belongs to the garbage model (commands must reach the retrieval, so the entries with an
+    "intent" do not)
+    """
+
+    chunked_file = get_chunked_file(entry)
+    return chunked_file is not None and is_garbage_model_file(chunked_file) and "intent" not in entry
+
+
+def get_question_embeddings(entries: list[dict]) -> list[np.ndarray]:
+    """
+    :param entries: database entries
+    :return: embeddings of the questions of the HiRAG domain entries (their reranking embedding), each of shape
+    (1, dim)
+    """
+
+    return [np.asarray(entry["reranking_embedding"], dtype=np.float32).reshape(1, -1) for entry in entries
+            if "question" in entry and not is_garbage_entry(entry)]
+
+
+def _max_similarity(embeddings: np.ndarray, centroids: np.ndarray) -> np.ndarray:
+    return np.max(embeddings @ centroids.T, axis=-1)
+
+
+def _max_margin(embeddings, domain_centroids: np.ndarray, garbage_centroids: np.ndarray) -> float:
+    embeddings = l2_normalize(as_query_matrix(embeddings))
+    return float(np.max(_max_similarity(embeddings, garbage_centroids) - _max_similarity(embeddings, domain_centroids)))
+
+
+def build_out_of_domain_classifier(domain_embeddings,
+                                   garbage_embeddings,
+                                   num_centroids: int = 16,
+                                   seed: int = 0,
+                                   question_embeddings=None) -> dict:
+    """
+    Build a nearest-centroid out-of-domain classifier: the domain and garbage model embeddings are each clustered
+    with a spherical k-means, and a query is out-of-domain if it is closer to the garbage centroids than to the domain
+    centroids by more than a threshold. The threshold is the highest margin of the domain embeddings and of the
+    domain questions, so that no domain chunk is classified as out-of-domain. The questions (e.g. the HiRAG
+    questions, see `get_question_embeddings`) are not clustered: they calibrate the threshold on queries phrased
+    like the users' ones, whose margin can be higher than the one of the chunks.
+    :param domain_embeddings: embeddings of the domain chunks, shape (n, dim)
+    :param garbage_embeddings: embeddings of the garbage model chunks, shape (m, dim)
+    :param num_centroids: maximum number of centroids of each class
+    :param seed: random seed of the k-means
+    :param question_embeddings: embeddings of domain questions, shape (q, dim) (None or empty if there are none)
+    :return: dictionary describing the classifier (see `OutOfDomainClassifier`)
+    """
+
+    domain_embeddings = l2_normalize(as_query_matrix(domain_embeddings))
+    garbage_embeddings = l2_normalize(as_query_matrix(garbage_embeddings))
+    domain_centroids = spherical_kmeans(domain_embeddings, min(num_centroids, len(domain_embeddings)), seed=seed)
+    garbage_centroids = spherical_kmeans(garbage_embeddings, min(num_centroids, len(garbage_embeddings)), seed=seed)
+    threshold = _max_margin(domain_embeddings, domain_centroids, garbage_centroids)
+    if question_embeddings is not None and len(question_embeddings):
+        threshold = max(threshold, _max_margin(question_embeddings, domain_centroids, garbage_centroids))
+
+    return {
+        "domain_centroids": domain_centroids.astype(np.float32),
+        "garbage_centroids": garbage_centroids.astype(np.float32),
+        "threshold": threshold,
+    }
+
+
+def extend_out_of_domain_classifier(classifier: dict, domain_embeddings) -> dict:
+    """
+    Raise the threshold of a classifier so that new domain chunks (e.g. added by a delta segment) are not classified
+    as out-of-domain, without clustering the whole database again.
+    :param classifier: classifier built by `build_out_of_domain_classifier`
+    :param domain_embeddings: embeddings of the new domain chunks (and of their questions), shape (n, dim)
+    :return: classifier with the updated threshold
+    """
+
+    domain_embeddings = as_query_matrix(domain_embeddings)
+    if len(domain_embeddings) == 0:
+        return classifier
+    domain_centroids = np.asarray(classifier["domain_centroids"], dtype=np.float32)
+    garbage_centroids = np.asarray(classifier["garbage_centroids"], dtype=np.float32)
+    return dict(classifier, threshold=max(float(classifier["threshold"]),
+                                          _max_margin(domain_embeddings, domain_centroids, garbage_centroids)))
+
+
+class OutOfDomainClassifier:
+    """
+    Nearest-centroid out-of-domain classifier evaluated before the search: it only costs a product with a few
+    centroids, so an out-of-domain query skips the search of the whole database.
+    """
+
+    def __init__(self, classifier: dict, margin: float = 0.):
+        """
+        :param classifier: classifier built by `build_out_of_domain_classifier`
+        :param margin: added to the threshold of the classifier (a negative margin flags more queries)
+        """
+
+        self.domain_centroids = np.asarray(classifier["domain_centroids"], dtype=np.float32)
+        self.garbage_centroids = np.asarray(classifier["garbage_centroids"], dtype=np.float32)
+        self.threshold = float(classifier["threshold"]) + margin
+
+    def score(self, query_embeddings: np.ndarray) -> np.ndarray:
+        """
+        :param query_embeddings: query embedding(s), shape (dim,) or (num_queries, dim)
+        :return: similarity to the closest garbage centroid minus similarity to the closest domain centroid, shape
+        (num_queries,)
+        """
+
+        query_matrix = l2_normalize(as_query_matrix(query_embeddings))
+        return (_max_similarity(query_matrix, self.garbage_centroids) -
+                _max_similarity(query_matrix, self.domain_centroids))
+
+    def __call__(self, query_embeddings: np.ndarray) -> np.ndarray:
+        """
+        :param query_embeddings: query embedding(s), shape (dim,) or (num_queries, dim)
+        :return: True for each out-of-domain query, shape (num_queries,)
+        """
+
+        return self.score(query_embeddings) > self.threshold
@@ -0,0 +1,78 @@
+# Copyright 2025 NXP
+# NXP Proprietary.
+# This software is owned or controlled by NXP and may only be used strictly in
+# accordance with the applicable license terms. By expressly accepting such
+# terms or by downloading, installing, activating and/or otherwise using the
+# software, you are agreeing that you have read, and that you agree to comply
+# with and are bound by, such license terms. If you do not agree to be bound
+# by the applicable license terms, then you may not retain, install, activate
+# or otherwise use the software.
+
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+from rag.search.dense_search import DenseSearchEngine, as_query_matrix, l2_normalize, top_k
+
+
+class PartitionedSearchEngine(DenseSearchEngine):
+    """
+    Exhaustive search engine scanning the database on several cores: the embedding matrix is split into contiguous
+    partitions (views, without any copy), each partition is scored and partially sorted by a thread of a pool (the
+    matrix product and argpartition release the GIL), and the partial top-k of the partitions are merged.
+    The number of threads is a budget shared with the other workloads of the device (e.g. the LLM decoding threads).
+    BLAS libraries may also use their own threads: limit them (e.g. OPENBLAS_NUM_THREADS=1) to avoid oversubscription.
+    """
+
+    def __init__(self, embeddings, num_threads: int, min_partition_size: int = 4096, normalize: bool = True):
+        """
+        :param embeddings: database embeddings of shape (num_embeddings, dim)
+        :param num_threads: maximum number of threads scanning the database
+        :param min_partition_size: minimum number of embeddings per partition (smaller databases use fewer threads)
+        :param normalize: L2-normalize the embeddings (can be skipped if they are already normalized)
+        """
+
+        super().__init__(embeddings, normalize=normalize)
+        num_partitions = max(1, min(num_threads, len(self) // max(1, min_partition_size)))
+        self.partition_bounds = np.linspace(0, len(self), num_partitions + 1).astype(np.int64)
+        self.executor = None
+        if num_partitions > 1:
+            self.executor = ThreadPoolExecutor(max_workers=num_partitions, thread_name_prefix="rag-scan")
+
+    @property
+    def num_partitions(self) -> int:
+        return len(self.partition_bounds) - 1
+
+    def _search_partition(self, queries: np.ndarray, k: int, start: int, stop: int) -> tuple[np.ndarray, np.ndarray]:
+        """
+        :param queries: normalized queries of shape (num_queries, dim)
+        :param k: number of embeddings to retrieve per query
+        :param start: first row of the partition
+        :param stop: end row of the partition
+        :return: similarities and database indexes of the k best embeddings of the partition, shape (num_queries, k)
+        """
+
+        similarities, indices = top_k(queries @ self.embeddings[start:stop].T, k)
+        return similarities, indices + start
+
+    def search(self, query_embeddings, k: int) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Find the k most similar database embeddings for each query.
+        :param query_embeddings: query embedding(s) of shape (dim,) or (num_queries, dim)
+        :param k: number of embeddings to retrieve per query
+        :return: similarities and indexes of shape (k,) for a single query or (num_queries, k) for a batch
+        """
+
+        if self.executor is None:
+            return super().search(query_embeddings, k)
+
+        queries = l2_normalize(as_query_matrix(query_embeddings))
+        partial_results = list(self.executor.map(lambda bounds: self._search_partition(queries, k, *bounds),
+                                                 zip(self.partition_bounds[:-1], self.partition_bounds[1:])))
+        # Merge of the partial top-k: k * num_partitions candidates per query
+        candidate_similarities = np.concatenate([similarities for similarities, _ in partial_results], axis=-1)
+        candidate_indices = np.concatenate([indices for _, indices in partial_results], axis=-1)
+        similarities, positions = top_k(candidate_similarities, k)
+        indices = np.take_along_axis(candidate_indices, positions, axis=-1)
+
+        if np.ndim(query_embeddings) == 1:
+            return similarities[0], indices[0]
+        return similarities, indices
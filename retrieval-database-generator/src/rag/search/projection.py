@@ -0,0 +1,123 @@
+# Copyright 2025 NXP
+# NXP Proprietary.
+# This software is owned or controlled by NXP and may only be used strictly in
+# accordance with the applicable license terms. By expressly accepting such
+# terms or by downloading, installing, activating and/or otherwise using the
+# software, you are agreeing that you have read, and that you agree to comply
+# with and are bound by, such license terms. If you do not agree to be bound
+# by the applicable license terms, then you may not retain, install, activate
+# or otherwise use the software.
+
+import numpy as np
+from enum import Enum
+from typing import Callable
+from rag.search.dense_search import l2_normalize
+from rag.search.quantization import QuantizedSearchEngine
+
+
+class ProjectionMethod(str, Enum):
+    """Embedding projection methods supported."""
+    NONE = "none"
+    PCA = "pca"
+    MATRYOSHKA = "matryoshka"
+
+
+# Names of the arrays stored in the database by a projection
+PROJECTION_ARRAYS = ("projection_matrix", "projection_mean", "projected_embeddings")
+
+
+def learn_pca(embeddings: np.ndarray,
+              dim: int,
+              max_training_points: int = 100000,
+              seed: int = 0) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Principal component analysis of the embeddings.
+    :param embeddings: normalized embeddings of shape (n, full_dim)
+    :param dim: number of principal components kept
+    :param max_training_points: maximum number of embeddings used to learn the components
+    :param seed: random seed
+    :return: projection matrix of shape (full_dim, dim) (principal components sorted by decreasing variance) and mean
+    of shape (full_dim,)
+    """
+
+    rng = np.random.default_rng(seed)
+    num_embeddings = len(embeddings)
+    training_set = np.asarray(embeddings[np.sort(rng.choice(num_embeddings, min(num_embeddings, max_training_points),
+                                                            replace=False))], dtype=np.float64)
+    mean = training_set.mean(axis=0)
+    centered = training_set - mean
+    eigenvalues, eigenvectors = np.linalg.eigh(centered.T @ centered)
+    components = eigenvectors[:, np.argsort(eigenvalues)[::-1][:dim]]
+    return components.astype(np.float32), mean.astype(np.float32)
+
+
+def project_embeddings(embeddings: np.ndarray,
+                       method: ProjectionMethod,
+                       dim: int,
+                       batch_size: int = 65536) -> dict[str, np.ndarray]:
+    """
+    Learn a projection of the embeddings to `dim` dimensions and project them.
+    With PCA, q.x ~= q.mean + (q.P).((x-mean).P): only the query is projected during the search.
+    Matryoshka models are trained so that the first dimensions of an embedding are an embedding: the truncated
+    embeddings are re-normalized and compared with the cosine similarity. (all-MiniLM-L6-v2 is not a Matryoshka
+    model, use PCA with it)
+    :param embeddings: normalized embeddings of shape (n, full_dim)
+    :param method: projection method
+    :param dim: dimension of the projected embeddings (lower than full_dim)
+    :param batch_size: number of embeddings projected at once
+    :return: arrays to store in the database (see PROJECTION_ARRAYS)
+    """
+
+    full_dim = embeddings.shape[1]
+    if not 0 < dim < full_dim:
+        raise ValueError(f"The projection dimension ({dim}) must be between 1 and {full_dim - 1}.")
+
+    if method == ProjectionMethod.PCA:
+        matrix, mean = learn_pca(embeddings, dim)
+    elif method == ProjectionMethod.MATRYOSHKA:
+        matrix, mean = np.eye(full_dim, dim, dtype=np.float32), np.zeros(full_dim, dtype=np.float32)
+    else:
+        raise ValueError(f"Unknown projection method: {method}")
+
+    projected = np.empty((len(embeddings), dim), dtype=np.float32)
+    for start in range(0, len(embeddings), batch_size):
+        projected[start:start + batch_size] = (embeddings[start:start + batch_size] - mean) @ matrix
+    if method == ProjectionMethod.MATRYOSHKA:
+        projected = l2_normalize(projected)
+    return {"projection_matrix": matrix, "projection_mean": mean, "projected_embeddings": projected}
+
+
+class ProjectedSearchEngine(QuantizedSearchEngine):
+    """
+    Scan over low-dimensional projections of the embeddings (e.g. 384 -> 96 dimensions reads 4x less memory per
+    query). Only the query is projected, and the best candidates are rescored with the full embeddings.
+    """
+
+    def __init__(self, embeddings, projection_matrix: np.ndarray, projection_mean: np.ndarray,
+                 projected_embeddings: np.ndarray, rescoring_factor: int):
+        super().__init__(embeddings, rescoring_factor=rescoring_factor)
+        self.projection_matrix = np.asarray(projection_matrix, dtype=np.float32)
+        self.projection_mean = np.asarray(projection_mean, dtype=np.float32)
+        self.projected_embeddings = projected_embeddings
+
+    def _prepare_queries(self, queries: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        # q.x ~= q.mean + (q.P).((x-mean).P)
+        return queries @ self.projection_matrix, (queries @ self.projection_mean)[:, None]
+
+    def _approximate_score(self, queries: tuple[np.ndarray, np.ndarray], start: int, stop: int) -> np.ndarray:
+        projected_queries, constants = queries
+        return projected_queries @ self.projected_embeddings[start:stop].T + constants
+
+
+def create_projected_search_engine(embeddings,
+                                   get_array: Callable[[str], np.ndarray],
+                                   rescoring_factor: int) -> ProjectedSearchEngine:
+    """
+    :param embeddings: normalized float32 embeddings (used for the exact rescoring)
+    :param get_array: function returning a database array from its name
+    :param rescoring_factor: number of candidates rescored per returned result (0 disables the rescoring)
+    :return: search engine over the projected embeddings
+    """
+
+    return ProjectedSearchEngine(embeddings, rescoring_factor=rescoring_factor,
+                                 **{name: get_array(name) for name in PROJECTION_ARRAYS})
@@ -0,0 +1,274 @@
+# Copyright 2025 NXP
+# NXP Proprietary.
+# This software is owned or controlled by NXP and may only be used strictly in
+# accordance with the applicable license terms. By expressly accepting such
+# terms or by downloading, installing, activating and/or otherwise using the
+# software, you are agreeing that you have read, and that you agree to comply
+# with and are bound by, such license terms. If you do not agree to be bound
+# by the applicable license terms, then you may not retain, install, activate
+# or otherwise use the software.
+
+import numpy as np
+from abc import ABC, abstractmethod
+from enum import Enum
+from typing import Callable
+from rag.search.dense_search import DenseSearchEngine, as_query_matrix, l2_normalize, top_k
+
+
+class QuantizationMethod(str, Enum):
+    """Embedding quantization methods supported."""
+    NONE = "none"
+    INT8 = "int8"
+    PQ = "pq"
+
+
+# Names of the arrays stored in the database for each quantization method
+QUANTIZATION_ARRAYS = {
+    QuantizationMethod.INT8: ("int8_codes", "int8_scales", "int8_offsets"),
+    QuantizationMethod.PQ: ("pq_codes", "pq_codebooks"),
+}
+
+
+def quantize_int8(embeddings: np.ndarray) -> dict[str, np.ndarray]:
+    """
+    Scalar quantization: each dimension is mapped to 256 levels between its minimum and maximum values, so that
+    x ~= offset + scale * (code + 128).
+    :param embeddings: normalized embeddings of shape (n, dim)
+    :return: int8 codes of shape (n, dim) and the per-dimension scales and offsets
+    """
+
+    minimums, maximums = embeddings.min(axis=0), embeddings.max(axis=0)
+    scales = np.maximum(maximums - minimums, 1e-12) / 255
+    codes = np.clip(np.rint((embeddings - minimums) / scales) - 128, -128, 127).astype(np.int8)
+    return {"int8_codes": codes, "int8_scales": scales.astype(np.float32), "int8_offsets": minimums.astype(np.float32)}
+
+
+def _kmeans(points: np.ndarray, num_centroids: int, num_iterations: int, rng: np.random.Generator) -> np.ndarray:
+    """
+    Euclidean k-means.
+    :param points: training points of shape (n, dim)
+    :param num_centroids: number of centroids
+    :param num_iterations: number of iterations
+    :param rng: random generator used for the initialization
+    :return: centroids of shape (num_centroids, dim)
+    """
+
+    centroids = points[rng.choice(len(points), num_centroids, replace=False)].copy()
+    for _ in range(num_iterations):
+        assignments = _nearest_centroid(points, centroids)
+        counts = np.bincount(assignments, minlength=num_centroids)
+        sums = np.zeros_like(centroids)
+        non_empty = np.flatnonzero(counts)
+        order = np.argsort(assignments, kind="stable")
+        starts = np.concatenate(([0], np.cumsum(counts)[:-1]))[non_empty]
+        sums[non_empty] = np.add.reduceat(points[order], starts, axis=0)
+        centroids[non_empty] = sums[non_empty] / counts[non_empty, None]
+    return centroids
+
+
+def _nearest_centroid(points: np.ndarray, centroids: np.ndarray, batch_size: int = 65536) -> np.ndarray:
+    """
+    :param points: points of shape (n, dim)
+    :param centroids: centroids of shape (num_centroids, dim)
+    :param batch_size: number of points processed at once
+    :return: index of the closest centroid (L2 distance) of each point, shape (n,)
+    """
+
+    squared_norms = np.sum(centroids ** 2, axis=1)
+    assignments = np.empty(len(points), dtype=np.int64)
+    for start in range(0, len(points), batch_size):
+        batch = points[start:start + batch_size]
+        assignments[start:start + batch_size] = np.argmin(squared_norms - 2 * batch @ centroids.T, axis=1)
+    return assignments
+
+
+def quantize_pq(embeddings: np.ndarray,
+                num_subvectors: int = 0,
+                num_iterations: int = 10,
+                max_training_points: int = 16384,
+                seed: int = 0) -> dict[str, np.ndarray]:
+    """
+    Product quantization: the embeddings are split in `num_subvectors` sub-vectors, and each sub-vector is replaced by
+    the index of its closest centroid in a codebook of (at most) 256 centroids learned with k-means.
+    :param embeddings: normalized embeddings of shape (n, dim)
+    :param num_subvectors: number of sub-vectors, i.e. bytes per embedding (0 = dim / 8). Must divide dim.
+    :param num_iterations: number of k-means iterations
+    :param max_training_points: maximum number of embeddings used to learn the codebooks
+    :param seed: random seed
+    :return: uint8 codes of shape (n, num_subvectors) and codebooks of shape (num_subvectors, num_centroids, dim_sub)
+    """
+
+    num_embeddings, dim = embeddings.shape
+    if num_subvectors <= 0:
+        num_subvectors = max(1, dim // 8)
+    if dim % num_subvectors != 0:
+        raise ValueError(f"The number of sub-vectors ({num_subvectors}) must divide the dimension ({dim}).")
+    sub_dim = dim // num_subvectors
+    num_centroids = min(256, num_embeddings)
+
+    rng = np.random.default_rng(seed)
+    training_set = embeddings[rng.choice(num_embeddings, min(num_embeddings, max_training_points), replace=False)]
+
+    codebooks = np.empty((num_subvectors, num_centroids, sub_dim), dtype=np.float32)
+    codes = np.empty((num_embeddings, num_subvectors), dtype=np.uint8)
+    for m in range(num_subvectors):
+        sub_space = slice(m * sub_dim, (m + 1) * sub_dim)
+        codebooks[m] = _kmeans(np.ascontiguousarray(training_set[:, sub_space]), num_centroids, num_iterations, rng)
+        codes[:, m] = _nearest_centroid(np.ascontiguousarray(embeddings[:, sub_space]), codebooks[m])
+    return {"pq_codes": codes, "pq_codebooks": codebooks}
+
+
+def quantize_embeddings(embeddings: np.ndarray, method: QuantizationMethod, **kwargs) -> dict[str, np.ndarray]:
+    """
+    :param embeddings: normalized embeddings of shape (n, dim)
+    :param method: quantization method
+    :param kwargs: method-specific parameters
+    :return: arrays to store in the database (see QUANTIZATION_ARRAYS)
+    """
+
+    if method == QuantizationMethod.INT8:
+        return quantize_int8(embeddings)
+    elif method == QuantizationMethod.PQ:
+        return quantize_pq(embeddings, **kwargs)
+    raise ValueError(f"Unknown quantization method: {method}")
+
+
+class QuantizedSearchEngine(DenseSearchEngine, ABC):
+    """
+    Search engine scanning compressed embeddings with asymmetric scores: the query stays in float32 while the
+    database stays compressed. The best `rescoring_factor * k` candidates are then rescored exactly with the float32
+    embeddings (only these rows are read, so a memory-mapped float32 matrix is mostly never paged in).
+    """
+
+    def __init__(self, embeddings, rescoring_factor: int, block_size: int = 32768):
+        """
+        :param embeddings: normalized float32 embeddings, only read for the exact rescoring
+        :param rescoring_factor: number of candidates rescored per returned result (0 disables the rescoring)
+        :param block_size: number of compressed embeddings decoded at once during the scan (the decoded block should
+        fit in the CPU cache)
+        """
+
+        super().__init__(embeddings, normalize=False)
+        self.rescoring_factor = rescoring_factor
+        self.block_size = block_size
+
+    def _prepare_queries(self, queries: np.ndarray):
+        """
+        :param queries: normalized queries of shape (num_queries, dim)
+        :return: query terms passed to `_approximate_score`, computed once per scan instead of once per block
+        """
+
+        return queries
+
+    @abstractmethod
+    def _approximate_score(self, queries, start: int, stop: int) -> np.ndarray:
+        """
+        :param queries: query terms returned by `_prepare_queries`
+        :param start: first database index of the block
+        :param stop: last database index (excluded) of the block
+        :return: approximate similarities of shape (num_queries, stop - start)
+        """
+
+    def score(self, query_embeddings) -> np.ndarray:
+        """
+        Compute the approximate similarity between the queries and every database embedding.
+        :param query_embeddings: query embedding(s) of shape (dim,) or (num_queries, dim)
+        :return: similarities of shape (num_queries, num_embeddings)
+        """
+
+        queries = l2_normalize(as_query_matrix(query_embeddings))
+        prepared_queries = self._prepare_queries(queries)
+        similarities = np.empty((len(queries), len(self)), dtype=np.float32)
+        for start in range(0, len(self), self.block_size):
+            stop = min(start + self.block_size, len(self))
+            similarities[:, start:stop] = self._approximate_score(prepared_queries, start, stop)
+        return similarities
+
+    def search(self, query_embeddings, k: int) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Find the k most similar database embeddings for each query.
+        :param query_embeddings: query embedding(s) of shape (dim,) or (num_queries, dim)
+        :param k: number of embeddings to retrieve per query
+        :return: similarities and indexes of shape (k,) for a single query or (num_queries, k) for a batch
+        """
+
+        queries = l2_normalize(as_query_matrix(query_embeddings))
+        similarities, indices = top_k(self.score(queries), max(k, k * self.rescoring_factor))
+
+        if self.rescoring_factor > 0:
+            # Exact rescoring of the candidates
+            candidates = np.sort(indices, axis=-1)
+            exact_similarities = np.einsum("qcd,qd->qc", self.embeddings[candidates.reshape(-1)].reshape(
+                candidates.shape + (self.dim,)), queries)
+            similarities, positions = top_k(exact_similarities, k)
+            indices = np.take_along_axis(candidates, positions, axis=-1)
+        else:
+            similarities, indices = similarities[:, :k], indices[:, :k]
+
+        if np.ndim(query_embeddings) == 1:
+            return similarities[0], indices[0]
+        return similarities, indices
+
+
+class Int8SearchEngine(QuantizedSearchEngine):
+    """
+    Scan over int8 scalar-quantized embeddings (4x smaller than float32). The codes are decoded to float32 in small
+    blocks that stay in the cache: decoding large blocks writes temporaries bigger than the float32 embeddings and
+    makes the scan slower than the exact search.
+    """
+
+    def __init__(self, embeddings, int8_codes: np.ndarray, int8_scales: np.ndarray, int8_offsets: np.ndarray,
+                 rescoring_factor: int, block_size: int = 512):
+        super().__init__(embeddings, rescoring_factor=rescoring_factor, block_size=block_size)
+        self.codes = int8_codes
+        self.scales = np.asarray(int8_scales, dtype=np.float32)
+        self.offsets = np.asarray(int8_offsets, dtype=np.float32)
+
+    def _prepare_queries(self, queries: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        # q.x ~= q.offset + (q * scale).(code + 128)
+        weights = queries * self.scales
+        constants = queries @ self.offsets + 128 * weights.sum(axis=1)
+        return weights, constants[:, None]
+
+    def _approximate_score(self, queries: tuple[np.ndarray, np.ndarray], start: int, stop: int) -> np.ndarray:
+        weights, constants = queries
+        return weights @ self.codes[start:stop].astype(np.float32).T + constants
+
+
+class PQSearchEngine(QuantizedSearchEngine):
+    """Scan over product-quantized embeddings with asymmetric distance computation (lookup tables)."""
+
+    def __init__(self, embeddings, pq_codes: np.ndarray, pq_codebooks: np.ndarray, rescoring_factor: int,
+                 block_size: int = 4096):
+        super().__init__(embeddings, rescoring_factor=rescoring_factor, block_size=block_size)
+        self.codes = pq_codes
+        self.codebooks = np.asarray(pq_codebooks, dtype=np.float32)
+        num_subvectors, num_centroids, _ = self.codebooks.shape
+        self._code_offsets = (np.arange(num_subvectors) * num_centroids).astype(np.intp)
+
+    def _approximate_score(self, queries: np.ndarray, start: int, stop: int) -> np.ndarray:
+        num_subvectors, num_centroids, sub_dim = self.codebooks.shape
+        # Lookup tables: similarity between each query sub-vector and each centroid of its codebook
+        lookup_tables = np.einsum("qmd,mcd->qmc", queries.reshape(len(queries), num_subvectors, sub_dim),
+                                  self.codebooks).reshape(len(queries), -1)
+        flat_codes = self.codes[start:stop].astype(np.intp) + self._code_offsets
+        return np.stack([lookup_table[flat_codes].sum(axis=1) for lookup_table in lookup_tables])
+
+
+def create_quantized_search_engine(embeddings,
+                                   method: QuantizationMethod,
+                                   get_array: Callable[[str], np.ndarray],
+                                   rescoring_factor: int) -> QuantizedSearchEngine:
+    """
+    :param embeddings: normalized float32 embeddings (used for the exact rescoring)
+    :param method: quantization method used when generating the database
+    :param get_array: function returning a database array from its name
+    :param rescoring_factor: number of candidates rescored per returned result (0 disables the rescoring)
+    :return: search engine over the quantized embeddings
+    """
+
+    method = QuantizationMethod(method)
+    arrays = {name: get_array(name) for name in QUANTIZATION_ARRAYS[method]}
+    if method == QuantizationMethod.INT8:
+        return Int8SearchEngine(embeddings, rescoring_factor=rescoring_factor, **arrays)
+    return PQSearchEngine(embeddings, rescoring_factor=rescoring_factor, **arrays)
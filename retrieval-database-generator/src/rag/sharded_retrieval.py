@@ -0,0 +1,235 @@
+# Copyright 2025 NXP
+# NXP Proprietary.
+# This software is owned or controlled by NXP and may only be used strictly in
+# accordance with the applicable license terms. By expressly accepting such
+# terms or by downloading, installing, activating and/or otherwise using the
+# software, you are agreeing that you have read, and that you agree to comply
+# with and are bound by, such license terms. If you do not agree to be bound
+# by the applicable license terms, then you may not retain, install, activate
+# or otherwise use the software.
+
+import os
+import time
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+from rag.config import Config
+from rag.utils import pretty_print, CENSORED_WORDS, CENSORED_PHRASE_FILTER
+from rag.phrase_matcher import CensoredPhraseFilter
+from rag.retrieval import Retriever, CENSORED_SOURCE, OUT_OF_DOMAIN_SOURCE
+from rag.models.embedding_models.embedding_models import EmbeddingModel
+from rag.cache.query_embedding_cache import QueryEmbeddingCache
+from rag.search.dense_search import as_query_matrix, l2_normalize
+from rag.search.ivf_index import spherical_kmeans
+
+
+def compute_routing_centroids(embeddings: np.ndarray, num_centroids: int, description_embedding=None) -> np.ndarray:
+    """
+    :param embeddings: embeddings of a database shard, shape (n, dim)
+    :param num_centroids: number of k-means centroids summarizing the shard
+    :param description_embedding: embedding of the database description, added to the centroids (None to ignore it)
+    :return: normalized routing centroids of the shard, shape (num_centroids (+ 1), dim)
+    """
+
+    centroids = spherical_kmeans(embeddings, max(1, min(num_centroids, len(embeddings))))
+    if description_embedding is not None:
+        centroids = np.concatenate((centroids, l2_normalize(as_query_matrix(description_embedding))))
+    return centroids
+
+
+class ShardedRetriever:
+    """
+    Retriever over several databases (e.g. one per knowledge base). Each database is summarized by routing centroids
+    (k-means centroids of its embeddings and the embedding of its description): a query only searches the shards
+    whose centroids are the most similar to it, in parallel, and their results are merged by similarity. Adding a
+    domain therefore does not add the scan of its database to every query.
+    The shards share the same embedding model and query embedding cache; censored queries, commands and out-of-domain
+    queries (flagged by every shard) are handled as in the Retriever.
+    """
+
+    def __init__(self,
+                 top_k: int,
+                 reranking: bool,
+                 best_k: int,
+                 rag_db_paths: list[str],
+                 verbose: bool = False,
+                 routing_centroids: int = Config.routing_centroids,
+                 max_routed_shards: int = Config.max_routed_shards,
+                 routing_margin: float = Config.routing_margin,
+                 query_cache_size: int = Config.query_cache_size,
+                 query_cache_path: str = None,
+                 deny_list_path: str = None,
+                 **retriever_kwargs):
+        """
+        :param top_k: number of candidates pre-selected in each routed shard
+        :param reranking: rerank the candidates of each shard
+        :param best_k: number of chunks returned (merged from the routed shards)
+        :param rag_db_paths: paths of the database shards
+        :param verbose: show more information
+        :param routing_centroids: number of k-means centroids summarizing each shard
+        :param max_routed_shards: maximum number of shards searched per query
+        :param routing_margin: a shard is searched if its routing score is at most this margin below the best one
+        :param query_cache_size: number of query embeddings kept in the shared LRU cache
+        :param query_cache_path: file in which the query embedding cache is persisted (None to keep it in memory)
+        :param deny_list_path: deny-list file with additional censored phrases
+        :param retriever_kwargs: other Retriever parameters, used by every shard
+        """
+
+        if not rag_db_paths:
+            raise ValueError("At least one database shard is required.")
+        self.best_k = best_k
+        self.verbose = verbose
+        self.max_routed_shards = max(1, max_routed_shards)
+        self.routing_margin = routing_margin
+        # The default filter is built once at import time and shared by every retriever
+        self.is_censored = CENSORED_PHRASE_FILTER
+        if deny_list_path is not None:
+            self.is_censored = CensoredPhraseFilter(CENSORED_WORDS, deny_list_path=deny_list_path)
+
+        self.embedding_model = EmbeddingModel(name="all-MiniLM-L6-v2")
+        self.query_cache = QueryEmbeddingCache(max_size=query_cache_size,
+                                               embedding_model_version=self.embedding_model.embedding_model_version,
+                                               cache_path=query_cache_path)
+        # Queries are encoded and cached once by the sharded retriever, the shards only search
+        self.shards = [Retriever(top_k=top_k, reranking=reranking, best_k=best_k, rag_db_path=rag_db_path,
+                                 verbose=False, query_cache_size=0, semantic_cache_size=0,
+                                 embedding_model=self.embedding_model, **retriever_kwargs)
+                       for rag_db_path in rag_db_paths]
+        self.shard_names = [os.path.basename(rag_db_path) for rag_db_path in rag_db_paths]
+
+        self.routing_centroids = []
+        for shard in self.shards:
+            description = shard.database_info.get("database_description")
+            description_embedding = self.embedding_model.encode(description) if description else None
+            self.routing_centroids.append(compute_routing_centroids(shard.embedding_list, routing_centroids,
+                                                                    description_embedding))
+        self.executor = ThreadPoolExecutor(max_workers=len(self.shards), thread_name_prefix="rag-shard")
+
+        if self.verbose:
+            pretty_print(name="RAG shards", result_dictionary={
+                name: f"{len(shard.search_engine)} embeddings ({type(shard.search_engine).__name__})"
+                for name, shard in zip(self.shard_names, self.shards)
+            })
+
+    def _encode_query(self, query: str) -> np.ndarray:
+        """
+        :param query: user query
+        :return: embedding of the query, shape (dim,)
+        """
+
+        query_embedding = self.query_cache.get(query)
+        if query_embedding is None:
+            query_embedding = as_query_matrix(self.embedding_model.encode(query))[0]
+            self.query_cache.put(query, query_embedding)
+        return query_embedding
+
+    def route(self, query_matrix: np.ndarray) -> np.ndarray:
+        """
+        :param query_matrix: embeddings of the queries, shape (num_queries, dim)
+        :return: True for each shard searched by each query, shape (num_queries, num_shards)
+        """
+
+        query_matrix = l2_normalize(query_matrix)
+        scores = np.stack([np.max(query_matrix @ centroids.T, axis=-1) for centroids in self.routing_centroids],
+                          axis=-1)
+        ranks = np.argsort(np.argsort(-scores, axis=-1, kind="stable"), axis=-1, kind="stable")
+        return (ranks < self.max_routed_shards) & (scores >= scores.max(axis=-1, keepdims=True) - self.routing_margin)
+
+    def _resolve_without_search(self, query: str, query_embedding: np.ndarray = None) -> tuple[list, list, list] | None:
+        """
+        :param query: user query
+        :param query_embedding: embedding of the query (None before the query is encoded)
+        :return: the result of a censored query, a command or an out-of-domain query, None if the shards must be
+        searched
+        """
+
+        if query_embedding is None:
+            if self.is_censored(query):
+                return self.shards[0]._empty_result(CENSORED_SOURCE)
+        for shard in self.shards:
+            intent_result = shard._match_intent(query, query_embedding)
+            if intent_result is not None:
+                return intent_result
+        if query_embedding is not None and all(shard.out_of_domain_classifier is not None and
+                                               shard.is_out_of_domain(query_embedding)[0] for shard in self.shards):
+            return self.shards[0]._empty_result(OUT_OF_DOMAIN_SOURCE)
+        return None
+
+    def _merge(self, results: list[tuple[list, list, list]]) -> tuple[list, list, list]:
+        """
+        :param results: results of the searched shards
+        :return: best_k chunks of all the results, sorted by decreasing similarity (and cut as in each shard)
+        """
+
+        if len(results) == 1:
+            return results[0]
+        candidates = [candidate for result in results for candidate in zip(*result)]
+        best_candidates = sorted(candidates, key=lambda candidate: -candidate[1])[:self.best_k]
+        best_chunk_list, best_similarity_list, best_metadata_list = (list(values) for values in zip(*best_candidates))
+        return self.shards[0].adapt_k((best_chunk_list, best_similarity_list, best_metadata_list))
+
+    def retrieve_batch(self, queries: list[str]) -> list[tuple[list, list, list]]:
+        """
+        Retrieve the most relevant chunks for a batch of queries: every shard searches the queries routed to it (in
+        parallel with the other shards), then the results of each query are merged.
+        :param queries: list of user queries
+        :return: list of (chunks, similarities, metadata) tuples, aligned with the input queries
+        """
+
+        start_time = time.time()
+        results = [self._resolve_without_search(query) for query in queries]
+        query_embeddings = {position: self._encode_query(queries[position])
+                            for position, result in enumerate(results) if result is None}
+        for position, query_embedding in query_embeddings.items():
+            results[position] = self._resolve_without_search(queries[position], query_embedding)
+        search_positions = [position for position in query_embeddings if results[position] is None]
+        if not search_positions:
+            return results
+
+        query_matrix = np.stack([query_embeddings[position] for position in search_positions])
+        routes = self.route(query_matrix)
+
+        def search_shard(shard_id: int) -> list[tuple[list, list, list]]:
+            rows = np.flatnonzero(routes[:, shard_id])
+            if len(rows) == 0:
+                return []
+            return self.shards[shard_id].retrieve_embeddings([queries[search_positions[row]] for row in rows],
+                                                             query_matrix[rows])
+
+        routed_shards = np.flatnonzero(routes.any(axis=0))
+        if len(routed_shards) == 1:
+            shard_results = {routed_shards[0]: search_shard(routed_shards[0])}
+        else:
+            shard_results = dict(zip(routed_shards, self.executor.map(search_shard, routed_shards)))
+
+        shard_iterators = {shard_id: iter(shard_result) for shard_id, shard_result in shard_results.items()}
+        for row, position in enumerate(search_positions):
+            results[position] = self._merge([next(shard_iterators[shard_id])
+                                             for shard_id in np.flatnonzero(routes[row])])
+
+        if self.verbose:
+            pretty_print(name="RAG shards routing", result_dictionary={
+                "Latency": f"{(time.time() - start_time):0.2f}s",
+                "Number of queries": len(queries),
+                "Query cache": self.query_cache.stats,
+                **{name: f"{int(routes[:, shard_id].sum())} queries" for shard_id, name in enumerate(self.shard_names)},
+            })
+
+        return results
+
+    def __call__(self, query: str) -> tuple[list, list, list]:
+        """
+        Retrieve the most relevant chunks (and their related metadata) in the routed shards for the input query.
+        :param query: user query
+        :return: most relevant chunks and related metadata
+        """
+
+        best_chunk_list, best_similarity_list, best_metadata_list = self.retrieve_batch([query])[0]
+
+        if self.verbose:
+            pretty_print(name="RAG", result_dictionary={
+                "Chunks": best_chunk_list,
+                "Similarities": best_similarity_list,
+                "Metadata": best_metadata_list,
+            })
+
+        return best_chunk_list, best_similarity_list, best_metadata_list
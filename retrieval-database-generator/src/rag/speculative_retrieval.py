@@ -0,0 +1,85 @@
+# Copyright 2025 NXP
+# NXP Proprietary.
+# This software is owned or controlled by NXP and may only be used strictly in
+# accordance with the applicable license terms. By expressly accepting such
+# terms or by downloading, installing, activating and/or otherwise using the
+# software, you are agreeing that you have read, and that you agree to comply
+# with and are bound by, such license terms. If you do not agree to be bound
+# by the applicable license terms, then you may not retain, install, activate
+# or otherwise use the software.
+
+import re
+from rag.config import Config
+from rag.phrase_matcher import split_words
+
+# A partial transcript ending with a letter or a digit may end in the middle of a word
+_UNFINISHED_WORD_PATTERN = re.compile(r"\w+$")
+
+
+def get_completed_text(partial_transcript: str, previous_transcript: str = None) -> str:
+    """
+    :param partial_transcript: partial transcript of an utterance
+    :param previous_transcript: previous partial transcript of the utterance
+    :return: the transcript up to its last word boundary: the last word is dropped if it may be unfinished, i.e. if it
+    is not followed by a separator and was not already in the previous partial transcript
+    """
+
+    partial_transcript = partial_transcript.strip()
+    if previous_transcript is not None and partial_transcript == previous_transcript.strip():
+        return partial_transcript
+    return _UNFINISHED_WORD_PATTERN.sub("", partial_transcript).strip()
+
+
+class SpeculativeRetrieval:
+    """
+    Speculative retrieval of an utterance: the retrieval runs on the partial transcripts of a streaming ASR, each time
+    a word is completed (followed by a separator, or unchanged in two consecutive partial transcripts), so that its
+    result is ready when the utterance ends. If the final transcript has the same words as the last speculated text
+    (the embedding model is uncased), the speculative result is returned without any computation; otherwise the final
+    transcript is retrieved and the result is compared with the speculative one.
+    """
+
+    def __init__(self, retriever, min_words: int = Config.speculative_min_words):
+        """
+        :param retriever: Retriever running the queries
+        :param min_words: minimum number of completed words before the first speculative retrieval
+        """
+
+        self.retriever = retriever
+        self.min_words = min_words
+        self.query = None
+        self.words = None
+        self.result = None
+        self.num_retrievals = 0
+        self._previous_transcript = None
+
+    def update(self, partial_transcript: str) -> tuple[list, list, list] | None:
+        """
+        Retrieve the completed words of a partial transcript, if they changed since the last retrieval. The result is
+        not added to the semantic cache.
+        :param partial_transcript: latest partial transcript of the utterance
+        :return: speculative result (None if there are not enough completed words yet)
+        """
+
+        completed_text = get_completed_text(partial_transcript, self._previous_transcript)
+        self._previous_transcript = partial_transcript
+        words = split_words(completed_text)
+        if len(words) >= self.min_words and words != self.words:
+            self.query, self.words = completed_text, words
+            self.result = self.retriever.retrieve(completed_text, update_semantic_cache=False)
+            self.num_retrievals += 1
+        return self.result
+
+    def finish(self, final_transcript: str) -> tuple[tuple[list, list, list], bool]:
+        """
+        :param final_transcript: final transcript of the utterance
+        :return: final result, and whether the final transcript changed the speculative result (True if there was no
+        speculative result)
+        """
+
+        if self.result is not None and split_words(final_transcript) == self.words:
+            return self.result, False
+        result = self.retriever.retrieve(final_transcript)
+        changed = self.result is None or result[0] != self.result[0] or result[2] != self.result[2]
+        self.query, self.words, self.result = final_transcript, split_words(final_transcript), result
+        return result, changed
@@ -15,7 +15,7 @@ import textwrap
 import numpy as np
 from colorama import Fore, Style
 from pprint import pformat
-from torch import Tensor
+from rag.phrase_matcher import CensoredPhraseFilter
 
 
 def exit_program(message):
@@ -144,7 +144,7 @@ def load_markdown(md_path: str) -> str:
     return content
 
 
-def summarize_value(value: list | dict | Tensor) -> list | dict | str:
+def summarize_value(value) -> list | dict | str:
     """
     Summarize the value for print by handling numpy arrays, dictionaries, and lists.
     :param value: The value to be summarized, which can be a numpy array, a dictionary, or a list.
@@ -154,8 +154,8 @@ def summarize_value(value: list | dict | Tensor) -> list | dict | str:
     # If the value is a numpy array, summarize its shape and dtype
     if isinstance(value, np.ndarray):
         return f"ndarray(shape={value.shape}, dtype={value.dtype})"
-    # If the value is a torch Tensor, summarize its shape and dtype
-    if isinstance(value, Tensor):
+    # If the value is a torch Tensor (e.g. in a legacy database), summarize its shape and dtype (torch is not imported)
+    if type(value).__module__.startswith("torch"):
         return f"tensor(shape={value.shape}, dtype={value.dtype})"
     # If the value is a dictionary, recursively summarize it
     elif isinstance(value, dict):
@@ -219,15 +219,12 @@ def pretty_print(name: str, result_dictionary: dict) -> None:
 
 def check_censored_word_presence(query: str) -> bool:
     """
-    Check if a censored word present in a list is contained in a string.
+    Check if a censored word or phrase of CENSORED_WORDS is contained in a string (case-insensitive, whole words).
     :param query: The string in which we search for censored words.
     :return: bool: Retrun true if a censored word is found
     """
 
-    words = set(query.split(' '))
-    if not bool(words & CENSORED_WORDS):  # If no intersection
-        return False
-    return True
+    return CENSORED_PHRASE_FILTER(query)
 
 
 def get_leaf_classes(cls):
@@ -416,3 +413,6 @@ CENSORED_WORDS = {
     "staline",
     "porn"
 }
+
+# Matcher of the censored words, built once at import
+CENSORED_PHRASE_FILTER = CensoredPhraseFilter(CENSORED_WORDS)